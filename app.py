@@ -1,152 +1,150 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
-from fpdf import FPDF
 import os
+import functools
 from datetime import datetime, time
-import hashlib
-# *** ต้องติดตั้งก่อน: pip install bahttext ***
-from bahttext import bahttext
+from receipt_cache import ReceiptCache, receipt_fingerprint
+from lookup_cache import LookupCache
+from slip_store import SlipStore
+import service
+import bulk_export
+import dashboard
+import metrics
+import reconciliation
+import jobs
+import search
+from history import fetch_history_page, history_filter_options
+from db import Database
+from jobs import JobQueue
+import tempfile
 
 # --- 1. CONFIG & DATABASE SETUP ---
-if not os.path.exists('slips'):
-    os.makedirs('slips')
-
-def make_hashes(password):
-    return hashlib.sha256(str.encode(password)).hexdigest()
-
-def check_hashes(password, hashed_text):
-    if make_hashes(password) == hashed_text:
-        return True
-    return False
-
-def init_db():
-    conn = sqlite3.connect('data.db', check_same_thread=False)
-    c = conn.cursor()
-    
-    # 1. Users
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT, role TEXT, 
-                  sec_question TEXT, sec_answer TEXT)''')
-    # Auto Fix for old DB
-    try: c.execute("SELECT sec_question FROM users LIMIT 1")
-    except: 
-        c.execute("ALTER TABLE users ADD COLUMN sec_question TEXT")
-        c.execute("ALTER TABLE users ADD COLUMN sec_answer TEXT")
-    try: c.execute("SELECT role FROM users LIMIT 1")
-    except: c.execute("ALTER TABLE users ADD COLUMN role TEXT")
-
-
-    # 2. Personnel
-    c.execute('''CREATE TABLE IF NOT EXISTS personnel
-                 (id INTEGER PRIMARY KEY, owner_id INTEGER, name TEXT, phone TEXT, address TEXT)''')
-                  
-    # 3. Transactions
-    c.execute('''CREATE TABLE IF NOT EXISTS transactions
-                 (id INTEGER PRIMARY KEY, person_id INTEGER, amount REAL, 
-                  date TEXT, slip_path TEXT, note TEXT, category TEXT, download_count INTEGER DEFAULT 0)''')
-    # Auto Fix for old DB
-    try: c.execute("SELECT category FROM transactions LIMIT 1")
-    except: c.execute("ALTER TABLE transactions ADD COLUMN category TEXT")
-    try: c.execute("SELECT download_count FROM transactions LIMIT 1")
-    except: c.execute("ALTER TABLE transactions ADD COLUMN download_count INTEGER DEFAULT 0")
-
-    conn.commit()
-    return conn
-
-conn = init_db()
-
-# --- 2. ฟังก์ชัน PDF (ฉบับแก้ไขตามบรีฟล่าสุด) ---
-def generate_receipt_pdf(trans_id, person_name, date_str, amount, category, note, is_original=True):
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Font Setup
-    if os.path.exists('THSarabunNew.ttf'):
-        pdf.add_font('THSarabunNew', '', 'THSarabunNew.ttf', uni=True)
-        pdf.add_font('THSarabunNew', 'B', 'THSarabunNew Bold.ttf', uni=True)
-        font_normal = 'THSarabunNew'
-    else:
-        font_normal = 'Arial'
-        
-    # --- HEADER ---
-    pdf.set_font(font_normal, 'B', 20)
-    pdf.cell(0, 10, txt="ใบเสร็จรับเงิน / RECEIPT", ln=1, align='C')
-    
-    # --- WATERMARK ---
-    pdf.set_font(font_normal, 'B', 14)
-    status_text = "ต้นฉบับ / ORIGINAL" if is_original else "สำเนา / COPY"
-    pdf.set_xy(150, 10)
-    pdf.set_text_color(255, 0, 0) if not is_original else pdf.set_text_color(0, 100, 0)
-    pdf.cell(50, 10, txt=f"[{status_text}]", border=1, align='C')
-    pdf.set_text_color(0, 0, 0) # Reset color
-
-    pdf.ln(20)
-    
-    # --- INFO BLOCK (แก้ไขแสดงวันที่/เวลาตามจริง) ---
-    pdf.set_font(font_normal, '', 14)
-    # ใช้ส่วนวันที่มาทำเลขที่ใบเสร็จ
-    rec_date_obj = datetime.strptime(date_str.split()[0], "%Y-%m-%d")
-    receipt_no = f"RCP-{rec_date_obj.strftime('%Y%m')}-{trans_id:04d}"
-    
-    pdf.cell(130, 8, txt=f"ได้รับเงินจาก: {person_name}", ln=0)
-    pdf.cell(60, 8, txt=f"เลขที่: {receipt_no}", ln=1, align='R')
-    
-    # แสดงวันเวลาที่ผู้ใช้กรอกมาจริงๆ (date_str เต็มๆ)
-    pdf.cell(130, 8, txt=f"วันที่ชำระ (Date/Time): {date_str}", ln=0)
-    pdf.cell(60, 8, txt=f"สถานะ: ชำระเงินเรียบร้อย", ln=1, align='R')
-    pdf.ln(10)
-    
-    # --- TABLE (แก้ไขการจัดวางและขนาดคอลัมน์) ---
-    # กำหนดความกว้างคอลัมน์ใหม่ให้พอดี: No(15) + Desc(115) + Amount(50) = 180
-    pdf.set_fill_color(240, 240, 240)
-    pdf.set_font(font_normal, 'B', 14)
-    pdf.cell(15, 10, txt="#", border=1, align='C', fill=True)
-    pdf.cell(115, 10, txt="รายการ (Description)", border=1, align='C', fill=True)
-    pdf.cell(50, 10, txt="จำนวนเงิน (Amount)", border=1, align='C', fill=True) # จัดกลางให้ตรงหัวข้อ
-    pdf.ln()
-    
-    pdf.set_font(font_normal, '', 14)
-    # Row 1 Data
-    pdf.cell(15, 10, txt="1", border=1, align='C')
-    pdf.cell(115, 10, txt=f"{category} - {note}", border=1, align='L')
-    pdf.cell(50, 10, txt=f"{amount:,.2f}", border=1, align='R') # ตัวเลขชิดขวา
-    pdf.ln()
-    
-    # Grand Total Row
-    pdf.set_font(font_normal, 'B', 14)
-    pdf.cell(130, 10, txt="รวมทั้งสิ้น (Grand Total)", border=1, align='R') # 15+115 = 130
-    pdf.cell(50, 10, txt=f"{amount:,.2f}", border=1, align='R', fill=True)
-    pdf.ln()
-
-    # --- THAI BAHT TEXT ROW (เพิ่มใหม่) ---
-    thai_text = bahttext(amount) # แปลงตัวเลขเป็นตัวอักษรไทย
-    pdf.set_font(font_normal, '', 14)
-    # ใช้ cell กว้างเต็ม 180 เพื่อแสดงตัวอักษร
-    pdf.cell(180, 10, txt=f"( ตัวอักษร: {thai_text} )", border='T', align='C', fill=True)
-    
-    # --- SIGNATURE SECTION (แก้ไขตำแหน่งและการซ้อนทับ) ---
-    pdf.ln(25) # เว้นระยะห่าง
-
-    # 1. วาดเส้นปะก่อน เพื่อหาตำแหน่ง Y อ้างอิง
-    pdf.cell(120, 8, txt="", ln=0) # ดันไปขวา
-    line_start_y = pdf.get_y() # เก็บตำแหน่ง Y ของบรรทัดนี้
-    pdf.cell(70, 8, txt="......................................................", ln=1, align='C')
-
-    # 2. วางรูปภาพโดยอิงจากตำแหน่งเส้นปะ (ดึงขึ้นไปด้านบนเล็กน้อย)
-    if os.path.exists('signature.png'):
-        # ใช้ line_start_y แล้วลบออก (เช่น -12) เพื่อให้รูปอยู่เหนือ/ทับเส้นปะ
-        pdf.image('signature.png', x=135, y=line_start_y - 12, w=40)
-        
-    # 3. ใส่ข้อความใต้เส้นปะ (แก้ไขคำตามที่ขอ)
-    pdf.cell(120, 8, txt="", ln=0)
-    pdf.cell(70, 8, txt="( ผู้มีอำนาจลงนาม )", ln=1, align='C') # แก้ไขคำตรงนี้
-    pdf.cell(120, 8, txt="", ln=0)
-    pdf.cell(70, 8, txt="นิติบุคคลอาคารชุด/หมู่บ้าน", ln=1, align='C')
-
-    filename = f"receipt_{receipt_no}.pdf"
-    pdf.output(filename)
-    return filename
+slip_store = SlipStore('slips')  # เก็บสลิปตาม hash ของเนื้อหา (ดู slip_store.py)
+
+@st.cache_resource
+def get_db():
+    # ใช้ร่วมกันทุก session: migrate + WAL ครั้งเดียว, มี writer thread ตัวเดียว (ดู db.py)
+    return Database('data.db')
+
+db = get_db()
+conn = db.connection()  # connection อ่านของ thread ที่รันสคริปต์รอบนี้
+
+# --- แคชข้อมูลอ้างอิง (ทุกจุดที่เขียนต้อง invalidate namespace ที่เกี่ยวข้อง) ---
+@st.cache_resource
+def get_lookup_cache():
+    return LookupCache()
+
+lookups = get_lookup_cache()
+
+def get_profile(owner_id):
+    return lookups.get_or_load("profile", owner_id, lambda: service.get_profile(conn, owner_id))
+
+def get_users():
+    return lookups.get_or_load("users", None, lambda: service.list_users(conn))
+
+# --- 2. ใบเสร็จ PDF: แคชใช้ร่วมกันทุก session (ไม่ถูกสร้างใหม่ทุกครั้งที่ rerun) ---
+# เรนเดอร์จาก template ที่โหลดฟอนต์/ลายเซ็นไว้ครั้งเดียว (ดู receipt_template.py) ไม่เขียนไฟล์ลงดิสก์
+RECEIPT_CACHE_DIR = os.environ.get("RECEIPT_CACHE_DIR")  # ตั้งค่าเพื่อเปิดแคชบนดิสก์
+
+@st.cache_resource
+def get_receipt_cache():
+    return ReceiptCache(disk_dir=RECEIPT_CACHE_DIR)
+
+def receipt_pdf_bytes(trans_id, person_name, date_str, amount, category, note, is_original=True):
+    fields = (person_name, date_str, amount, category, note)
+    with metrics.span("receipt"):
+        return get_receipt_cache().get_or_render(
+            trans_id, is_original, fields,
+            lambda: service.receipt_pdf(trans_id, person_name, date_str, amount, category, note, is_original))
+
+# --- งานเบื้องหลัง: บันทึกแจ้งโอน + เรนเดอร์ใบเสร็จ นอก thread ที่รันสคริปต์ (ดู jobs.py) ---
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_PROCESSES = int(os.environ.get("JOB_PROCESSES", "2"))  # 0 = เรนเดอร์ใน worker thread
+JOB_POLL_SECONDS = 1
+JOB_ROOT = 'jobs'
+
+def on_job_done(q, kind, payload, result):
+    # เรียกใน worker thread (ไม่มี session ของ Streamlit)
+    if kind == "payment":
+        pid = payload["person_id"]
+        lookups.invalidate("history_filters", pid)
+        # เรนเดอร์ใบเสร็จต้นฉบับไว้ก่อน (priority ต่ำกว่างานที่ผู้ใช้รออยู่) เปิดหน้าประวัติแล้วโหลดได้ทันที
+        jobs.submit_receipt(q, result["transaction_id"], payload["person_name"], result["date"], payload["amount"],
+                            payload["category"], payload["note"], True, priority=-1)
+
+@st.cache_resource
+def get_job_queue():
+    q = JobQueue(db, JOB_ROOT, workers=JOB_WORKERS, processes=JOB_PROCESSES, initializer=jobs.load_receipt_template)
+    q.register("receipt", jobs.render_receipt, cpu=True)
+    q.register("payment", functools.partial(jobs.record_payment, slip_store))
+    q.add_listener(functools.partial(on_job_done, q))
+    q.start()  # งานที่ค้างจากรอบก่อนถูกทำต่อ
+    return q
+
+def request_receipt(*fields):
+    return jobs.submit_receipt(get_job_queue(), *fields)
+
+def receipt_cache_key(trans_id, person_name, date_str, amount, category, note, is_original):
+    return ReceiptCache.make_key(trans_id, is_original, receipt_fingerprint(person_name, date_str, amount, category, note))
+
+def ready_receipt_bytes(fields):
+    """data ของ download_button (เรียกตอนกดโหลด): อ่านจากแคชหรือไฟล์ผลของงาน ถ้าถูกล้างไปแล้วค่อยเรนเดอร์ตรงนี้"""
+    key, cache = receipt_cache_key(*fields), get_receipt_cache()
+    data = cache.get(key)
+    if data is None:
+        q = get_job_queue()
+        data = q.result_bytes(q.find([jobs.receipt_key(*fields)]).get(jobs.receipt_key(*fields)))
+        if data is None:
+            return receipt_pdf_bytes(*fields)
+        cache.put(key, data)
+    return data
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def wait_for_jobs(job_ids, message):
+    """poll สถานะงาน (rerun เฉพาะ fragment นี้) เสร็จครบแล้ว rerun ทั้งหน้าเพื่อแสดงผล"""
+    q = get_job_queue()
+    waiting = [j for j in map(q.get, job_ids) if j and j["status"] in (jobs.QUEUED, jobs.RUNNING)]
+    if not waiting:
+        st.rerun()
+    st.caption(f"⏳ {message} (รอ {len(waiting)} งาน)")
+
+# --- ไฟล์ส่งออกใบเสร็จแบบกลุ่ม (ZIP/PDF หลายร้อย MB ได้) ---
+# อยู่ในโฟลเดอร์เดียวใต้ JOB_ROOT: สร้างไฟล์ใหม่ = ลบไฟล์เดิมของ session นี้
+# และลบไฟล์ที่เก่ากว่า EXPORT_TTL_HOURS (ของ session ที่ปิดไปแล้ว ซึ่งไม่มีใครลบให้)
+EXPORT_DIR = os.path.join(JOB_ROOT, 'exports')
+EXPORT_TTL_HOURS = 2
+
+def new_export_path(fmt):
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    previous = st.session_state.pop("bulk_export", None)
+    if previous and os.path.exists(previous[0]):
+        os.remove(previous[0])
+    cutoff = datetime.now().timestamp() - EXPORT_TTL_HOURS * 3600
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:  # อีก session ลบไปพร้อมกัน
+            pass
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}", dir=EXPORT_DIR)
+    os.close(fd)
+    return path
+
+# --- Metrics: แต่ละ rerun ถูกจับเวลาแยกตามเมนู (ดู metrics.py) ---
+METRICS_TEXTFILE = os.environ.get("METRICS_TEXTFILE")  # ตั้งค่าเพื่อเขียนไฟล์ .prom ให้ node_exporter อ่าน
+METRICS_TEXTFILE_INTERVAL = 15
+
+@st.cache_resource
+def get_textfile_state():
+    return {"last": 0.0}
+
+def export_metrics_textfile():
+    state = get_textfile_state()
+    now = datetime.now().timestamp()
+    if METRICS_TEXTFILE and now - state["last"] >= METRICS_TEXTFILE_INTERVAL:
+        state["last"] = now
+        metrics.METRICS.write_textfile(METRICS_TEXTFILE)
 
 # --- 3. MAIN APP ---
 def main():
@@ -170,10 +168,8 @@ def main():
                 u = st.text_input("Username")
                 p = st.text_input("Password", type="password")
                 if st.button("เข้าสู่ระบบ", type="primary", use_container_width=True):
-                    c = conn.cursor()
-                    c.execute('SELECT * FROM users WHERE username=?', (u,))
-                    d = c.fetchone()
-                    if d and check_hashes(p, d[2]):
+                    d = service.authenticate(conn, u, p)
+                    if d:
                         st.session_state.update({"user_id": d[0], "username": d[1], "role": d[3] if len(d)>3 else 'user'})
                         st.rerun()
                     else: st.error("ชื่อผู้ใช้หรือรหัสผ่านไม่ถูกต้อง")
@@ -190,12 +186,9 @@ def main():
                 sec_a = st.text_input("คำตอบ (จำให้แม่น!)", type="password")
                 if st.form_submit_button("ยืนยันการสมัคร"):
                     if new_u and new_p and sec_a:
-                        role = 'admin' if new_u.lower() == 'admin' else 'user'
                         try:
-                            c = conn.cursor()
-                            c.execute("INSERT INTO users (username, password, role, sec_question, sec_answer) VALUES (?,?,?,?,?)", 
-                                      (new_u, make_hashes(new_p), role, sec_q, make_hashes(sec_a)))
-                            conn.commit()
+                            service.register_user(db, new_u, new_p, sec_q, sec_a)
+                            lookups.invalidate("users")
                             st.success(f"สมัครสำเร็จ! กรุณาเข้าสู่ระบบ")
                         except: st.error("ชื่อผู้ใช้นี้ถูกใช้ไปแล้ว")
                     else: st.error("กรุณากรอกข้อมูลให้ครบทุกช่อง")
@@ -206,9 +199,7 @@ def main():
                 with st.form("reset_0"):
                     f_user = st.text_input("ระบุ Username ของท่าน")
                     if st.form_submit_button("ตรวจสอบ"):
-                        c = conn.cursor()
-                        c.execute("SELECT sec_question, sec_answer FROM users WHERE username=?", (f_user,))
-                        user_data = c.fetchone()
+                        user_data = service.security_question(conn, f_user)
                         if user_data:
                             st.session_state.reset_username = f_user
                             st.session_state.reset_q = user_data[0]
@@ -222,7 +213,7 @@ def main():
                     st.write(f"คำถามความปลอดภัย: **{st.session_state.reset_q}**")
                     ans_input = st.text_input("กรุณาระบุคำตอบ", type="password")
                     if st.form_submit_button("ยืนยันคำตอบ"):
-                        if check_hashes(ans_input, st.session_state.reset_real_a):
+                        if service.check_hashes(ans_input, st.session_state.reset_real_a):
                             st.success("ถูกต้อง! กรุณาตั้งรหัสผ่านใหม่")
                             st.session_state.reset_step = 2
                             st.rerun()
@@ -236,10 +227,7 @@ def main():
                     new_pass_2 = st.text_input("ยืนยันรหัสผ่านใหม่", type="password")
                     if st.form_submit_button("เปลี่ยนรหัสผ่าน"):
                         if new_pass_1 == new_pass_2 and new_pass_1 != "":
-                            c = conn.cursor()
-                            c.execute("UPDATE users SET password=? WHERE username=?", 
-                                      (make_hashes(new_pass_1), st.session_state.reset_username))
-                            conn.commit()
+                            service.set_password(db, st.session_state.reset_username, new_pass_1)
                             st.success("เปลี่ยนรหัสผ่านสำเร็จ! กรุณาเข้าสู่ระบบใหม่")
                             st.session_state.reset_step = 0
                             st.session_state.reset_username = ""
@@ -253,12 +241,13 @@ def main():
         menu_list = ["หน้าหลัก", "ข้อมูลส่วนตัว", "ชำระเงิน/แจ้งโอน", "ประวัติ/ดาวน์โหลดใบเสร็จ"]
         if st.session_state["role"] == 'admin':
             st.sidebar.divider()
-            menu_list.extend(["Admin: แดชบอร์ด", "Admin: ข้อมูลลูกบ้าน", "Admin: จัดการสิทธิ์"])
+            menu_list.extend(["Admin: แดชบอร์ด", "Admin: ข้อมูลลูกบ้าน", "Admin: จัดการสิทธิ์", "Admin: ส่งออกใบเสร็จ", "Admin: กระทบยอดธนาคาร", "Admin: ประสิทธิภาพ"])
         st.sidebar.divider()
         if st.sidebar.button("ออกจากระบบ", type="primary", use_container_width=True):
             st.session_state.clear()
             st.rerun()
         choice = st.sidebar.radio("เลือกเมนู", menu_list)
+        metrics.label(page=choice)
         my_id = st.session_state["user_id"]
 
         if choice == "หน้าหลัก":
@@ -267,26 +256,21 @@ def main():
 
         elif choice == "ข้อมูลส่วนตัว":
             st.header("📇 ข้อมูลส่วนตัว (Profile)")
-            c = conn.cursor()
-            c.execute("SELECT * FROM personnel WHERE owner_id=?", (my_id,))
-            prof = c.fetchone()
+            prof = get_profile(my_id)
             with st.form("profile"):
                 n = st.text_input("ชื่อ-สกุล (เจ้าของ)", value=prof[2] if prof else "")
                 ph = st.text_input("เบอร์โทร", value=prof[3] if prof else "")
                 ad = st.text_area("ที่อยู่ / เลขห้อง", value=prof[4] if prof else "")
                 if st.form_submit_button("บันทึกข้อมูล"):
-                    if prof: c.execute("UPDATE personnel SET name=?, phone=?, address=? WHERE owner_id=?", (n,ph,ad,my_id))
-                    else: c.execute("INSERT INTO personnel (owner_id,name,phone,address) VALUES (?,?,?,?)", (my_id,n,ph,ad))
-                    conn.commit()
+                    service.save_profile(db, my_id, n, ph, ad, exists=prof is not None)
+                    lookups.invalidate("profile", my_id)
                     st.toast("บันทึกเรียบร้อย", icon="✅")
                     st.rerun()
 
         # --- แก้ไขส่วนชำระเงิน ให้เลือกวัน/เวลาได้เอง ---
         elif choice == "ชำระเงิน/แจ้งโอน":
             st.header("💸 แจ้งชำระเงิน")
-            c = conn.cursor()
-            c.execute("SELECT * FROM personnel WHERE owner_id=?", (my_id,))
-            prof = c.fetchone()
+            prof = get_profile(my_id)
             if prof:
                 st.info(f"ทำรายการในนาม: {prof[2]}")
                 with st.container(border=True):
@@ -330,43 +314,70 @@ def main():
 
                     if st.button("ยืนยันแจ้งโอน", type="primary", use_container_width=True):
                         if amount > 0 and file:
-                            ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-                            fpath = f"slips/{ts}_{file.name}"
-                            with open(fpath, "wb") as f: f.write(file.getbuffer())
-                            
+                            # หน้านี้แค่พักไฟล์ไว้ เก็บสลิป + บันทึกรายการทำใน worker (ดู jobs.py)
+                            jobq = get_job_queue()
+                            spool = jobq.spool(file.getvalue(), os.path.splitext(file.name)[1])
                             # บันทึกโดยใช้ pay_datetime_str ที่ผู้ใช้เลือก
-                            c.execute("INSERT INTO transactions (person_id,amount,date,slip_path,note,category) VALUES (?,?,?,?,?,?)",
-                                      (prof[0], amount, pay_datetime_str, fpath, final_note, final_cat))
-                            conn.commit()
+                            job_id = jobq.submit("payment", {"person_id": prof[0], "person_name": prof[2], "amount": amount,
+                                                             "date": pay_datetime_str, "note": final_note,
+                                                             "category": final_cat, "spool": spool}, priority=1)
+                            st.session_state.setdefault("payment_jobs", []).append(job_id)
+                        else: st.error("ข้อมูลไม่ครบ")
+                    # ผลของงานแจ้งโอนที่ส่งไว้: ยังไม่เสร็จ poll ต่อ, เสร็จแล้วแสดงผลครั้งเดียว
+                    payment_jobs = [j for j in map(get_job_queue().get, st.session_state.get("payment_jobs", [])) if j]
+                    if any(j["status"] in (jobs.QUEUED, jobs.RUNNING) for j in payment_jobs):
+                        wait_for_jobs([j["id"] for j in payment_jobs], "กำลังบันทึกการแจ้งโอน")
+                    elif payment_jobs:
+                        st.session_state.payment_jobs = []
+                        for job in payment_jobs:
+                            if job["status"] == jobs.FAILED:
+                                st.error(f"บันทึกไม่สำเร็จ: {job['error']}")
+                                continue
+                            if job["result"]["duplicate_slip"]:
+                                st.warning("สลิปนี้เคยถูกใช้แจ้งโอนมาแล้ว กรุณาตรวจสอบ")
                             st.balloons()
                             st.success("บันทึกสำเร็จ!")
-                        else: st.error("ข้อมูลไม่ครบ")
             else: st.warning("กรุณากรอกข้อมูลส่วนตัวก่อน")
 
         # --- แก้ไขส่วนดาวน์โหลดใบเสร็จ (เปลี่ยนปุ่มโหลด) ---
         elif choice == "ประวัติ/ดาวน์โหลดใบเสร็จ":
             st.header("📜 ประวัติและใบเสร็จ")
-            # Callback function สำหรับอัปเดตยอดโหลด
+            # Callback สำหรับอัปเดตยอดโหลด (เข้าคิว writer, รวมกับคลิกอื่นๆ เป็น commit เดียว)
             def update_dl_count(tid):
-                conn_cb = sqlite3.connect('data.db', check_same_thread=False)
-                c_cb = conn_cb.cursor()
-                c_cb.execute("UPDATE transactions SET download_count = download_count + 1 WHERE id=?", (tid,))
-                conn_cb.commit()
-                conn_cb.close()
-
-            c = conn.cursor()
-            c.execute("SELECT * FROM personnel WHERE owner_id=?", (my_id,))
-            prof = c.fetchone()
+                db.increment_download_count(tid)
+
+            prof = get_profile(my_id)
             if prof:
-                c.execute(f"SELECT * FROM transactions WHERE person_id={prof[0]} ORDER BY date DESC")
-                rows = c.fetchall()
+                years, cats = lookups.get_or_load("history_filters", prof[0], lambda: history_filter_options(conn, prof[0]))
+                f1, f2 = st.columns(2)
+                year = f1.selectbox("ปี", ["ทั้งหมด"] + years)
+                cat_filter = f2.selectbox("ประเภทรายการ", ["ทั้งหมด"] + cats)
+                year = None if year == "ทั้งหมด" else year
+                cat_filter = None if cat_filter == "ทั้งหมด" else cat_filter
+                # เก็บจุดเริ่มของแต่ละหน้าไว้ใน session (เริ่มใหม่เมื่อเปลี่ยนตัวกรอง)
+                if st.session_state.get("hist_filter") != (prof[0], year, cat_filter):
+                    st.session_state.hist_filter = (prof[0], year, cat_filter)
+                    st.session_state.hist_pages = [None]
+                pages = st.session_state.hist_pages
+                # ไม่แคช: download_count (ต้นฉบับ/สำเนา) ถูกเปลี่ยนจาก process อื่นได้ (CLI ส่งออกใบเสร็จ)
+                # หน้าละ 10 แถวจาก index (person_id, date, id) อ่านใหม่ทุก rerun ก็เร็วพอ
+                rows, has_more = fetch_history_page(conn, prof[0], pages[-1], year, cat_filter)
                 if rows:
-                    df = pd.DataFrame(rows, columns=['id', 'pid', 'amount', 'date', 'path', 'note', 'cat', 'dl_count'])
+                    df = pd.DataFrame(rows, columns=['id', 'amount', 'date', 'note', 'cat', 'dl_count'])
                     st.dataframe(df[['date', 'cat', 'note', 'amount']], use_container_width=True)
+                    n1, n2, n3 = st.columns([1, 2, 1])
+                    n1.button("◀ ก่อนหน้า", disabled=len(pages) == 1, on_click=pages.pop)
+                    n2.caption(f"หน้า {len(pages)}")
+                    n3.button("ถัดไป ▶", disabled=not has_more, on_click=pages.append, args=((rows[-1][2], rows[-1][0]),))
                     st.divider()
                     st.subheader("📥 ดาวน์โหลด (รายรายการ)")
+                    # ใบเสร็จที่พร้อมแล้ว (อยู่ในแคช หรืองานเรนเดอร์เสร็จ) ได้ปุ่มดาวน์โหลด ที่เหลือสั่งสร้างเบื้องหลัง
+                    jobq = get_job_queue()
+                    fields = {r[0]: (r[0], prof[2], r[2], r[1], r[4], r[3], r[5] == 0) for r in rows}
+                    receipt_jobs = jobq.find(jobs.receipt_key(*f) for f in fields.values())
+                    rendering = []
                     for row in rows:
-                        tid, _, amt, dt, path, note, cat, dl_count = row
+                        tid, amt, dt, note, cat, dl_count = row
                         with st.container(border=True):
                             c1, c2, c3 = st.columns([2, 1, 1])
                             with c1:
@@ -376,21 +387,28 @@ def main():
                                 st.write(f"**{amt:,.2f} บาท**")
                                 st.caption(f"{'✨ ต้นฉบับ' if dl_count==0 else f'⚠️ สำเนา (โหลด {dl_count} ครั้ง)'}")
                             with c3:
-                                # สร้าง PDF เตรียมไว้เลย
-                                is_orig = True if dl_count == 0 else False
-                                pdf_filename = generate_receipt_pdf(tid, prof[2], dt, amt, cat, note, is_orig)
-                                with open(pdf_filename, "rb") as f:
-                                    pdf_bytes = f.read()
-                                # ใช้ download_button โดยตรง พร้อม callback
-                                st.download_button(
-                                    label="📄 ดาวน์โหลดใบเสร็จ",
-                                    data=pdf_bytes,
-                                    file_name=pdf_filename,
-                                    mime="application/pdf",
-                                    key=f"dl_btn_{tid}",
-                                    on_click=update_dl_count,
-                                    args=(tid,)
-                                )
+                                job = receipt_jobs.get(jobs.receipt_key(*fields[tid]))
+                                status = job["status"] if job else None
+                                if status == jobs.DONE or receipt_cache_key(*fields[tid]) in get_receipt_cache():
+                                    # ไบต์ถูกอ่านตอนกดดาวน์โหลดเท่านั้น
+                                    st.download_button(
+                                        label="📄 ดาวน์โหลดใบเสร็จ",
+                                        data=functools.partial(ready_receipt_bytes, fields[tid]),
+                                        file_name=service.receipt_filename(tid, dt),
+                                        mime="application/pdf",
+                                        key=f"dl_btn_{tid}",
+                                        on_click=update_dl_count,
+                                        args=(tid,)
+                                    )
+                                elif status in (jobs.QUEUED, jobs.RUNNING):
+                                    rendering.append(job["id"])
+                                    st.button("⏳ กำลังสร้างใบเสร็จ", key=f"mk_btn_{tid}", disabled=True)
+                                else:
+                                    if status == jobs.FAILED:
+                                        st.caption(f"สร้างไม่สำเร็จ: {job['error']}")
+                                    st.button("🧾 สร้างใบเสร็จ", key=f"mk_btn_{tid}", on_click=request_receipt, args=fields[tid])
+                    if rendering:
+                        wait_for_jobs(rendering, "กำลังสร้างใบเสร็จ")
                 else: st.info("ไม่พบประวัติ")
             else: st.warning("กรุณากรอกข้อมูลส่วนตัวก่อน")
 
@@ -398,22 +416,236 @@ def main():
         elif "Admin" in choice and st.session_state["role"] == 'admin':
             if "แดชบอร์ด" in choice:
                 st.header("📊 Admin Dashboard")
-                df = pd.read_sql("SELECT * FROM transactions", conn)
-                if not df.empty:
-                    st.metric("Total Income", f"{df['amount'].sum():,.2f}")
-                    st.dataframe(df)
+                today = datetime.now().date()
+                d1, d2 = st.columns(2)
+                start_d = d1.date_input("ตั้งแต่เดือน", today.replace(month=1, day=1))
+                end_d = d2.date_input("ถึงเดือน", today)
+                start_m, end_m = dashboard.month_key(start_d), dashboard.month_key(end_d)
+                # ยอดรวมอ่านจาก monthly_summary (ไม่กี่ร้อยแถว) แทนการโหลด transactions ทั้งตาราง
+                summary = pd.DataFrame(dashboard.income_summary(conn, start_m, end_m),
+                                       columns=['month', 'category', 'total', 'count'])
+                if summary.empty:
+                    st.info("ไม่มีรายการในช่วงเวลาที่เลือก")
+                else:
+                    m1, m2 = st.columns(2)
+                    m1.metric("Total Income", f"{summary['total'].sum():,.2f}")
+                    m2.metric("จำนวนรายการ", f"{summary['count'].sum():,}")
+                    st.subheader("รายรับรายเดือน")
+                    st.bar_chart(summary.pivot_table(index='month', columns='category', values='total', aggfunc='sum', fill_value=0))
+                    st.subheader("แยกตามประเภท")
+                    by_cat = summary.groupby('category')[['total', 'count']].sum().sort_values('total', ascending=False)
+                    st.dataframe(by_cat, use_container_width=True)
+
+                st.subheader("ลูกบ้านค้างชำระค่าส่วนกลาง")
+                months = [m for m in dashboard.summary_months(conn) if start_m <= m <= end_m] or [end_m]
+                due_month = st.selectbox("เดือน", months)
+                n_due = dashboard.count_outstanding(conn, due_month)
+                st.caption(f"ไม่มีรายการ {dashboard.COMMON_FEE} ที่โอนในเดือน {due_month}: {n_due} ราย")
+                if n_due:
+                    due_page = st.number_input("หน้า", min_value=1, max_value=(n_due - 1) // dashboard.RAW_PAGE_SIZE + 1, value=1)
+                    due = dashboard.outstanding_residents(conn, due_month, offset=(due_page - 1) * dashboard.RAW_PAGE_SIZE)
+                    st.dataframe(pd.DataFrame(due, columns=['id', 'name', 'phone', 'address']), use_container_width=True, hide_index=True)
+
+                # รายการดิบ: โหลดเมื่อกดเปิดเท่านั้น ทีละหน้า
+                if st.toggle("แสดงรายการทั้งหมด (Raw data)"):
+                    range_start, _ = dashboard.month_bounds(start_m)
+                    _, range_end = dashboard.month_bounds(end_m)
+                    if st.session_state.get("raw_filter") != (range_start, range_end):
+                        st.session_state.raw_filter = (range_start, range_end)
+                        st.session_state.raw_pages = [None]
+                    raw_pages = st.session_state.raw_pages
+                    raw, raw_more = dashboard.fetch_transactions_page(conn, range_start, range_end, raw_pages[-1])
+                    st.dataframe(pd.DataFrame(raw, columns=['id', 'date', 'name', 'category', 'note', 'amount', 'dl_count']),
+                                 use_container_width=True, hide_index=True)
+                    r1, r2, r3 = st.columns([1, 2, 1])
+                    r1.button("◀ ก่อนหน้า", key="raw_prev", disabled=len(raw_pages) == 1, on_click=raw_pages.pop)
+                    r2.caption(f"หน้า {len(raw_pages)}")
+                    if raw:
+                        r3.button("ถัดไป ▶", key="raw_next", disabled=not raw_more, on_click=raw_pages.append, args=((raw[-1][1], raw[-1][0]),))
+
+                # ค้นหารายการ (FTS, ดู search.py): facet ประเภท/เดือนมาจากผลค้นหาเอง
+                st.subheader("ค้นหารายการ")
+                q = st.text_input("หมายเหตุ / ประเภท (อย่างน้อย 3 ตัวอักษร)", key="tx_q")
+                if q:
+                    if st.session_state.get("tx_filter", (q,))[0] != q:  # คำค้นใหม่: ล้างตัวกรองเดิม
+                        st.session_state.tx_cat = st.session_state.tx_month = ""
+                    tx_filter = (q, st.session_state.get("tx_cat", ""), st.session_state.get("tx_month", ""))
+                    if st.session_state.get("tx_filter") != tx_filter:
+                        st.session_state.tx_filter = tx_filter
+                        st.session_state.tx_page = 1
+                    res = search.search_transactions(conn, q, tx_filter[1] or None, tx_filter[2] or None,
+                                                     st.session_state.tx_page)
+                    cats, months = {"": None, **res.categories}, {"": None, **res.months}
+                    for value, options in ((tx_filter[1], cats), (tx_filter[2], months)):
+                        options.setdefault(value, 0)  # ค่าที่เลือกไว้ต้องยังอยู่ในตัวเลือก
+                    f1, f2 = st.columns(2)
+                    f1.selectbox("ประเภท", list(cats), key="tx_cat",
+                                 format_func=lambda c: f"{c} ({cats[c]:,})" if c else "ทั้งหมด")
+                    f2.selectbox("เดือน", list(months), key="tx_month",
+                                 format_func=lambda m: f"{m} ({months[m]:,})" if m else "ทั้งหมด")
+                    found = f"พบ {res.total:,} รายการ" if res.total is not None else f"พบมากกว่า {search.FACET_LIMIT:,} รายการ"
+                    order = "เรียงตามความเกี่ยวข้อง" if res.ranked else "เรียงจากรายการล่าสุด"
+                    sample = "" if res.exact else f", จำนวนในตัวกรองนับจาก {search.FACET_LIMIT:,} รายการล่าสุด"
+                    st.caption(f"{found} ({order}{sample})")
+                    st.dataframe(pd.DataFrame(res.rows, columns=['id', 'date', 'name', 'category', 'note', 'amount']),
+                                 use_container_width=True, hide_index=True)
+                    s1, s2, s3 = st.columns([1, 2, 1])
+                    s1.button("◀ ก่อนหน้า", key="tx_prev", disabled=st.session_state.tx_page == 1,
+                              on_click=lambda: st.session_state.update(tx_page=st.session_state.tx_page - 1))
+                    s2.caption(f"หน้า {st.session_state.tx_page}")
+                    s3.button("ถัดไป ▶", key="tx_next", disabled=not res.more,
+                              on_click=lambda: st.session_state.update(tx_page=st.session_state.tx_page + 1))
+
+                with st.expander("แคชใบเสร็จ (Receipt cache)"):
+                    stats = get_receipt_cache().stats()
+                    m1, m2, m3, m4 = st.columns(4)
+                    m1.metric("Hit rate", f"{stats['hit_rate']:.0%}")
+                    m2.metric("Hits", stats["hits"] + stats["disk_hits"])
+                    m3.metric("Misses", stats["misses"])
+                    m4.metric("Cached", f"{stats['items']} ({stats['bytes'] / 1024:,.0f} KB)")
+                with st.expander("แคชข้อมูลอ้างอิง (Lookup cache)"):
+                    lk = lookups.stats()
+                    st.dataframe(pd.DataFrame.from_dict(lk, orient='index'), use_container_width=True)
+                with st.expander("คิวงานเบื้องหลัง (Background jobs)"):
+                    counts = get_job_queue().counts()
+                    q1, q2, q3, q4 = st.columns(4)
+                    q1.metric("รอคิว", counts.get(jobs.QUEUED, 0))
+                    q2.metric("กำลังทำ", counts.get(jobs.RUNNING, 0))
+                    q3.metric("เสร็จ", counts.get(jobs.DONE, 0))
+                    q4.metric("ล้มเหลว", counts.get(jobs.FAILED, 0))
             elif "ข้อมูลลูกบ้าน" in choice:
                 st.header("👥 User Data")
-                st.dataframe(pd.read_sql("SELECT * FROM personnel", conn))
+                q = st.text_input("ค้นหา ชื่อ / เบอร์โทร / ที่อยู่ / เลขห้อง", key="res_q")
+                if st.session_state.get("res_filter") != q:
+                    st.session_state.res_filter = q
+                    st.session_state.res_page = 1
+                res_rows, res_total = search.search_residents(conn, q, st.session_state.get("res_page", 1))
+                st.caption(f"{'พบ' if q else 'ทั้งหมด'} {res_total:,} ราย")
+                st.dataframe(pd.DataFrame(res_rows, columns=['id', 'name', 'phone', 'address']),
+                             use_container_width=True, hide_index=True)
+                if res_total > search.SEARCH_PAGE_SIZE:
+                    st.number_input("หน้า", min_value=1, max_value=(res_total - 1) // search.SEARCH_PAGE_SIZE + 1,
+                                    key="res_page")
             elif "จัดการสิทธิ์" in choice:
                 st.header("🔑 Manage Roles")
-                users = pd.read_sql("SELECT username, role FROM users", conn)
+                users = pd.DataFrame(get_users(), columns=['username', 'role'])
                 target = st.selectbox("เลือก User", users['username'])
                 new_r = st.radio("สถานะ", ["user", "admin"])
                 if st.button("บันทึก"):
-                    conn.execute("UPDATE users SET role=? WHERE username=?", (new_r, target))
-                    conn.commit()
+                    service.set_role(db, target, new_r)
+                    lookups.invalidate("users")
                     st.success("Saved!")
+            elif "ส่งออกใบเสร็จ" in choice:
+                st.header("🗂️ ส่งออกใบเสร็จแบบกลุ่ม")
+                today = datetime.now().date()
+                col1, col2 = st.columns(2)
+                with col1:
+                    start_d = st.date_input("ตั้งแต่วันที่", today.replace(day=1))
+                    end_d = st.date_input("ถึงวันที่", today)
+                with col2:
+                    cats = [r[0] for r in conn.execute("SELECT DISTINCT category FROM monthly_summary WHERE category != '' AND tx_count > 0 ORDER BY category")]
+                    cat = st.selectbox("ประเภทรายการ", ["ทั้งหมด"] + cats)
+                    fmt = st.radio("รูปแบบไฟล์", ["zip", "pdf"], format_func=lambda f: "ZIP (แยกไฟล์ละใบ)" if f == "zip" else "PDF รวมไฟล์เดียว")
+                mark = st.checkbox("นับเป็นการออกใบเสร็จ (ครั้งถัดไปจะเป็นสำเนา)", value=True)
+                category = None if cat == "ทั้งหมด" else cat
+                total = bulk_export.count_transactions(conn, start_d, end_d, category)
+                st.caption(f"พบ {total} รายการ")
+                too_many = fmt == "pdf" and total > bulk_export.MAX_PDF_PAGES
+                if too_many:
+                    st.warning(f"PDF รวมไฟล์เดียวได้ไม่เกิน {bulk_export.MAX_PDF_PAGES:,} ใบ กรุณาเลือก ZIP หรือแบ่งช่วงวันที่")
+                if st.button("สร้างไฟล์", type="primary", disabled=total == 0 or too_many):
+                    bar = st.progress(0.0, text="กำลังสร้างใบเสร็จ...")
+                    out_path = new_export_path(fmt)
+                    n = bulk_export.export_receipts(db, out_path, fmt, start_d, end_d, category, mark_downloaded=mark,
+                                                    progress=lambda done, tot: bar.progress(done / tot, text=f"{done}/{tot}"))
+                    st.session_state["bulk_export"] = (out_path, f"receipts_{start_d:%Y%m%d}_{end_d:%Y%m%d}.{fmt}", fmt)
+                    st.success(f"สร้างใบเสร็จ {n} ใบเรียบร้อย")
+                if st.session_state.get("bulk_export"):
+                    out_path, out_name, out_fmt = st.session_state["bulk_export"]
+                    if os.path.exists(out_path):
+                        def read_export(path=out_path):
+                            with open(path, "rb") as f:
+                                return f.read()
+                        st.download_button("⬇️ ดาวน์โหลดไฟล์", data=read_export, file_name=out_name,
+                                           mime="application/zip" if out_fmt == "zip" else "application/pdf")
+
+            elif "กระทบยอด" in choice:
+                st.header("🏦 กระทบยอดกับ Statement ธนาคาร")
+                st.caption("ไฟล์ CSV คอลัมน์ Date, Time, Amount (หรือ Credit), Description, Reference — รายการเงินออกจะถูกข้าม, นำเข้าไฟล์เดิมซ้ำได้")
+                col1, col2 = st.columns([3, 1])
+                statement = col1.file_uploader("ไฟล์ statement (CSV)", type=['csv'])
+                window = col2.number_input("เวลาต่างกันได้ไม่เกิน (นาที)", min_value=0, max_value=24 * 60,
+                                           value=reconciliation.DEFAULT_WINDOW_MINUTES)
+                if st.button("นำเข้าและจับคู่", type="primary", disabled=statement is None):
+                    # อ่านไฟล์ + จับคู่ใน thread นี้ (ส่วนที่กินเวลา) ส่งเข้า writer แค่การบันทึก ไม่บล็อกการเขียนของคนอื่น
+                    plan = reconciliation.prepare_import(conn, statement, source=statement.name, window=window)
+                    stats = db.write(lambda c: reconciliation.apply_import(c, plan)).result()
+                    st.success(f"นำเข้า {stats['lines']} บรรทัด (ซ้ำ {stats['duplicate_lines']}, ข้าม {stats['skipped_lines']}) "
+                               f"จับคู่ได้ {stats['matched']} ต้องตรวจ {stats['ambiguous']} ใน {stats['seconds']:.1f} วินาที")
+
+                line_counts, txn_counts = reconciliation.status_counts(conn)
+                m1, m2, m3, m4, m5 = st.columns(5)
+                m1.metric("จับคู่แล้ว", f"{line_counts.get(reconciliation.MATCHED, 0):,}")
+                m2.metric("ต้องตรวจ (หลายตัวเลือก)", f"{line_counts.get(reconciliation.AMBIGUOUS, 0):,}")
+                m3.metric("เงินเข้าแต่ไม่มีคนแจ้ง", f"{line_counts.get(reconciliation.UNMATCHED, 0):,}")
+                m4.metric("แจ้งแต่ไม่พบเงินเข้า", f"{txn_counts.get(reconciliation.UNMATCHED, 0):,}")
+                m5.metric("แจ้งซ้ำ", f"{txn_counts.get(reconciliation.DUPLICATE, 0):,}")
+
+                line_cols = ['line_id', 'posted_at', 'amount', 'reference', 'description', 'tx_id', 'tx_date', 'name', 'note']
+                tx_cols = ['tx_id', 'date', 'name', 'amount', 'category', 'note', 'slip']
+                t1, t2, t3, t4 = st.tabs(["ต้องตรวจ", "เงินเข้าไม่มีคนแจ้ง", "แจ้งแต่ไม่พบเงินเข้า", "แจ้งซ้ำ"])
+                with t1:
+                    amb = reconciliation.lines_by_status(conn, reconciliation.AMBIGUOUS)
+                    if amb:
+                        st.caption("คู่ที่ระบบเสนอ (เวลาใกล้ที่สุด) แสดงสูงสุด 200 รายการ")
+                        st.dataframe(pd.DataFrame(amb, columns=line_cols), use_container_width=True, hide_index=True)
+                        picked = st.multiselect("ยืนยันคู่ที่ถูกต้อง (line_id)", [r[0] for r in amb])
+                        if st.button("ยืนยันคู่ที่เลือก", disabled=not picked):
+                            pairs = [(r[0], r[5]) for r in amb if r[0] in picked]
+                            db.write(lambda c: [reconciliation.confirm_match(c, lid, tid) for lid, tid in pairs]).result()
+                            st.rerun()
+                    else: st.info("ไม่มีรายการที่ต้องตรวจ")
+                with t2:
+                    st.dataframe(pd.DataFrame(reconciliation.lines_by_status(conn, reconciliation.UNMATCHED), columns=line_cols)
+                                 [line_cols[:5]], use_container_width=True, hide_index=True)
+                with t3:
+                    st.dataframe(pd.DataFrame(reconciliation.transactions_by_status(conn, reconciliation.UNMATCHED), columns=tx_cols),
+                                 use_container_width=True, hide_index=True)
+                with t4:
+                    st.dataframe(pd.DataFrame(reconciliation.transactions_by_status(conn, reconciliation.DUPLICATE), columns=tx_cols),
+                                 use_container_width=True, hide_index=True)
+            elif "ประสิทธิภาพ" in choice:
+                st.header("⏱️ ประสิทธิภาพ (Performance)")
+                recent = st.radio("ช่วงเวลา", [True, False], horizontal=True,
+                                  format_func=lambda w: f"{metrics.WINDOW_SLOTS * metrics.SLOT_SECONDS // 60} นาทีล่าสุด" if w else "ตั้งแต่เริ่มเซิร์ฟเวอร์")
+                rows = metrics.METRICS.rows(window=recent)
+                if not rows:
+                    st.info("ยังไม่มีข้อมูล" if metrics.enabled else "ปิดการเก็บ metrics อยู่ (APP_METRICS=0)")
+                else:
+                    df = pd.DataFrame([{
+                        "span": r["name"], "label": ", ".join(f"{k}={v}" for k, v in r["labels"].items()),
+                        "count": r["count"], "total_s": r["sum"], "mean_ms": r["mean"] * 1000,
+                        "p50_ms": r["p50"] * 1000, "p95_ms": r["p95"] * 1000, "p99_ms": r["p99"] * 1000,
+                        "max_ms": r["max"] * 1000} for r in rows])
+                    # เวลาเฉลี่ยต่อ rerun ของแต่ละเมนู แยกเป็น SQL / PDF / สลิป / อื่นๆ (pandas + Streamlit)
+                    reruns = df[df["span"] == "rerun"].set_index("label")["count"]
+                    parts = df[df["span"].str.startswith("rerun.")]
+                    if not parts.empty:
+                        st.subheader("เวลาเฉลี่ยต่อ rerun แยกตามเมนู (ms)")
+                        per_page = parts.pivot_table(index="label", columns="span", values="total_s", aggfunc="sum", fill_value=0)
+                        st.bar_chart(per_page.div(reruns.reindex(per_page.index).fillna(1), axis=0) * 1000)
+                    st.subheader("ทุก span (เรียงตามเวลารวม)")
+                    st.dataframe(df, use_container_width=True, hide_index=True)
+                c1, c2, c3 = st.columns(3)
+                c1.download_button("⬇️ JSON lines", data=functools.partial(metrics.METRICS.to_jsonl, recent),
+                                   file_name="metrics.jsonl", mime="application/x-ndjson")
+                c2.download_button("⬇️ Prometheus", data=metrics.METRICS.to_prometheus,
+                                   file_name="metrics.prom", mime="text/plain")
+                if c3.button("ล้างค่า"):
+                    metrics.METRICS.reset()
+                    st.rerun()
 
 if __name__ == '__main__':
-    main()
+    with metrics.span("rerun", page="เข้าสู่ระบบ"):
+        main()
+    export_metrics_textfile()
@@ -0,0 +1,207 @@
+"""ย้ายรายการของปีที่ปิดแล้วออกจาก data.db ไปเก็บเป็นไฟล์รายปี
+
+    python cli.py archive 2021 2022            # -> archive/transactions_2021.db, ...
+    python cli.py archive 2021 --parquet       # + archive/transactions_2021.parquet สำหรับงานวิเคราะห์
+    python cli.py archive                      # แสดงทะเบียน
+"""
+import os
+import sqlite3
+import sys
+from contextlib import closing
+from datetime import datetime
+
+# --- Yearly Archive ---
+# - ทะเบียนไฟล์อยู่ในตาราง archives (migration 7) ทุก connection ATTACH ไฟล์ตามทะเบียนเป็น arch_YYYY
+#   แล้วสร้าง TEMP VIEW all_transactions = main.transactions UNION ALL ทุก archive (ดู attach)
+# - query ที่ต้องเห็นปีเก่า (ประวัติ, ค้างชำระ, รายการดิบ, ส่งออกใบเสร็จ) อ่านจาก all_transactions
+#   WHERE บน view ถูกส่งลงไปแต่ละไฟล์ จึงยังใช้ index ของแต่ละไฟล์ได้
+#   งานที่ดูแต่รายการปัจจุบัน (กระทบยอด, ตรวจสลิปซ้ำ) อ่าน transactions ใน data.db อย่างเดียว
+# - ย้ายทั้งแถวพร้อม id: id ไม่ซ้ำข้ามไฟล์ และ download_count ในไฟล์ archive ยังถูกบวกได้ (add_downloads)
+#   ใบเสร็จของปีเก่าจึงยังเป็นต้นฉบับ/สำเนาตามจำนวนครั้งที่โหลดจริง
+# - monthly_summary ยังนับรวมปีที่ย้ายไปแล้ว แดชบอร์ดไม่ต้องเปิดไฟล์ archive
+# - SQLite ATTACH ได้ไม่เกิน 10 ไฟล์ต่อ connection (SQLITE_MAX_ATTACHED)
+# - path ในทะเบียนที่ไม่ใช่ absolute อ้างอิงจากโฟลเดอร์ของ data.db (ไม่ขึ้นกับโฟลเดอร์ที่รัน CLI/แอป)
+
+ARCHIVE_DIR = 'archive'
+VIEW = 'all_transactions'
+MAX_ARCHIVES = 10
+
+
+def schema_name(year):
+    return f"arch_{int(year)}"
+
+
+def registered(conn):
+    """[(year, path, rows, archived_at)] ตามทะเบียน"""
+    try:
+        return conn.execute("SELECT year, path, rows, archived_at FROM main.archives ORDER BY year").fetchall()
+    except sqlite3.OperationalError:  # ยัง migrate ไม่ถึงขั้นที่มีตาราง archives
+        return []
+
+
+def _main_path(conn):
+    return next(row[2] for row in conn.execute("PRAGMA database_list") if row[1] == "main")
+
+
+def file_path(conn, path):
+    """ตำแหน่งจริงของไฟล์ตาม path ในทะเบียน"""
+    return os.path.join(os.path.dirname(_main_path(conn)), path)
+
+
+def _columns(conn, schema):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info(transactions)")]
+
+
+def attach(conn):
+    """ATTACH/DETACH ให้ตรงกับทะเบียน แล้วสร้าง all_transactions ใหม่ถ้ามีการเปลี่ยน คืนค่า True ถ้าเปลี่ยน
+    เรียกซ้ำได้บ่อย: ถ้าไม่มีอะไรเปลี่ยนแค่อ่านทะเบียน + PRAGMA database_list (ต้องไม่อยู่ใน transaction)
+    ไฟล์ที่หายไป (ถูกย้าย/ลบ) ถูกข้ามพร้อมคำเตือน: ปีนั้นหายจาก view แต่ปีอื่นและการเขียนยังใช้ได้"""
+    main_cols = _columns(conn, "main")
+    if not main_cols:
+        return False
+    wanted = {schema_name(row[0]): file_path(conn, row[1]) for row in registered(conn)}
+    # ATTACH จะสร้างไฟล์เปล่าให้เงียบๆ ทำให้ปีนั้นหายจาก view โดยไม่มีใครรู้
+    missing = {name: path for name, path in wanted.items() if not os.path.exists(path)}
+    for name in missing:
+        del wanted[name]
+    current = {row[1] for row in conn.execute("PRAGMA database_list") if row[1].startswith("arch_")}
+    has_view = conn.execute("SELECT 1 FROM sqlite_temp_master WHERE type='view' AND name=?", (VIEW,)).fetchone()
+    if has_view and current == set(wanted):
+        return False
+    for path in missing.values():
+        print(f"archive file missing, skipped: {path}", file=sys.stderr)
+    # TEMP VIEW ถือเป็นการเขียน: connection อ่าน (query_only) ต้องปลดชั่วคราว
+    query_only = conn.execute("PRAGMA query_only").fetchone()[0]
+    if query_only:
+        conn.execute("PRAGMA query_only = OFF")
+    try:
+        for name in current - set(wanted):
+            conn.execute(f"DETACH DATABASE {name}")
+        for name in sorted(set(wanted) - current):
+            conn.execute(f"ATTACH DATABASE ? AS {name}", (wanted[name],))
+        selects = [f"SELECT {', '.join(main_cols)} FROM main.transactions"]
+        for name in sorted(wanted):
+            have = set(_columns(conn, name))
+            # archive ที่สร้างก่อน migration ที่เพิ่มคอลัมน์: คอลัมน์ที่ไม่มีเป็น NULL
+            selects.append(f"SELECT {', '.join(c if c in have else f'NULL AS {c}' for c in main_cols)} FROM {name}.transactions")
+        conn.execute(f"DROP VIEW IF EXISTS temp.{VIEW}")
+        conn.execute(f"CREATE TEMP VIEW {VIEW} AS " + " UNION ALL ".join(selects))
+    finally:
+        if query_only:
+            conn.execute("PRAGMA query_only = ON")
+    return True
+
+
+def schemas(conn):
+    """["main", "arch_YYYY", ...] ที่ ATTACH อยู่ สำหรับ query ที่ต้องรันแยกทีละไฟล์
+    (COUNT/DISTINCT บน view ต้องดึงทุกแถวผ่าน UNION ALL แทนที่จะตอบจาก covering index ของแต่ละไฟล์)"""
+    return ["main"] + [row[1] for row in conn.execute("PRAGMA database_list") if row[1].startswith("arch_")]
+
+
+def add_downloads(c, counts):
+    """บวก download_count [(จำนวน, id)] ทั้งใน data.db และทุก archive ที่ ATTACH อยู่ (แต่ละ id อยู่ไฟล์เดียว)"""
+    for schema in schemas(c):
+        c.executemany(f"UPDATE {schema}.transactions SET download_count = COALESCE(download_count, 0) + ? WHERE id=?",
+                      counts)
+
+
+def _copy_to_archive(main_path, path, lo, hi, top_id):
+    """คัดลอกแถวช่วง [lo, hi) ที่ id < top_id จาก data.db ลงไฟล์ archive แล้ว commit
+    (ใช้ schema + index เดียวกับ data.db)"""
+    with closing(sqlite3.connect(path, isolation_level=None)) as dst:
+        dst.execute("PRAGMA journal_mode = WAL")
+        dst.execute("ATTACH DATABASE ? AS live", (main_path,))
+        dst.execute("BEGIN")  # ไม่ใช่ IMMEDIATE: จะขอ write lock ของ live ที่ผู้เรียกถืออยู่ด้วย
+        try:
+            live_cols = dst.execute("PRAGMA live.table_info(transactions)").fetchall()
+            have = set(_columns(dst, "main"))
+            if not have:
+                dst.execute(dst.execute("SELECT sql FROM live.sqlite_master WHERE type='table' AND name='transactions'").fetchone()[0])
+            else:
+                for _, col, col_type, _, default, _ in live_cols:
+                    if col not in have:
+                        dst.execute(f"ALTER TABLE transactions ADD COLUMN {col} {col_type}"
+                                    + (f" DEFAULT {default}" if default is not None else ""))
+            indexes = {row[0] for row in dst.execute("SELECT name FROM main.sqlite_master WHERE type='index'")}
+            for name, sql in dst.execute("SELECT name, sql FROM live.sqlite_master "
+                                         "WHERE type='index' AND tbl_name='transactions' AND sql IS NOT NULL").fetchall():
+                if name not in indexes:
+                    dst.execute(sql)
+            cols = ", ".join(row[1] for row in live_cols)
+            # OR REPLACE: รันซ้ำหลังค้างกลางทางได้
+            dst.execute(f"INSERT OR REPLACE INTO main.transactions ({cols}) SELECT {cols} FROM live.transactions "
+                        "WHERE date >= ? AND date < ? AND id < ?", (lo, hi, top_id))
+            dst.execute("COMMIT")
+        except BaseException:
+            dst.execute("ROLLBACK")
+            raise
+
+
+def archive_year(conn, year, archive_dir=ARCHIVE_DIR, parquet=False):
+    """ย้ายรายการของปี year ไปไฟล์ archive คืนค่าจำนวนแถวที่ย้าย
+    conn: connection เขียนที่คุม transaction เอง (isolation_level=None) เช่น cli.open_writer
+
+    แถวที่ id สูงสุดของ data.db ไม่ถูกย้าย (id ใหม่ = id สูงสุด + 1 จะวนกลับมาชนกับใน archive)
+    แถวนั้นยังเห็นได้ตามปกติ และถูกย้ายในการรันครั้งถัดไปเมื่อมีรายการใหม่กว่าแล้ว
+
+    ถือ write lock ของ data.db ตลอด (แอปเขียนไม่ได้ระหว่างย้าย) แล้วทำ 2 ขั้น:
+    1. คัดลอกลงไฟล์ archive และ commit
+    2. ลบจาก data.db + ลงทะเบียนใน transaction เดียว
+    ค้างระหว่างขั้น 1-2: data.db ยังไม่เปลี่ยน รันคำสั่งเดิมซ้ำได้"""
+    year = int(year)
+    if year >= datetime.now().year:
+        raise ValueError(f"{year} is not a closed year")
+    years = {row[0] for row in registered(conn)}
+    if year not in years and len(years) >= MAX_ARCHIVES:
+        raise ValueError(f"at most {MAX_ARCHIVES} archive files can be attached")
+    lo, hi = f"{year}-01-01", f"{year + 1}-01-01"
+    path = os.path.join(archive_dir, f"transactions_{year}.db")  # ที่ลงทะเบียน (archive_dir เทียบกับโฟลเดอร์ของ data.db)
+    main_path, full_path = _main_path(conn), file_path(conn, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    # BEGIN IMMEDIATE ล็อกทุกไฟล์ที่ ATTACH อยู่ ถอดไฟล์ของปีนี้ออกก่อน (attach() ด้านล่างใส่คืน)
+    if schema_name(year) in {row[1] for row in conn.execute("PRAGMA database_list")}:
+        conn.execute(f"DETACH DATABASE {schema_name(year)}")
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        top_id = conn.execute("SELECT MAX(id) FROM main.transactions").fetchone()[0] or 0
+        cond, params = "date >= ? AND date < ? AND id < ?", (lo, hi, top_id)
+        rows = conn.execute(f"SELECT COUNT(*) FROM main.transactions WHERE {cond}", params).fetchone()[0]
+        if not rows:
+            conn.execute("ROLLBACK")
+            return 0
+        _copy_to_archive(main_path, full_path, lo, hi, top_id)
+        months = conn.execute(f"""SELECT substr(date, 1, 7), COALESCE(category, ''), SUM(COALESCE(amount, 0)), COUNT(*)
+                                  FROM main.transactions WHERE {cond} GROUP BY 1, 2""", params).fetchall()
+        # trigger ลบแถวออกจากดัชนีค้นหาด้วย เก็บไว้ใส่คืน (ค้นหาครอบคลุมปีที่ย้ายแล้ว ดู search.py)
+        indexed = conn.execute(f"""SELECT rowid, note, category, month FROM main.transactions_fts
+                                   WHERE rowid IN (SELECT id FROM main.transactions WHERE {cond})""", params).fetchall()
+        conn.execute(f"DELETE FROM main.transactions WHERE {cond}", params)
+        conn.executemany("INSERT INTO main.transactions_fts (rowid, note, category, month) VALUES (?,?,?,?)", indexed)
+        # trigger หักยอดออกจาก monthly_summary ไปแล้ว ใส่คืน (ยอดรวมยังนับปีที่ย้าย)
+        conn.executemany("""INSERT INTO main.monthly_summary (month, category, total, tx_count) VALUES (?,?,?,?)
+                            ON CONFLICT (month, category) DO UPDATE
+                            SET total = total + excluded.total, tx_count = tx_count + excluded.tx_count""", months)
+        conn.execute("""INSERT INTO main.archives (year, path, rows, archived_at) VALUES (?,?,?,?)
+                        ON CONFLICT (year) DO UPDATE SET rows = rows + excluded.rows, archived_at = excluded.archived_at""",
+                     (year, path, rows, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    attach(conn)
+    if parquet:
+        export_parquet(full_path)
+    return rows
+
+
+def export_parquet(path):
+    """สำเนา Parquet ของไฟล์ archive สำหรับงานวิเคราะห์ (ต้องมี pyarrow) คืนค่า path
+    แอปยังอ่านจากไฟล์ .db เสมอ"""
+    import pandas as pd
+    with closing(sqlite3.connect(path)) as c:
+        df = pd.read_sql("SELECT * FROM transactions ORDER BY date, id", c)
+    out = os.path.splitext(path)[0] + ".parquet"
+    df.to_parquet(out, index=False)
+    return out
@@ -0,0 +1,110 @@
+"""วัดผลของการย้ายปีที่ปิดแล้วไป archive (archive.py) ต่อ query ของแอป
+
+ข้อมูล loadtest.build_db (รายการกระจาย 2021-2025) วัด query ชุดเดียวกันสองรอบ:
+- before: ทุกปีอยู่ใน data.db
+- after:  ย้าย 2021..(--keep-from - 1) ไป archive/ แล้ว VACUUM data.db
+query แบ่งเป็นปีปัจจุบัน (ใช้บ่อย) กับปีที่ถูกย้าย (ต้องข้ามไปอ่านไฟล์ archive)
+รายงานเวลาเฉลี่ย/p95 ต่อ query และขนาดไฟล์
+
+    python benchmarks/bench_archive.py --transactions 500000 --repeat 200
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import archive
+import bulk_export
+import dashboard
+import history
+from db import connect
+from loadtest import build_db
+from migrations import migrate
+
+
+def queries(personnel, current, old):
+    """[(ชื่อ, fn(conn, rnd))]"""
+    return [
+        ("history page", lambda c, r: history.fetch_history_page(c, r.randint(1, personnel))),
+        (f"history {current}", lambda c, r: history.fetch_history_page(c, r.randint(1, personnel), year=current)),
+        (f"history {old}", lambda c, r: history.fetch_history_page(c, r.randint(1, personnel), year=old)),
+        ("history filters", lambda c, r: history.history_filter_options(c, r.randint(1, personnel))),
+        (f"outstanding {current}", lambda c, r: dashboard.count_outstanding(c, f"{current}-{r.randint(1, 12):02d}")),
+        (f"outstanding {old}", lambda c, r: dashboard.count_outstanding(c, f"{old}-{r.randint(1, 12):02d}")),
+        ("raw page (latest)", lambda c, r: dashboard.fetch_transactions_page(c)),
+        (f"raw page {old}", lambda c, r: dashboard.fetch_transactions_page(c, f"{old}-01-01", f"{old + 1}-01-01")),
+        (f"export count {old}", lambda c, r: bulk_export.count_transactions(c, f"{old}-01-01", f"{old}-12-31")),
+    ]
+
+
+def measure(conn, personnel, current, old, repeat):
+    out = {}
+    for name, fn in queries(personnel, current, old):
+        rnd = random.Random(7)
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn(conn, rnd)
+            samples.append((time.perf_counter() - t0) * 1000)
+        samples.sort()
+        out[name] = (sum(samples) / len(samples), samples[int(len(samples) * 0.95)])
+    return out
+
+
+def reader(path):
+    conn = connect(path, query_only=True)
+    archive.attach(conn)
+    return conn
+
+
+def size_mb(*paths):
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p)) / 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--personnel", type=int, default=2000)
+    ap.add_argument("--transactions", type=int, default=500_000)
+    ap.add_argument("--keep-from", type=int, default=2025, help="ปีแรกที่ยังอยู่ใน data.db")
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+    current, old = args.keep_from, args.keep_from - 2
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.db")
+        build_db(path, args.users, args.personnel, args.transactions)
+        with sqlite3.connect(path) as conn:
+            conn.execute("ANALYZE")
+        before = measure(reader(path), args.personnel, current, old, args.repeat)
+        size_before = size_mb(path)
+
+        conn = connect(path)
+        migrate(conn)
+        conn.isolation_level = None
+        archive_dir = os.path.join(tmp, "archive")
+        t0 = time.perf_counter()
+        moved = sum(archive.archive_year(conn, year, archive_dir) for year in range(2021, args.keep_from))
+        print(f"archived {moved:,} rows in {time.perf_counter() - t0:.1f}s")
+        conn.execute("VACUUM")
+        conn.execute("ANALYZE")
+        conn.close()
+        files = [os.path.join(archive_dir, f) for f in os.listdir(archive_dir) if f.endswith(".db")]
+        after = measure(reader(path), args.personnel, current, old, args.repeat)
+
+        print(f"data.db {size_before:.1f} MB -> {size_mb(path):.1f} MB (+ archive {size_mb(*files):.1f} MB)")
+        print(f"{'query':<22}{'before avg':>12}{'p95':>9}{'after avg':>12}{'p95':>9}  ms")
+        for name, (avg, p95) in before.items():
+            a_avg, a_p95 = after[name]
+            print(f"{name:<22}{avg:>12.3f}{p95:>9.3f}{a_avg:>12.3f}{a_p95:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""วัด latency ของงานโต้ตอบ (หน้าโปรไฟล์/ประวัติ) ขณะมีงานหนักค้าง: ทำใน thread เดียวกับแอป vs คิวงานเบื้องหลัง
+
+งานหนัก = เรนเดอร์ใบเสร็จ + บันทึกแจ้งโอน (เก็บสลิป 1 MB + INSERT) สลับกัน
+- idle:   มีแต่ --sessions session โต้ตอบ (ค่าอ้างอิง)
+- inline: เพิ่ม --heavy thread ทำงานหนักใน process เดียวกัน (แบบเดิม: callable ของ download_button
+          และปุ่มแจ้งโอนรันใน thread ของ Streamlit แย่ง GIL กับทุก session)
+- jobs:   ส่งงานหนักจำนวนเท่ากันเข้า JobQueue (worker --heavy thread, เรนเดอร์ใน --processes process)
+รายงาน p50/p95/p99 ของงานโต้ตอบ และจำนวนงานหนักที่เสร็จต่อวินาที
+
+    python benchmarks/bench_jobs.py --sessions 8 --heavy 2 --seconds 15
+"""
+import argparse
+import functools
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import jobs
+import service
+from db import Database
+from jobs import JobQueue
+from loadtest import build_db, sc_history, sc_profile, summarize
+from receipt_template import get_template
+from slip_store import SlipStore
+
+SLIP_BYTES = 1024 * 1024
+
+
+def interactive(db, cfg, sessions, seconds):
+    """session โต้ตอบ: สลับ profile / history คืนค่า latency (ms) ทั้งหมด"""
+    samples, lock = [], threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def session(n):
+        rnd = random.Random(n)
+        local = []
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            (sc_history if rnd.random() < 0.5 else sc_profile)(db, rnd, cfg)
+            local.append((time.perf_counter() - t0) * 1000)
+            time.sleep(0.005)  # เวลาคิดของผู้ใช้ (ไม่ให้ session ยึด GIL ตลอด)
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=session, args=(n,)) for n in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples
+
+
+def heavy_task(i, rnd, cfg):
+    """(kind, payload) ของงานหนักชิ้นที่ i"""
+    if i % 2:
+        return "receipt", jobs.receipt_payload(rnd.randint(1, cfg["transactions"]), f"ลูกบ้าน {i}", "2025-01-01 10:00",
+                                               1500.0, "ค่าส่วนกลาง (Common Fee)", f"งาน {i}", True)
+    return "payment", {"person_id": rnd.randint(1, cfg["personnel"]), "person_name": f"ลูกบ้าน {i}", "amount": 1500.0,
+                       "date": "2025-01-01 10:00", "note": f"งาน {i}", "category": "ค่าส่วนกลาง (Common Fee)",
+                       "data": rnd.randbytes(SLIP_BYTES)}
+
+
+def run_inline(db, store, cfg, heavy, stop_event):
+    done = [0]
+
+    def worker(n):
+        rnd = random.Random(100 + n)
+        i = 0
+        while not stop_event.is_set():
+            kind, payload = heavy_task(i, rnd, cfg)  # แต่ละ thread สลับใบเสร็จ/แจ้งโอน เหมือนลำดับในคิว
+            if kind == "receipt":
+                jobs.render_receipt(payload)
+            else:
+                path, _ = store.save(io.BytesIO(payload["data"]), "slip.png")
+                service.record_payment(db, payload["person_id"], payload["amount"], payload["date"], path,
+                                       payload["note"], payload["category"])
+            done[0] += 1
+            i += 1
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(heavy)]
+    for t in threads:
+        t.start()
+    return done, threads
+
+
+def run_jobs(q, cfg, stop_event, backlog):
+    """เติมคิวให้มีงานรอ backlog ชิ้นตลอดเวลา"""
+    rnd = random.Random(100)
+    def feeder():
+        i = 0
+        while not stop_event.is_set():
+            counts = q.counts()
+            while counts.get(jobs.QUEUED, 0) < backlog and not stop_event.is_set():
+                kind, payload = heavy_task(i, rnd, cfg)
+                if kind == "payment":
+                    payload["spool"] = q.spool(payload.pop("data"), ".png")
+                q.submit(kind, payload)
+                counts[jobs.QUEUED] = counts.get(jobs.QUEUED, 0) + 1
+                i += 1
+            time.sleep(0.05)
+
+    t = threading.Thread(target=feeder, daemon=True)
+    t.start()
+    return t
+
+
+def report(label, samples, seconds, heavy_done=None):
+    s = summarize(samples, seconds)
+    extra = f"   heavy {heavy_done / seconds:6.1f}/s" if heavy_done is not None else ""
+    print(f"  {label:<8} n={s['count']:>7,}  p50 {s['p50_ms']:7.2f}  p95 {s['p95_ms']:7.2f}  "
+          f"p99 {s['p99_ms']:7.2f}  max {s['max_ms']:8.2f} ms{extra}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--personnel", type=int, default=2000)
+    ap.add_argument("--transactions", type=int, default=100_000)
+    ap.add_argument("--sessions", type=int, default=8)
+    ap.add_argument("--heavy", type=int, default=2, help="thread งานหนัก (inline) = worker thread ของคิว (jobs)")
+    ap.add_argument("--processes", type=int, default=2, help="process pool สำหรับเรนเดอร์ PDF ในโหมด jobs")
+    ap.add_argument("--seconds", type=float, default=15)
+    args = ap.parse_args()
+    os.chdir(ROOT)  # ฟอนต์/ลายเซ็นใช้ path สัมพัทธ์
+    cfg = {"users": args.users, "personnel": args.personnel, "transactions": args.transactions}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.db")
+        build_db(path, args.users, args.personnel, args.transactions)
+        db = Database(path)
+        store = SlipStore(os.path.join(tmp, "slips"))
+        get_template()
+        print(f"interactive latency, {args.sessions} sessions, {args.seconds:.0f}s per mode")
+
+        report("idle", interactive(db, cfg, args.sessions, args.seconds), args.seconds)
+
+        stop = threading.Event()
+        done, threads = run_inline(db, store, cfg, args.heavy, stop)
+        samples = interactive(db, cfg, args.sessions, args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        report("inline", samples, args.seconds, done[0])
+
+        q = JobQueue(db, os.path.join(tmp, "jobs"), workers=args.heavy, processes=args.processes,
+                     initializer=jobs.load_receipt_template)
+        q.register("receipt", jobs.render_receipt, cpu=True)
+        q.register("payment", functools.partial(jobs.record_payment, store))
+        q.start()
+        warm = q.submit("receipt", heavy_task(1, random.Random(0), cfg)[1])
+        while q.get(warm)["status"] != jobs.DONE:  # รอ process ลูกโหลด template เสร็จ
+            time.sleep(0.1)
+        before = q.counts().get(jobs.DONE, 0)
+        stop = threading.Event()
+        feeder = run_jobs(q, cfg, stop, backlog=args.heavy * 4)
+        samples = interactive(db, cfg, args.sessions, args.seconds)
+        stop.set()
+        feeder.join()
+        report("jobs", samples, args.seconds, q.counts().get(jobs.DONE, 0) - before)
+
+
+if __name__ == "__main__":
+    main()
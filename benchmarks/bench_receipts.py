@@ -0,0 +1,128 @@
+"""Micro-benchmark: ใบเสร็จต่อวินาที ก่อน/หลังใช้ ReceiptTemplate
+
+before = generate_receipt_pdf ของ app.py รุ่นแรก (คัดลอกไว้ด้านล่าง): สร้าง FPDF ใหม่ + โหลดฟอนต์/ลายเซ็น
+         + วาดทั้งหน้า แล้วเขียนไฟล์ receipt_*.pdf ทุกใบ (ที่นี่เขียนลงโฟลเดอร์ชั่วคราว)
+after  = ใช้ template ที่โหลดไว้แล้ว เติมเฉพาะข้อมูลของแต่ละใบ
+
+    python benchmarks/bench_receipts.py --before 3 --after 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # ฟอนต์และ signature.png อ้างอิงจากโฟลเดอร์โปรเจกต์
+
+from bahttext import bahttext
+from fpdf import FPDF
+
+from receipt_template import ReceiptTemplate
+
+
+def baseline_receipt_pdf(out_dir, trans_id, person_name, date_str, amount, category, note, is_original=True):
+    """generate_receipt_pdf ก่อนปรับ (baseline) ต่างแค่ path ของไฟล์ผลลัพธ์"""
+    pdf = FPDF()
+    pdf.add_page()
+    if os.path.exists('THSarabunNew.ttf'):
+        pdf.add_font('THSarabunNew', '', 'THSarabunNew.ttf', uni=True)
+        pdf.add_font('THSarabunNew', 'B', 'THSarabunNew Bold.ttf', uni=True)
+        font_normal = 'THSarabunNew'
+    else:
+        font_normal = 'Arial'
+
+    pdf.set_font(font_normal, 'B', 20)
+    pdf.cell(0, 10, txt="ใบเสร็จรับเงิน / RECEIPT", ln=1, align='C')
+
+    pdf.set_font(font_normal, 'B', 14)
+    status_text = "ต้นฉบับ / ORIGINAL" if is_original else "สำเนา / COPY"
+    pdf.set_xy(150, 10)
+    pdf.set_text_color(255, 0, 0) if not is_original else pdf.set_text_color(0, 100, 0)
+    pdf.cell(50, 10, txt=f"[{status_text}]", border=1, align='C')
+    pdf.set_text_color(0, 0, 0)
+
+    pdf.ln(20)
+
+    pdf.set_font(font_normal, '', 14)
+    rec_date_obj = datetime.strptime(date_str.split()[0], "%Y-%m-%d")
+    receipt_no = f"RCP-{rec_date_obj.strftime('%Y%m')}-{trans_id:04d}"
+
+    pdf.cell(130, 8, txt=f"ได้รับเงินจาก: {person_name}", ln=0)
+    pdf.cell(60, 8, txt=f"เลขที่: {receipt_no}", ln=1, align='R')
+
+    pdf.cell(130, 8, txt=f"วันที่ชำระ (Date/Time): {date_str}", ln=0)
+    pdf.cell(60, 8, txt=f"สถานะ: ชำระเงินเรียบร้อย", ln=1, align='R')
+    pdf.ln(10)
+
+    pdf.set_fill_color(240, 240, 240)
+    pdf.set_font(font_normal, 'B', 14)
+    pdf.cell(15, 10, txt="#", border=1, align='C', fill=True)
+    pdf.cell(115, 10, txt="รายการ (Description)", border=1, align='C', fill=True)
+    pdf.cell(50, 10, txt="จำนวนเงิน (Amount)", border=1, align='C', fill=True)
+    pdf.ln()
+
+    pdf.set_font(font_normal, '', 14)
+    pdf.cell(15, 10, txt="1", border=1, align='C')
+    pdf.cell(115, 10, txt=f"{category} - {note}", border=1, align='L')
+    pdf.cell(50, 10, txt=f"{amount:,.2f}", border=1, align='R')
+    pdf.ln()
+
+    pdf.set_font(font_normal, 'B', 14)
+    pdf.cell(130, 10, txt="รวมทั้งสิ้น (Grand Total)", border=1, align='R')
+    pdf.cell(50, 10, txt=f"{amount:,.2f}", border=1, align='R', fill=True)
+    pdf.ln()
+
+    thai_text = bahttext(amount)
+    pdf.set_font(font_normal, '', 14)
+    pdf.cell(180, 10, txt=f"( ตัวอักษร: {thai_text} )", border='T', align='C', fill=True)
+
+    pdf.ln(25)
+    pdf.cell(120, 8, txt="", ln=0)
+    line_start_y = pdf.get_y()
+    pdf.cell(70, 8, txt="......................................................", ln=1, align='C')
+    if os.path.exists('signature.png'):
+        pdf.image('signature.png', x=135, y=line_start_y - 12, w=40)
+    pdf.cell(120, 8, txt="", ln=0)
+    pdf.cell(70, 8, txt="( ผู้มีอำนาจลงนาม )", ln=1, align='C')
+    pdf.cell(120, 8, txt="", ln=0)
+    pdf.cell(70, 8, txt="นิติบุคคลอาคารชุด/หมู่บ้าน", ln=1, align='C')
+
+    filename = os.path.join(out_dir, f"receipt_{receipt_no}.pdf")
+    pdf.output(filename)
+    return filename
+
+
+def sample(i):
+    return (i + 1, f"ลูกบ้าน ทดสอบ {i}", f"2024-{i % 12 + 1:02d}-15 10:{i % 60:02d}", 1500.0 + i,
+            "ค่าส่วนกลาง (Common Fee)", f"ค่าส่วนกลาง เดือนที่ {i % 12 + 1}", i % 2 == 0)
+
+
+def run(label, n, render):
+    t0 = time.perf_counter()
+    for i in range(n):
+        render(*sample(i))
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<8} {n:>5} receipts  {elapsed:8.2f}s  {n / elapsed:8.2f} receipts/s")
+    return n / elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--before", type=int, default=3, help="จำนวนใบแบบเดิม (ช้ามาก)")
+    ap.add_argument("--after", type=int, default=100, help="จำนวนใบแบบ template")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        before = run("before", args.before, lambda *a: baseline_receipt_pdf(out_dir, *a))
+    t0 = time.perf_counter()
+    template = ReceiptTemplate()
+    print(f"template load {time.perf_counter() - t0:.2f}s (ครั้งเดียวต่อ process)")
+    after = run("after", args.after, template.render)
+    print(f"speedup x{after / before:.1f}")
+
+
+if __name__ == "__main__":
+    main()
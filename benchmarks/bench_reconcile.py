@@ -0,0 +1,136 @@
+"""วัดความเร็วและความถูกต้องของการกระทบยอด statement ธนาคาร (reconciliation.py) บนข้อมูลสังเคราะห์
+
+ข้อมูล: --units ห้อง x --months เดือน จ่ายค่าส่วนกลาง 1,500 (ยอดเท่ากันหมด = กรณียากสุด) + ค่าน้ำ (ยอดต่างกัน)
+เวลาที่ลูกบ้านกรอก: ส่วนใหญ่ตรงกับสลิป บางส่วนคลาดไม่กี่นาที/หลายสิบนาที
+มีบรรทัดที่ไม่มีคนแจ้ง, รายการแจ้งที่ไม่มีเงินเข้า และแจ้งซ้ำด้วยสลิปเดิม
+
+    python benchmarks/bench_reconcile.py --units 3000 --months 12
+    python benchmarks/bench_reconcile.py --units 300 --months 1 --nested-loop   # เทียบกับลูปซ้อน
+"""
+import argparse
+import csv
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import reconciliation
+from migrations import migrate
+
+
+def generate(units, months, seed=11):
+    """คืนค่า (บรรทัด statement, รายการแจ้งโอน, truth: ลำดับบรรทัด -> ลำดับรายการ)"""
+    rnd = random.Random(seed)
+    lines, txns, truth = [], [], {}
+    for month in range(months):
+        base = datetime(2024 + month // 12, month % 12 + 1, 1)
+        for unit in range(1, units + 1):
+            for amount in (1500.0, float(rnd.randint(100, 900))):
+                paid = base + timedelta(minutes=rnd.randint(0, 10 * 24 * 60))
+                roll = rnd.random()
+                if roll < 0.02:  # เงินเข้าแต่ไม่มีใครแจ้ง
+                    lines.append((paid, amount))
+                    continue
+                if roll < 0.80:
+                    typed = paid
+                elif roll < 0.95:
+                    typed = paid + timedelta(minutes=rnd.choice((-1, 1)) * rnd.randint(1, 5))
+                else:
+                    typed = paid + timedelta(minutes=rnd.choice((-1, 1)) * rnd.randint(10, 50))
+                slip = f"slips/{month}/{unit}/{amount}"
+                if roll > 0.98:  # แจ้งโดยไม่มีเงินเข้าจริง
+                    txns.append((unit, amount, typed, slip + "/x"))
+                    continue
+                truth[len(lines)] = len(txns)
+                lines.append((paid, amount))
+                txns.append((unit, amount, typed, slip))
+                if rnd.random() < 0.01:  # แจ้งซ้ำด้วยสลิปเดิม
+                    txns.append((unit, amount, typed + timedelta(minutes=rnd.randint(1, 300)), slip))
+    order = sorted(range(len(lines)), key=lambda i: lines[i][0])  # statement เรียงตามเวลา
+    position = {old: new for new, old in enumerate(order)}
+    truth = {position[li]: ti for li, ti in truth.items()}
+    return [lines[i] for i in order], txns, truth
+
+
+def build(path, units, txns):
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    conn.executemany("INSERT INTO personnel (id, name) VALUES (?, ?)", ((u, f"ห้อง {u}") for u in range(1, units + 1)))
+    conn.executemany("INSERT INTO transactions (id, person_id, amount, date, slip_path, category) VALUES (?,?,?,?,?,?)",
+                     ((i + 1, u, a, t.strftime("%Y-%m-%d %H:%M"), s, "ค่าส่วนกลาง (Common Fee)")
+                      for i, (u, a, t, s) in enumerate(txns)))
+    conn.commit()
+    return conn
+
+
+def write_statement(path, lines):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["Date", "Time", "Credit", "Description"])
+        for paid, amount in lines:
+            w.writerow([paid.strftime("%d/%m/%Y"), paid.strftime("%H:%M"), f"{amount:,.2f}", "TRANSFER IN"])
+
+
+def nested_loop(lines, txns, window):
+    """แบบตรงไปตรงมา: ทุกบรรทัดวนดูทุกรายการ (ไว้เทียบเวลาเท่านั้น)"""
+    found = 0
+    for paid, amount in lines:
+        for _, t_amount, typed, _ in txns:
+            if t_amount == amount and abs((typed - paid).total_seconds()) <= window * 60:
+                found += 1
+    return found
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--units", type=int, default=3000)
+    ap.add_argument("--months", type=int, default=12)
+    ap.add_argument("--window", type=int, default=reconciliation.DEFAULT_WINDOW_MINUTES)
+    ap.add_argument("--nested-loop", action="store_true", help="จับเวลาลูปซ้อนบนข้อมูลชุดเดียวกันด้วย")
+    args = ap.parse_args()
+
+    lines, txns, truth = generate(args.units, args.months)
+    print(f"{len(lines):,} statement lines, {len(txns):,} reported transfers")
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build(os.path.join(tmp, "data.db"), args.units, txns)
+        csv_path = os.path.join(tmp, "statement.csv")
+        write_statement(csv_path, lines)
+
+        conn.isolation_level = None
+        # แบบหน้าแอป: อ่าน + จับคู่นอก transaction เขียน แล้วบันทึกใน transaction เดียว (ตรวจข้อมูลซ้ำด้วย)
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            plan = reconciliation.prepare_import(conn, f, window=args.window)
+        t0 = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        stats = reconciliation.apply_import(conn.cursor(), plan)
+        conn.execute("COMMIT")
+        print(f"import + match + save: {stats['seconds']:.2f}s (write transaction {time.perf_counter() - t0:.2f}s)")
+        print("  " + ", ".join(f"{k} {v}" for k, v in stats.items() if k != "seconds"))
+
+        # ความถูกต้องเทียบกับ truth (id ของบรรทัด = ลำดับใน CSV + 1, id ของรายการ = ลำดับ + 1)
+        for status in (reconciliation.MATCHED, reconciliation.AMBIGUOUS):
+            pairs = conn.execute("SELECT id, transaction_id FROM statement_lines WHERE status=?", (status,)).fetchall()
+            correct = sum(1 for lid, tid in pairs if truth.get(lid - 1) == tid - 1)
+            print(f"  {status:<10} {len(pairs):>8,} pairs, {correct / len(pairs) if pairs else 0:.1%} correct")
+
+        t0 = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            reconciliation.import_statement(conn.cursor(), f, window=args.window)
+        conn.execute("COMMIT")
+        print(f"re-import same file (all lines duplicate): {time.perf_counter() - t0:.2f}s")
+
+        if args.nested_loop:
+            t0 = time.perf_counter()
+            nested_loop(lines, txns, args.window)
+            print(f"nested loop candidate search only: {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
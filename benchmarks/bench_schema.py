@@ -0,0 +1,109 @@
+"""เทียบ query plan และ latency ก่อน/หลัง migrations (index + date ที่ normalize แล้ว)
+
+สร้างฐานข้อมูลสังเคราะห์แบบ schema เดิม (เวอร์ชัน 1, ไม่มี index) แล้ววัด query หลักของแอป
+จากนั้นรัน migrate() จนถึงเวอร์ชันล่าสุดแล้ววัดซ้ำ
+
+    python benchmarks/bench_schema.py --rows 500000 --residents 5000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from migrations import LATEST_VERSION, migrate
+
+CATEGORIES = ["ค่าส่วนกลาง (Common Fee)", "ค่าน้ำประปา", "ค่าบัตรจอดรถ/คีย์การ์ด", "ค่าปรับ", "ค่าใช้จ่ายอื่นๆ"]
+
+QUERIES = {
+    "login": ("SELECT * FROM users WHERE username=?", lambda r: (f"user{r.randrange(R)}",)),
+    "profile": ("SELECT * FROM personnel WHERE owner_id=?", lambda r: (r.randrange(1, R + 1),)),
+    "history page": ("SELECT id, amount, date, note, category, COALESCE(download_count, 0) FROM transactions "
+                     "WHERE person_id=? ORDER BY date DESC, id DESC LIMIT 11", lambda r: (r.randrange(1, R + 1),)),
+    "history year": ("SELECT id, amount, date, note, category, COALESCE(download_count, 0) FROM transactions "
+                     "WHERE person_id=? AND date >= ? AND date < ? ORDER BY date DESC, id DESC LIMIT 11",
+                     lambda r: (r.randrange(1, R + 1), "2023-01-01", "2024-01-01")),
+    "history filters": ("SELECT DISTINCT category FROM transactions WHERE person_id=? AND category IS NOT NULL",
+                        lambda r: (r.randrange(1, R + 1),)),
+    "dashboard month": ("SELECT SUM(amount), COUNT(*) FROM transactions WHERE date >= ? AND date < ?",
+                        lambda r: ("2023-06-01", "2023-07-01")),
+}
+R = 0  # จำนวนลูกบ้าน (ตั้งค่าใน main)
+
+
+def build(path, rows, residents, seed=1):
+    conn = sqlite3.connect(path)
+    migrate(conn, target=1)  # schema เดิม ไม่มี index
+    rnd = random.Random(seed)
+    conn.executemany("INSERT INTO users (id, username, password, role) VALUES (?,?,?,?)",
+                     ((i, f"user{i}", "x", "user") for i in range(1, residents + 1)))
+    conn.executemany("INSERT INTO personnel (id, owner_id, name, phone, address) VALUES (?,?,?,?,?)",
+                     ((i, i, f"ลูกบ้าน {i}", f"08{i:08d}", f"ห้อง {i}") for i in range(1, residents + 1)))
+
+    def tx():
+        for i in range(rows):
+            y, m, d = rnd.randint(2020, 2024), rnd.randint(1, 12), rnd.randint(1, 28)
+            yield (rnd.randint(1, residents), rnd.choice((1500.0, 350.0, 500.0, 1000.0)),
+                   f"{y}-{m:02d}-{d:02d} {rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}",
+                   "", "note", rnd.choice(CATEGORIES), rnd.randint(0, 2))
+    conn.executemany("INSERT INTO transactions (person_id, amount, date, slip_path, note, category, download_count) "
+                     "VALUES (?,?,?,?,?,?,?)", tx())
+    conn.commit()
+    return conn
+
+
+def measure(conn, repeat):
+    rnd = random.Random(7)
+    out = {}
+    for name, (sql, params) in QUERIES.items():
+        plan = " | ".join(r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params(rnd)))
+        times = []
+        for _ in range(repeat):
+            p = params(rnd)
+            t0 = time.perf_counter()
+            conn.execute(sql, p).fetchall()
+            times.append((time.perf_counter() - t0) * 1000)
+        out[name] = (statistics.median(times), plan)
+    return out
+
+
+def main():
+    global R
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=500_000)
+    ap.add_argument("--residents", type=int, default=5_000)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--db", help="path ของไฟล์ทดสอบ (ค่าเริ่มต้น: ไฟล์ชั่วคราว)")
+    args = ap.parse_args()
+    R = args.residents
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+    t0 = time.perf_counter()
+    conn = build(path, args.rows, args.residents)
+    print(f"built {args.rows:,} transactions in {time.perf_counter() - t0:.1f}s -> {path}")
+
+    before = measure(conn, args.repeat)
+    t0 = time.perf_counter()
+    migrate(conn)
+    print(f"migrate 1 -> {LATEST_VERSION}: {time.perf_counter() - t0:.1f}s")
+    t0 = time.perf_counter()
+    migrate(conn)
+    print(f"startup check at latest version: {(time.perf_counter() - t0) * 1e6:.0f} µs")
+    after = measure(conn, args.repeat)
+
+    print(f"\n{'query':<16} {'before ms':>10} {'after ms':>10}")
+    for name in QUERIES:
+        print(f"{name:<16} {before[name][0]:>10.3f} {after[name][0]:>10.3f}")
+    print("\nquery plans")
+    for name in QUERIES:
+        print(f"  {name}\n    before: {before[name][1]}\n    after:  {after[name][1]}")
+
+
+if __name__ == "__main__":
+    main()
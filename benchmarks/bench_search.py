@@ -0,0 +1,127 @@
+"""วัด latency ของการค้นหา (search.py, FTS5 trigram) เทียบกับ LIKE '%...%' ทั้งตาราง
+
+ข้อมูล loadtest.build_db (หมายเหตุแบบ "ค่าน้ำประปา 7/2024") + ย้ายปีเก่าไป archive ได้ด้วย --archive-before
+รายงานเวลาเฉลี่ย/p95 ต่อ query (หน้าแรก + facet ประเภท/เดือน ครบตามที่หน้าแอดมินเรียก)
+และต้นทุนการเขียนที่เพิ่มจาก trigger ของดัชนี (INSERT ทีละแถวแบบหน้าแจ้งโอน)
+
+    python benchmarks/bench_search.py --transactions 500000 --repeat 20
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import archive
+import search
+import service
+from db import connect
+from loadtest import build_db
+from migrations import migrate
+
+WATER = "ค่าน้ำประปา"
+
+
+def cases(personnel):
+    """[(ชื่อ, fn(conn) ด้วย FTS, fn(conn) ด้วย LIKE หรือ None)]"""
+    def like_tx(word, where="", params=()):
+        return lambda c: c.execute(
+            f"SELECT id, date, note FROM all_transactions WHERE (note LIKE ? OR category LIKE ?){where} "
+            "ORDER BY date DESC LIMIT 20", (f"%{word}%", f"%{word}%") + params).fetchall()
+
+    def like_people(word):
+        return lambda c: c.execute("SELECT * FROM personnel WHERE name LIKE ? OR phone LIKE ? OR address LIKE ? "
+                                   "LIMIT 20", (f"%{word}%",) * 3).fetchall()
+
+    name, phone = f"ลูกบ้าน {personnel // 2}", f"08{personnel // 3:08d}"
+    return [
+        (f"resident '{name}'", lambda c: search.search_residents(c, name), like_people(name)),
+        (f"resident '{phone}'", lambda c: search.search_residents(c, phone), like_people(phone)),
+        ("resident '12' (short)", lambda c: search.search_residents(c, "12"), like_people("12")),
+        ("tx '7/2023' (rare)", lambda c: search.search_transactions(c, "7/2023"), like_tx("7/2023")),
+        (f"tx '{WATER}'", lambda c: search.search_transactions(c, WATER), like_tx(WATER)),
+        (f"tx '{WATER}' month", lambda c: search.search_transactions(c, WATER, month="2023-07"),
+         like_tx(WATER, " AND date >= ? AND date < ?", ("2023-07-01", "2023-08-01"))),
+        (f"tx '{WATER}' page 50", lambda c: search.search_transactions(c, WATER, page=50), None),
+        ("tx '7/2023' + category", lambda c: search.search_transactions(c, "7/2023", category=WATER), None),
+        ("tx 'ค่า' (every row)", lambda c: search.search_transactions(c, "ค่า", category=WATER), None),
+    ]
+
+
+def timed(fn, conn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(conn)
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return sum(samples) / len(samples), samples[int(len(samples) * 0.95)]
+
+
+def write_cost(path, rows):
+    """เวลา INSERT ทีละแถว (commit ทุกแถว) ต่อแถว มี/ไม่มี trigger ของดัชนีค้นหา"""
+    out = []
+    for label, drop in (("with fts triggers", False), ("without", True)):
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("BEGIN")
+        if drop:
+            for event in ("insert", "delete", "update"):
+                conn.execute(f"DROP TRIGGER trg_transactions_fts_{event}")
+        t0 = time.perf_counter()
+        for i in range(rows):
+            service.insert_payment(conn, i % 100 + 1, 1500.0, "2025-06-01 10:00", "", f"{WATER} เพิ่ม {i}", WATER)
+        out.append((label, (time.perf_counter() - t0) / rows * 1000))
+        conn.execute("ROLLBACK")
+        conn.close()
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--personnel", type=int, default=2000)
+    ap.add_argument("--transactions", type=int, default=500_000)
+    ap.add_argument("--archive-before", type=int, default=0, help="ย้ายปี 2021..(ค่านี้ - 1) ไป archive ก่อนวัด")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.db")
+        t0 = time.perf_counter()
+        build_db(path, args.users, args.personnel, args.transactions)
+        print(f"build {args.transactions:,} rows (with fts triggers): {time.perf_counter() - t0:.1f}s")
+        conn = connect(path)
+        migrate(conn)
+        archive.attach(conn)
+        conn.isolation_level = None
+        for year in range(2021, args.archive_before):
+            archive.archive_year(conn, year, os.path.join(tmp, "archive"))
+        t0 = time.perf_counter()
+        service.rebuild_search_index(conn)
+        print(f"rebuild-search: {time.perf_counter() - t0:.1f}s")
+        conn.execute("ANALYZE")
+        conn.close()
+
+        conn = connect(path, query_only=True)
+        archive.attach(conn)
+        print(f"{'query':<30}{'fts avg':>10}{'p95':>9}{'like avg':>11}{'p95':>9}  ms")
+        for name, fts, like in cases(args.personnel):
+            avg, p95 = timed(fts, conn, args.repeat)
+            line = f"{name:<30}{avg:>10.2f}{p95:>9.2f}"
+            if like:
+                l_avg, l_p95 = timed(like, conn, max(3, args.repeat // 5))
+                line += f"{l_avg:>11.2f}{l_p95:>9.2f}"
+            print(line)
+        for label, ms in write_cost(path, 2000):
+            print(f"insert_payment {label:<18} {ms:.3f} ms/row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""วัดเวลา import ของ service/CLI เทียบกับชุด import ของ UI และความเร็วนำเข้า CSV (rows/s)
+
+1. import time: รัน python ใหม่ทุกครั้ง (ไม่มีโมดูลค้างในแคช) เอาค่าที่ดีที่สุดจาก --repeat รอบ
+2. bulk insert: สร้าง CSV รายการชำระ --rows แถว แล้วนำเข้าด้วย import_transactions ที่ batch size ต่างๆ
+   เทียบกับแบบเดิม (INSERT + commit ทีละแถว เหมือนหน้าแจ้งโอน) บน --legacy-rows แถวแรก
+
+    python benchmarks/bench_service.py --rows 200000
+"""
+import argparse
+import csv
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import service
+from cli import open_writer
+from migrations import normalize_date
+
+IMPORTS = {
+    "service": "import service",
+    "cli": "import cli",
+    "service + first receipt module": "import service, receipt_template",
+    "UI stack (streamlit, pandas, fpdf)": "import streamlit, pandas, fpdf",
+}
+
+
+def import_time(stmt, repeat):
+    code = f"import time; t = time.perf_counter(); {stmt}; print(time.perf_counter() - t)"
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+        t = float(out.stdout.strip().splitlines()[-1])
+        best = t if best is None else min(best, t)
+    return best
+
+
+def write_csv(path, rows, residents, seed=5):
+    rnd = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["person_id", "amount", "date", "category", "note"])
+        for _ in range(rows):
+            y, m, d = rnd.randint(2021, 2025), rnd.randint(1, 12), rnd.randint(1, 28)
+            w.writerow([rnd.randint(1, residents), 1500, f"{d:02d}/{m:02d}/{y} 10:30",
+                        "ค่าส่วนกลาง (Common Fee)", f"ค่าส่วนกลาง {m}/{y}"])
+
+
+def fresh_db(tmp, name, residents):
+    path = os.path.join(tmp, name)
+    conn = open_writer(path)
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO personnel (id, name) VALUES (?, ?)",
+                     ((i, f"ลูกบ้าน {i}") for i in range(1, residents + 1)))
+    conn.execute("COMMIT")
+    return conn
+
+
+def legacy_insert(conn, path, limit):
+    """แบบเดิม: 1 แถว = 1 INSERT + commit"""
+    conn.isolation_level = ""
+    t0 = time.perf_counter()
+    n = 0
+    with open(path, newline="", encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            if n >= limit:
+                break
+            conn.execute("INSERT INTO transactions (person_id,amount,date,slip_path,note,category) VALUES (?,?,?,?,?,?)",
+                         (int(r["person_id"]), float(r["amount"]), normalize_date(r["date"]), "", r["note"], r["category"]))
+            conn.commit()
+            n += 1
+    return n / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--residents", type=int, default=2000)
+    ap.add_argument("--legacy-rows", type=int, default=5000)
+    ap.add_argument("--batch-sizes", default="1000,10000,50000")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    print("import time (best of %d, fresh interpreter)" % args.repeat)
+    for label, stmt in IMPORTS.items():
+        print(f"  {label:<36} {import_time(stmt, args.repeat) * 1000:8.1f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "transactions.csv")
+        write_csv(path, args.rows, args.residents)
+        print(f"\nbulk insert {args.rows:,} rows (triggers for date check + monthly_summary active)")
+        rate = legacy_insert(fresh_db(tmp, "legacy.db", args.residents), path, args.legacy_rows)
+        print(f"  {'row-by-row commit':<36} {rate:12,.0f} rows/s  (first {args.legacy_rows:,} rows)")
+        for size in map(int, args.batch_sizes.split(",")):
+            result = service.import_transactions(fresh_db(tmp, f"batch_{size}.db", args.residents), path, size)
+            print(f"  {f'executemany, batch {size:,}':<36} {result.rows_per_second:12,.0f} rows/s  ({result})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""เทียบที่เก็บสลิปแบบเดิม (โฟลเดอร์เดียว) กับ SlipStore (sharded + content hash) ที่ 100k ไฟล์
+
+วัด: เวลาเขียน, เวลาหาไฟล์ (os.path.exists แบบสุ่ม), เวลา list โฟลเดอร์ที่ต้องเปิด, และพื้นที่ที่ประหยัดจากไฟล์ซ้ำ
+
+    python benchmarks/bench_slips.py --files 100000 --dup-rate 0.05
+"""
+import argparse
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from slip_store import SlipStore
+
+
+def payloads(n, size, dup_rate, seed=3):
+    rnd = random.Random(seed)
+    made = []
+    for i in range(n):
+        if made and rnd.random() < dup_rate:
+            yield f"dup_{i}.jpg", rnd.choice(made)  # ลูกบ้านอัปโหลดสลิปเดิมซ้ำ
+        else:
+            data = rnd.randbytes(size)
+            if len(made) < 1000:
+                made.append(data)
+            yield f"slip_{i}.jpg", data
+
+
+def timed(label, fn):
+    t0 = time.perf_counter()
+    result = fn()
+    print(f"  {label:<34} {time.perf_counter() - t0:8.3f}s")
+    return result
+
+
+def bench_flat(base, items, probes):
+    root = os.path.join(base, "flat")
+    os.makedirs(root)
+    paths = []
+
+    def write():
+        for i, (name, data) in enumerate(items):
+            # แบบเดิม: slips/{timestamp}_{name} (ใส่ลำดับแทน timestamp เพื่อไม่ให้ชื่อชน)
+            p = os.path.join(root, f"{i:08d}_{name}")
+            with open(p, "wb") as f:
+                f.write(data)
+            paths.append(p)
+    print("flat directory")
+    timed("write", write)
+    sample = random.Random(1).sample(paths, probes)
+    timed(f"exists x{probes}", lambda: [os.path.exists(p) for p in sample])
+    n = timed("list directory", lambda: len(os.listdir(root)))
+    print(f"  files {n:,}  entries in largest dir {n:,}")
+
+
+def bench_store(base, items, probes):
+    store = SlipStore(os.path.join(base, "sharded"))
+    paths, new = [], [0]
+
+    def write():
+        for name, data in items:
+            p, is_new = store.save(io.BytesIO(data), name)
+            paths.append(p)
+            new[0] += is_new
+    print("content-addressed store")
+    timed("write (hash + tmp + rename)", write)
+    sample = random.Random(1).sample(paths, probes)
+    timed(f"exists x{probes}", lambda: [os.path.exists(p) for p in sample])
+    shard = os.path.dirname(paths[0])
+    timed("list one shard", lambda: len(os.listdir(shard)))
+    largest = max(len(files) for _, _, files in os.walk(store.root))
+    print(f"  files {new[0]:,} (deduplicated {len(paths) - new[0]:,})  entries in largest dir {largest:,}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=100_000)
+    ap.add_argument("--size", type=int, default=512, help="ขนาดไฟล์ (bytes)")
+    ap.add_argument("--dup-rate", type=float, default=0.05)
+    ap.add_argument("--probes", type=int, default=10_000)
+    args = ap.parse_args()
+    items = list(payloads(args.files, args.size, args.dup_rate))
+    base = tempfile.mkdtemp()
+    try:
+        bench_flat(base, items, min(args.probes, args.files))
+        bench_store(base, items, min(args.probes, args.files))
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Load test ของ data layer และการสร้างใบเสร็จ
+
+1. สร้าง data.db สังเคราะห์ (จำนวน users / personnel / transactions ตั้งค่าได้)
+2. จำลอง N session พร้อมกัน แต่ละ session สุ่มทำงานตามสัดส่วน (--mix) ด้วย query เดียวกับที่ main() ใช้:
+   login, profile, history (หน้าแรก + ตัวกรอง), dashboard (summary + ค้างชำระ), receipt (render PDF)
+3. รายงาน throughput และ p50/p95/p99 ต่อ scenario แล้วบันทึกเป็น JSON ไว้เทียบกับรอบก่อน (--compare)
+4. --apptest: รันหน้าจริงของแอปผ่าน streamlit.testing AppTest แล้ววัดเวลา rerun ทั้งหน้า
+
+    python benchmarks/loadtest.py --sessions 16 --seconds 20
+    python benchmarks/loadtest.py --transactions 500000 --mix history=5,receipt=0 --compare benchmarks/results/old.json
+    python benchmarks/loadtest.py --apptest --apptest-runs 20
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dashboard
+from db import Database
+from history import fetch_history_page, history_filter_options
+from migrations import migrate
+from receipt_template import get_template, render_receipt_pdf
+
+CATEGORIES = [dashboard.COMMON_FEE, "ค่าน้ำประปา", "ค่าบัตรจอดรถ/คีย์การ์ด", "ค่าปรับ", "ค่าใช้จ่ายอื่นๆ"]
+PASSWORD = "loadtest"
+DEFAULT_MIX = "login=1,profile=3,history=4,dashboard=1,receipt=1"
+
+
+def _hash(text):
+    return hashlib.sha256(str.encode(text)).hexdigest()
+
+
+def build_db(path, users, personnel, transactions, seed=1):
+    """users คนแรก = admin, personnel ผูกกับ users ตามลำดับ (owner_id = user id)"""
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    pw = _hash(PASSWORD)
+    conn.executemany("INSERT INTO users (id, username, password, role) VALUES (?,?,?,?)",
+                     ((i, f"user{i}", pw, "admin" if i == 1 else "user") for i in range(1, users + 1)))
+    conn.executemany("INSERT INTO personnel (id, owner_id, name, phone, address) VALUES (?,?,?,?,?)",
+                     ((i, (i - 1) % users + 1, f"ลูกบ้าน {i}", f"08{i:08d}", f"ห้อง {i}")
+                      for i in range(1, personnel + 1)))
+
+    def rows():
+        for _ in range(transactions):
+            y, m, d = rnd.randint(2021, 2025), rnd.randint(1, 12), rnd.randint(1, 28)
+            cat = rnd.choice(CATEGORIES)
+            yield (rnd.randint(1, personnel), rnd.choice((1500.0, 350.0, 500.0, 1000.0)),
+                   f"{y}-{m:02d}-{d:02d} {rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}",
+                   "", f"{cat} {m}/{y}", cat, rnd.randint(0, 2))
+    conn.executemany("INSERT INTO transactions (person_id, amount, date, slip_path, note, category, download_count) "
+                     "VALUES (?,?,?,?,?,?,?)", rows())
+    conn.commit()
+    conn.close()
+
+
+# --- scenarios: แต่ละฟังก์ชันรับ (db, rnd, cfg) และทำงานเหมือน 1 หน้าใน main() ---
+def sc_login(db, rnd, cfg):
+    u = f"user{rnd.randint(1, cfg['users'])}"
+    d = db.connection().execute('SELECT * FROM users WHERE username=?', (u,)).fetchone()
+    assert d and _hash(PASSWORD) == d[2]
+
+
+def sc_profile(db, rnd, cfg):
+    db.connection().execute("SELECT * FROM personnel WHERE owner_id=?", (rnd.randint(1, cfg['users']),)).fetchone()
+
+
+def sc_history(db, rnd, cfg):
+    conn = db.connection()
+    prof = conn.execute("SELECT * FROM personnel WHERE owner_id=?", (rnd.randint(1, cfg['users']),)).fetchone()
+    if prof:
+        history_filter_options(conn, prof[0])
+        fetch_history_page(conn, prof[0])
+
+
+def sc_dashboard(db, rnd, cfg):
+    conn = db.connection()
+    dashboard.income_summary(conn, "2025-01", "2025-12")
+    month = f"2025-{rnd.randint(1, 12):02d}"
+    dashboard.count_outstanding(conn, month)
+    dashboard.outstanding_residents(conn, month)
+
+
+def sc_receipt(db, rnd, cfg):
+    conn = db.connection()
+    row = conn.execute("SELECT t.id, p.name, t.date, t.amount, t.category, t.note, t.download_count "
+                       "FROM transactions t JOIN personnel p ON p.id = t.person_id WHERE t.id=?",
+                       (rnd.randint(1, cfg['transactions']),)).fetchone()
+    if row:
+        render_receipt_pdf(row[0], row[1], row[2], row[3], row[4], row[5], row[6] == 0)
+
+
+SCENARIOS = {
+    "login": sc_login,
+    "profile": sc_profile,
+    "history": sc_history,
+    "dashboard": sc_dashboard,
+    "receipt": sc_receipt,
+}
+
+
+def parse_mix(text):
+    mix = {name: float(w) for name, _, w in (p.partition("=") for p in DEFAULT_MIX.split(","))}
+    for part in filter(None, text.split(",")):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"unknown scenario: {name}")
+        mix[name] = float(weight)
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+def summarize(samples, elapsed):
+    samples = sorted(samples)
+    if not samples:
+        return {"count": 0}
+    q = statistics.quantiles(samples, n=100) if len(samples) > 1 else [samples[0]] * 99
+    return {"count": len(samples), "throughput": len(samples) / elapsed,
+            "p50_ms": q[49], "p95_ms": q[94], "p99_ms": q[98], "max_ms": samples[-1]}
+
+
+def run_load(db_path, cfg, sessions, seconds, mix):
+    db = Database(db_path)
+    if "receipt" in mix:
+        get_template()  # โหลด template ก่อนเริ่มจับเวลา
+    names, weights = list(mix), list(mix.values())
+    results = {name: [] for name in names}
+    errors = []
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def session(n):
+        rnd = random.Random(1000 + n)
+        local = {name: [] for name in names}
+        while time.perf_counter() < stop:
+            name = rnd.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                SCENARIOS[name](db, rnd, cfg)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{name}: {e!r}")
+                continue
+            local[name].append((time.perf_counter() - t0) * 1000)
+        with lock:
+            for name in names:
+                results[name].extend(local[name])
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(n,)) for n in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    out = {name: summarize(results[name], elapsed) for name in names}
+    out["all"] = summarize([x for v in results.values() for x in v], elapsed)
+    return out, errors
+
+
+def run_apptest(db_path, runs):
+    """วัดเวลา rerun ทั้งหน้าของ app.py (ผู้ใช้ admin) ผ่าน AppTest"""
+    from streamlit.testing.v1 import AppTest
+
+    work = tempfile.mkdtemp()
+    shutil.copy(db_path, os.path.join(work, "data.db"))
+    for name in os.listdir(ROOT):
+        if name.endswith((".ttf", ".png")):
+            shutil.copy(os.path.join(ROOT, name), work)
+    cwd = os.getcwd()
+    os.chdir(work)
+    try:
+        at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=300).run()
+        at.session_state["user_id"], at.session_state["username"], at.session_state["role"] = 1, "user1", "admin"
+        at.run()
+        pages = {}
+        for page in ["หน้าหลัก", "ข้อมูลส่วนตัว", "ชำระเงิน/แจ้งโอน", "ประวัติ/ดาวน์โหลดใบเสร็จ", "Admin: แดชบอร์ด"]:
+            at.sidebar.radio[0].set_value(page).run()  # รอบแรก (cold) ไม่นับ
+            samples = []
+            for _ in range(runs):
+                t0 = time.perf_counter()
+                at.run()
+                samples.append((time.perf_counter() - t0) * 1000)
+            if at.exception:
+                raise RuntimeError(f"{page}: {at.exception}")
+            pages[page] = summarize(samples, sum(samples) / 1000)
+        return pages
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def print_table(title, stats, previous=None):
+    print(f"\n{title}")
+    print(f"  {'scenario':<28} {'count':>8} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, s in stats.items():
+        if not s.get("count"):
+            continue
+        line = (f"  {name:<28} {s['count']:>8} {s['throughput']:>9.1f} "
+                f"{s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f}")
+        prev = (previous or {}).get(name)
+        if prev and prev.get("count"):
+            line += f"   p95 {(s['p95_ms'] / prev['p95_ms'] - 1) * 100:+.0f}% vs previous"
+        print(line)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--personnel", type=int, default=2000)
+    ap.add_argument("--transactions", type=int, default=100_000)
+    ap.add_argument("--sessions", type=int, default=16)
+    ap.add_argument("--seconds", type=float, default=15)
+    ap.add_argument("--mix", default="", help=f"น้ำหนักต่อ scenario (ค่าเริ่มต้น {DEFAULT_MIX})")
+    ap.add_argument("--db", help="ใช้ฐานข้อมูลที่มีอยู่แล้ว (ไม่สร้างใหม่)")
+    ap.add_argument("--apptest", action="store_true", help="วัด rerun ทั้งหน้าด้วย AppTest ด้วย")
+    ap.add_argument("--apptest-runs", type=int, default=10)
+    ap.add_argument("--out", help="ไฟล์ JSON ผลลัพธ์ (ค่าเริ่มต้น benchmarks/results/loadtest_<เวลา>.json)")
+    ap.add_argument("--compare", help="ไฟล์ JSON ของรอบก่อนเพื่อเทียบ p95")
+    args = ap.parse_args()
+
+    os.chdir(ROOT)  # ฟอนต์และลายเซ็นอ้างอิงจากโฟลเดอร์แอป เหมือนตอนรัน streamlit
+    tmp = None
+    if args.db:
+        db_path = os.path.abspath(args.db)
+        conn = sqlite3.connect(db_path)
+        cfg = {"users": conn.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+               "personnel": conn.execute("SELECT COUNT(*) FROM personnel").fetchone()[0],
+               "transactions": conn.execute("SELECT MAX(id) FROM transactions").fetchone()[0] or 0}
+        conn.close()
+    else:
+        tmp = tempfile.mkdtemp()
+        db_path = os.path.join(tmp, "data.db")
+        cfg = {"users": args.users, "personnel": args.personnel, "transactions": args.transactions}
+        t0 = time.perf_counter()
+        build_db(db_path, **cfg)
+        print(f"synthetic db: {cfg} built in {time.perf_counter() - t0:.1f}s")
+
+    mix = parse_mix(args.mix)
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": dict(cfg, sessions=args.sessions, seconds=args.seconds, mix=mix),
+        "env": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                "cpus": os.cpu_count(), "platform": platform.platform()},
+    }
+    try:
+        report["scenarios"], errors = run_load(db_path, cfg, args.sessions, args.seconds, mix)
+        report["errors"] = errors[:50]
+        if args.apptest:
+            report["apptest"] = run_apptest(db_path, args.apptest_runs)
+    finally:
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    print_table(f"load: {args.sessions} sessions x {args.seconds:.0f}s", report["scenarios"],
+                previous and previous.get("scenarios"))
+    if "apptest" in report:
+        print_table("AppTest full-page reruns", report["apptest"], previous and previous.get("apptest"))
+    if errors:
+        print(f"\n{len(errors)} errors, first: {errors[0]}")
+
+    out = os.path.abspath(args.out) if args.out else os.path.join(ROOT, "benchmarks", "results",
+                                   f"loadtest_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nsaved {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Stress test: หลาย session อ่าน/เขียนพร้อมกัน เทียบแบบเดิมกับ db.Database
+
+legacy = connection เดียวใช้ร่วมทุก thread (check_same_thread=False) + เปิด connection ใหม่ทุกครั้งที่กดโหลด
+pooled = db.Database (connection อ่านต่อ thread, WAL, writer queue + group commit)
+
+แต่ละ thread จำลองผู้ใช้: อ่านโปรไฟล์ -> อ่านประวัติ 1 หน้า -> กดโหลดใบเสร็จ (+1 download_count)
+และทุกๆ 10 รอบแจ้งโอน 1 รายการ (INSERT) จบแล้วตรวจว่า download_count รวมตรงกับจำนวนคลิก
+
+    python benchmarks/stress_db.py --threads 32 --seconds 10
+"""
+import argparse
+import gc
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from db import Database
+from migrations import migrate
+
+HISTORY_SQL = ("SELECT id, amount, date, note, category, download_count FROM transactions "
+               "WHERE person_id=? ORDER BY date DESC, id DESC LIMIT 11")
+
+
+def seed(path, residents=500, per_resident=40):
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    conn.executemany("INSERT INTO personnel (id, owner_id, name) VALUES (?,?,?)",
+                     ((i, i, f"ลูกบ้าน {i}") for i in range(1, residents + 1)))
+    conn.executemany("INSERT INTO transactions (person_id, amount, date, note, category, download_count) "
+                     "VALUES (?,?,?,?,?,0)",
+                     ((p, 1500.0, f"2024-{m % 12 + 1:02d}-01 10:00", "n", "ค่าส่วนกลาง (Common Fee)")
+                      for p in range(1, residents + 1) for m in range(per_resident)))
+    conn.commit()
+    conn.close()
+    return residents
+
+
+class Legacy:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+
+    def read(self, sql, params):
+        return self.conn.execute(sql, params).fetchall()
+
+    def click(self, tid):
+        c = sqlite3.connect(self.path, check_same_thread=False)
+        c.execute("UPDATE transactions SET download_count = download_count + 1 WHERE id=?", (tid,))
+        c.commit()
+        c.close()
+
+    def insert(self, row):
+        self.conn.execute("INSERT INTO transactions (person_id, amount, date, note, category) VALUES (?,?,?,?,?)", row)
+        self.conn.commit()
+
+    def close(self):
+        # INSERT ที่ล้มเหลวค้าง transaction ไว้บน connection ที่ใช้ร่วมกัน (ถือ lock จนกว่าจะ rollback)
+        self.conn.rollback()
+        self.conn.close()
+
+
+class Pooled:
+    def __init__(self, path):
+        self.db = Database(path)
+
+    def read(self, sql, params):
+        return self.db.connection().execute(sql, params).fetchall()
+
+    def click(self, tid):
+        self.db.increment_download_count(tid)
+
+    def insert(self, row):
+        self.db.execute("INSERT INTO transactions (person_id, amount, date, note, category) VALUES (?,?,?,?,?)", row)
+
+    def close(self):
+        pass
+
+
+def run(kind, path, residents, threads, seconds):
+    backend = Legacy(path) if kind == "legacy" else Pooled(path)
+    lat, errors, clicks = [], [], [0]
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def session(n):
+        rnd = random.Random(n)
+        local_lat, local_err, local_clicks, i = [], [], 0, 0
+        while time.perf_counter() < stop:
+            pid = rnd.randint(1, residents)
+            t0 = time.perf_counter()
+            try:
+                backend.read("SELECT * FROM personnel WHERE owner_id=?", (pid,))
+                rows = backend.read(HISTORY_SQL, (pid,))
+                if rows:
+                    backend.click(rows[0][0])
+                    local_clicks += 1
+                if i % 10 == 0:
+                    backend.insert((pid, 100.0, "2024-12-31 23:59", "stress", "ค่าปรับ"))
+                local_lat.append((time.perf_counter() - t0) * 1000)
+            except Exception as e:  # รวมถึง sqlite3.OperationalError: database is locked
+                local_err.append(repr(e))
+            i += 1
+        with lock:
+            lat.extend(local_lat)
+            errors.extend(local_err)
+            clicks[0] += local_clicks
+
+    workers = [threading.Thread(target=session, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    backend.close()
+    gc.collect()  # connection ที่รั่วจาก exception ยังถือ lock อยู่จนกว่าจะถูกเก็บ
+
+    total = sqlite3.connect(path).execute("SELECT SUM(download_count) FROM transactions").fetchone()[0]
+    lat.sort()
+    q = statistics.quantiles(lat, n=100) if len(lat) > 1 else [0] * 99
+    print(f"{kind:<7} iterations={len(lat):>7} ({len(lat) / seconds:,.0f}/s)  "
+          f"p50={q[49]:.2f}ms p95={q[94]:.2f}ms p99={q[98]:.2f}ms  errors={len(errors)}  "
+          f"download_count {total}/{clicks[0]} {'OK' if total == clicks[0] else 'LOST UPDATES'}")
+    for e in sorted(set(errors))[:3]:
+        print("   ", e)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=32)
+    ap.add_argument("--seconds", type=float, default=10)
+    args = ap.parse_args()
+    tmp = tempfile.mkdtemp()
+    template = os.path.join(tmp, "seed.db")
+    residents = seed(template)
+    for kind in ("legacy", "pooled"):
+        path = os.path.join(tmp, f"{kind}.db")
+        shutil.copy(template, path)
+        run(kind, path, residents, args.threads, args.seconds)
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""ส่งออกใบเสร็จทั้งเดือน (หรือช่วงวันที่/หมวดหมู่) เป็น ZIP หรือ PDF รวมไฟล์เดียว
+
+ใช้ได้ทั้งจากหน้า Admin และรันแบบ headless:
+
+    python bulk_export.py --start 2024-01-01 --end 2024-01-31 -o receipts_2024_01.zip
+    python bulk_export.py --start 2024-01-01 --end 2024-01-31 --format pdf -o receipts_2024_01.pdf
+
+ZIP: เรนเดอร์ใน process pool แล้วเขียนลงไฟล์ทีละใบ ไม่ถือใบเสร็จทั้งหมดไว้ในหน่วยความจำ (ใช้กับงานใหญ่)
+PDF รวม: FPDF สร้างทั้งเอกสารในหน่วยความจำ process เดียว จึงจำกัดไว้ไม่เกิน MAX_PDF_PAGES ใบ
+"""
+import argparse
+import os
+import zipfile
+from collections import deque
+from datetime import date, timedelta
+
+from archive import add_downloads, schemas as archive_schemas
+from db import Database
+from process_pool import spawn_pool
+from receipt_template import get_template, receipt_number
+
+DB_PATH = 'data.db'
+RECEIPTS_PER_WORKER = 25  # worker แต่ละตัวต้องโหลด template เอง ถ้างานน้อยกว่านี้ไม่คุ้มแตก process
+WINDOW_PER_WORKER = 4     # จำนวนงานที่ค้างในคิวต่อ worker (จำกัดหน่วยความจำ)
+MAX_PDF_PAGES = 1000      # PDF รวมถือทุกหน้า + ผลลัพธ์ทั้งก้อนในหน่วยความจำ มากกว่านี้ให้ใช้ ZIP
+
+
+def _where(start=None, end=None, category=None):
+    # date เก็บเป็น 'YYYY-MM-DD HH:MM' เทียบแบบข้อความได้, end รวมทั้งวัน
+    clauses, params = [], []
+    if start:
+        clauses.append("t.date >= ?")
+        params.append(str(start))
+    if end:
+        end_d = end if isinstance(end, date) else date.fromisoformat(str(end))
+        clauses.append("t.date < ?")
+        params.append((end_d + timedelta(days=1)).isoformat())
+    if category:
+        clauses.append("t.category = ?")
+        params.append(category)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def count_transactions(conn, start=None, end=None, category=None):
+    where, params = _where(start, end, category)
+    # นับแยกทีละไฟล์: ใช้ covering index ได้ (นับผ่าน all_transactions ต้องดึงทุกแถว)
+    return sum(conn.execute(f"SELECT COUNT(*) FROM {schema}.transactions t{where}", params).fetchone()[0]
+               for schema in archive_schemas(conn))
+
+
+def iter_transactions(conn, start=None, end=None, category=None, batch_size=500):
+    """(id, ชื่อ, วันที่, ยอด, หมวด, หมายเหตุ, download_count) ทีละ batch ไม่ fetchall ทั้งก้อน"""
+    where, params = _where(start, end, category)
+    cur = conn.execute(
+        "SELECT t.id, COALESCE(p.name, ''), t.date, t.amount, t.category, t.note, COALESCE(t.download_count, 0) "
+        f"FROM all_transactions t LEFT JOIN personnel p ON p.id = t.person_id{where} ORDER BY t.date, t.id",
+        params)
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+
+def _render_row(row):
+    tid, name, dt, amount, category, note, dl_count = row
+    data = get_template().render(tid, name, dt, amount, category, note, dl_count == 0)
+    return tid, f"receipt_{receipt_number(tid, dt)}.pdf", data
+
+
+def _bounded_map(executor, fn, items, window):
+    # เหมือน executor.map แต่ส่งงานเข้า pool ทีละ window เพื่อไม่ให้ผลลัพธ์กองอยู่ในหน่วยความจำ
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _rendered(rows, total, workers):
+    workers = min(workers or os.cpu_count() or 1, max(1, total // RECEIPTS_PER_WORKER))
+    if workers <= 1:
+        yield from map(_render_row, rows)
+        return
+    # spawn โดยไม่รัน app.py ซ้ำใน process ลูก (ดู process_pool.py)
+    with spawn_pool(workers) as ex:
+        yield from _bounded_map(ex, _render_row, rows, workers * WINDOW_PER_WORKER)
+
+
+def _claim(c, start, end, category):
+    """(รันใน writer) อ่าน download_count ของทุกรายการที่ตรงเงื่อนไขแล้วบวก 1 ใน transaction เดียวกัน
+    export สองชุดพร้อมกันจึงไม่ได้ต้นฉบับใบเดียวกันทั้งคู่ คืนค่า {id: download_count ก่อนบวก}"""
+    where, params = _where(start, end, category)
+    counts = dict(c.execute(f"SELECT t.id, COALESCE(t.download_count, 0) FROM all_transactions t{where}", params))
+    add_downloads(c, [(1, i) for i in counts])  # แถวของปีที่ย้ายไปแล้วถูกนับในไฟล์ archive
+    return counts
+
+
+def _claimed_rows(rows, counts):
+    # เฉพาะรายการที่ถูกนับไปแล้ว (แถวที่เพิ่มหลัง _claim ไม่อยู่ในชุดนี้) ใช้ download_count ก่อนบวก
+    for row in rows:
+        if row[0] in counts:
+            yield row[:-1] + (counts[row[0]],)
+
+
+def export_receipts(db, out, fmt='zip', start=None, end=None, category=None,
+                    workers=None, mark_downloaded=True, progress=None):
+    """สร้างใบเสร็จทุกรายการที่ตรงเงื่อนไข แล้วเขียนลง out (path หรือ file object)
+
+    ใบที่ยังไม่เคยโหลด (download_count = 0) จะเป็นต้นฉบับ ที่เหลือเป็นสำเนา
+    ถ้า mark_downloaded=True จะนับการส่งออกเป็นการโหลด 1 ครั้ง (ครั้งต่อไปจะเป็นสำเนา):
+    นับผ่าน db.write ก่อนเรนเดอร์ (writer ไม่ถูกถือระหว่างสร้าง PDF) ถ้าส่งออกไม่สำเร็จจะหักคืน
+    progress(done, total) ถูกเรียกหลังเขียนแต่ละใบ คืนค่าจำนวนใบที่ส่งออก
+    """
+    if fmt not in ('zip', 'pdf'):
+        raise ValueError(f"unknown format: {fmt}")
+    conn = db.connection()
+    if fmt == 'pdf' and count_transactions(conn, start, end, category) > MAX_PDF_PAGES:
+        raise ValueError(f"merged PDF is limited to {MAX_PDF_PAGES} receipts, use zip for larger exports")
+    counts = db.write(lambda c: _claim(c, start, end, category)).result() if mark_downloaded else None
+    try:
+        total = len(counts) if mark_downloaded else count_transactions(conn, start, end, category)
+        done, exported = 0, []
+        rows = iter_transactions(conn, start, end, category)
+        if mark_downloaded:
+            rows = _claimed_rows(rows, counts)
+        if fmt == 'zip':
+            with zipfile.ZipFile(out, 'w', zipfile.ZIP_STORED) as zf:
+                for tid, filename, data in _rendered(rows, total, workers):
+                    zf.writestr(filename, data)
+                    exported.append(tid)
+                    done += 1
+                    if progress:
+                        progress(done, total)
+        else:
+            # PDF รวมเป็นเอกสารเดียว: FPDF สร้างทีละหน้าใน process นี้ (ฟอนต์/ลายเซ็นฝังครั้งเดียวทั้งไฟล์)
+            template = get_template()
+            pdf = template.new_document()
+            for tid, name, dt, amount, cat, note, dl_count in rows:
+                template.add_receipt(pdf, tid, name, dt, amount, cat, note, dl_count == 0)
+                exported.append(tid)
+                done += 1
+                if progress:
+                    progress(done, total)
+            if exported:
+                data = pdf.output(dest='S').encode('latin-1')
+                if hasattr(out, 'write'):
+                    out.write(data)
+                else:
+                    with open(out, 'wb') as f:
+                        f.write(data)
+        return len(exported)
+    except BaseException:
+        if counts:
+            db.write(lambda c: add_downloads(c, [(-1, i) for i in counts])).result()
+        raise
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="ส่งออกใบเสร็จแบบกลุ่ม")
+    ap.add_argument("--db", default=DB_PATH)
+    ap.add_argument("--start", help="YYYY-MM-DD")
+    ap.add_argument("--end", help="YYYY-MM-DD (รวมวันนี้ด้วย)")
+    ap.add_argument("--category")
+    ap.add_argument("--format", choices=["zip", "pdf"], default="zip",
+                    help=f"zip = ไฟล์ละใบ (ไม่จำกัดจำนวน), pdf = รวมไฟล์เดียว ไม่เกิน {MAX_PDF_PAGES} ใบ")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--no-mark", action="store_true", help="ไม่นับเป็นการโหลด (ไม่เปลี่ยนสถานะต้นฉบับ/สำเนา)")
+    ap.add_argument("-o", "--output", required=True)
+    args = ap.parse_args(argv)
+
+    def report(done, total):
+        if done == total or done % 100 == 0:
+            print(f"\r{done}/{total}", end="", flush=True)
+
+    try:
+        n = export_receipts(Database(args.db), args.output, args.format, args.start, args.end, args.category,
+                            args.workers, not args.no_mark, report)
+    except ValueError as e:
+        ap.error(str(e))
+    print(f"\nexported {n} receipts -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
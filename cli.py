@@ -0,0 +1,156 @@
+"""งาน batch / cron แบบ headless (ไม่ต้องโหลด streamlit, pandas หรือ fpdf)
+
+    python cli.py import-residents residents.csv
+    python cli.py import-transactions transactions.csv --batch-size 50000
+    python cli.py rebuild-summary
+    python cli.py rebuild-search
+    python cli.py reconcile statement_2024.csv --window 60
+    python cli.py migrate-slips
+    python cli.py archive 2021 2022 [--parquet]   # ย้ายปีที่ปิดแล้วไป archive/ (ดู archive.py)
+    python cli.py archive                          # แสดงทะเบียน archive
+    python cli.py export-receipts --start 2024-01-01 --end 2024-01-31 -o receipts_2024_01.zip
+    python cli.py maintenance --analyze --checkpoint --integrity
+    python cli.py maintenance --vacuum        # ต้องไม่มีใครใช้แอปอยู่ (ล็อกทั้งไฟล์)
+"""
+import argparse
+import sys
+
+import archive
+import service
+from db import connect
+from migrations import migrate, schema_version
+
+DB_PATH = 'data.db'
+
+
+def open_writer(path):
+    """connection สำหรับงาน batch: migrate ให้เป็นเวอร์ชันล่าสุด และคุม transaction เอง"""
+    conn = connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    migrate(conn)
+    archive.attach(conn)
+    conn.isolation_level = None
+    return conn
+
+
+def _report(result):
+    print(result)
+    for err in result.errors:
+        print("  " + err, file=sys.stderr)
+    if result.skipped > len(result.errors):
+        print(f"  ... {result.skipped - len(result.errors)} more", file=sys.stderr)
+
+
+def cmd_import_residents(args):
+    _report(service.import_residents(open_writer(args.db), args.csv, args.batch_size))
+
+
+def cmd_import_transactions(args):
+    _report(service.import_transactions(open_writer(args.db), args.csv, args.batch_size))
+
+
+def cmd_rebuild_summary(args):
+    print(f"monthly_summary: {service.rebuild_monthly_summary(open_writer(args.db))} rows")
+
+
+def cmd_rebuild_search(args):
+    print(f"search index: {service.rebuild_search_index(open_writer(args.db))} transactions")
+
+
+def cmd_reconcile(args):
+    import reconciliation
+    conn = open_writer(args.db)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        with open(args.csv, newline='', encoding='utf-8-sig') as f:
+            stats = reconciliation.import_statement(conn.cursor(), f, source=args.csv, window=args.window)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    print(", ".join(f"{k} {v:.2f}" if isinstance(v, float) else f"{k} {v}" for k, v in stats.items()))
+
+
+def cmd_migrate_slips(args):
+    from slip_store import SlipStore, migrate_legacy_slips
+    moved, dup, missing = migrate_legacy_slips(open_writer(args.db), SlipStore(args.root))
+    print(f"moved {moved}, deduplicated {dup}, missing {missing}")
+
+
+def cmd_archive(args):
+    conn = open_writer(args.db)
+    for year in args.years:
+        print(f"{year}: moved {archive.archive_year(conn, year, args.dir, args.parquet)} rows")
+    for year, path, rows, archived_at in archive.registered(conn):
+        print(f"  {year}  {rows:>10,} rows  {path}  ({archived_at})")
+    if args.years:
+        print("run `maintenance --vacuum` to shrink data.db")
+
+
+def cmd_export_receipts(args, rest):
+    import bulk_export  # ดึง fpdf เฉพาะคำสั่งนี้
+    bulk_export.main(["--db", args.db] + rest)
+
+
+def cmd_maintenance(args):
+    conn = open_writer(args.db)
+    print(f"schema version {schema_version(conn)}")
+    if args.integrity:
+        print("integrity:", ", ".join(r[0] for r in conn.execute("PRAGMA quick_check")))
+    if args.analyze:
+        conn.execute("PRAGMA optimize")
+        conn.execute("ANALYZE")
+        print("analyze: done")
+    if args.checkpoint:
+        busy, log, done = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        print(f"checkpoint: {done}/{log} frames{' (busy)' if busy else ''}")
+    if args.vacuum:
+        conn.execute("VACUUM")
+        print("vacuum: done")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db", default=DB_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name, help_text in (("import-residents", "นำเข้าลูกบ้าน (name, phone, address, owner_id|username)"),
+                            ("import-transactions", "นำเข้ารายการ (person_id|name, amount, date, category, note, slip_path)")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("csv")
+        p.add_argument("--batch-size", type=int, default=service.IMPORT_BATCH_SIZE, help="จำนวนแถวต่อ transaction")
+    sub.add_parser("rebuild-summary", help="คำนวณ monthly_summary ใหม่จาก transactions")
+    sub.add_parser("rebuild-search", help="สร้างดัชนีค้นหา (FTS) ใหม่จาก personnel และ transactions")
+    p = sub.add_parser("reconcile", help="นำเข้า statement ธนาคาร (CSV) แล้วจับคู่กับรายการแจ้งโอน")
+    p.add_argument("csv")
+    p.add_argument("--window", type=int, default=60, help="ช่วงเวลาที่ยอมให้ต่างกัน (นาที)")
+    p = sub.add_parser("migrate-slips", help="ย้ายสลิปแบบเดิมเข้าที่เก็บแบบ content-addressed")
+    p.add_argument("--root", default="slips")
+    p = sub.add_parser("archive", help="ย้ายรายการของปีที่ปิดแล้วไปไฟล์ archive รายปี")
+    p.add_argument("years", nargs="*", type=int)
+    p.add_argument("--dir", default=archive.ARCHIVE_DIR, help="โฟลเดอร์ของไฟล์ archive (path สัมพัทธ์นับจากโฟลเดอร์ของ --db)")
+    p.add_argument("--parquet", action="store_true", help="เขียนสำเนา .parquet ด้วย (ต้องมี pyarrow)")
+    sub.add_parser("export-receipts", help="ส่งออกใบเสร็จ (อาร์กิวเมนต์เดียวกับ bulk_export.py)", add_help=False)
+    p = sub.add_parser("maintenance", help="ANALYZE / checkpoint / ตรวจความถูกต้อง / VACUUM")
+    p.add_argument("--analyze", action="store_true")
+    p.add_argument("--checkpoint", action="store_true")
+    p.add_argument("--integrity", action="store_true")
+    p.add_argument("--vacuum", action="store_true")
+    args, rest = ap.parse_known_args(argv)
+    if args.cmd == "export-receipts":
+        return cmd_export_receipts(args, rest)
+    if rest:
+        ap.error(f"unrecognized arguments: {' '.join(rest)}")
+    {
+        "import-residents": cmd_import_residents,
+        "import-transactions": cmd_import_transactions,
+        "rebuild-summary": cmd_rebuild_summary,
+        "rebuild-search": cmd_rebuild_search,
+        "reconcile": cmd_reconcile,
+        "migrate-slips": cmd_migrate_slips,
+        "archive": cmd_archive,
+        "maintenance": cmd_maintenance,
+    }[args.cmd](args)
+
+
+if __name__ == "__main__":
+    main()
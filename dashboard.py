@@ -0,0 +1,78 @@
+from datetime import date
+
+# --- Admin Dashboard Queries ---
+# ยอดรวมอ่านจากตาราง monthly_summary (ดูแลด้วย trigger, ดู migrations.py) ไม่ต้องสแกน transactions
+# ส่วนที่ต้องใช้แถวจริง (ลูกบ้านค้างชำระ, รายการดิบ) ใช้ index และดึงทีละหน้า
+# ค้างชำระ: ใช้ NOT IN (subquery ไม่ผูกกับแถวนอก) ให้ SQLite สร้างรายการผู้ที่จ่ายแล้วครั้งเดียว
+# แบบ NOT EXISTS เดิม planner เลือก idx_transactions_category_date แล้วไล่ทั้งเดือนซ้ำทุกลูกบ้าน
+
+COMMON_FEE = "ค่าส่วนกลาง (Common Fee)"
+RAW_PAGE_SIZE = 50
+
+
+def month_key(d):
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+def month_bounds(month):
+    """'YYYY-MM' -> (วันแรกของเดือน, วันแรกของเดือนถัดไป) ในรูปแบบเดียวกับ transactions.date"""
+    y, m = int(month[:4]), int(month[5:7])
+    nxt = date(y + 1, 1, 1) if m == 12 else date(y, m + 1, 1)
+    return f"{month}-01", nxt.isoformat()
+
+
+def income_summary(conn, start_month=None, end_month=None):
+    """[(month, category, total, tx_count)] ตามช่วงเดือน (รวมทั้งสองฝั่ง)"""
+    sql = "SELECT month, category, total, tx_count FROM monthly_summary WHERE 1=1"
+    params = []
+    if start_month:
+        sql += " AND month >= ?"
+        params.append(start_month)
+    if end_month:
+        sql += " AND month <= ?"
+        params.append(end_month)
+    return conn.execute(sql + " ORDER BY month, category", params).fetchall()
+
+
+def summary_months(conn):
+    return [r[0] for r in conn.execute("SELECT DISTINCT month FROM monthly_summary ORDER BY month DESC")]
+
+
+def count_outstanding(conn, month, category=COMMON_FEE):
+    start, end = month_bounds(month)
+    return conn.execute(
+        """SELECT COUNT(*) FROM personnel p WHERE p.id NOT IN (
+               SELECT t.person_id FROM all_transactions t
+               WHERE t.date >= ? AND t.date < ? AND t.category = ? AND t.person_id IS NOT NULL)""",
+        (start, end, category)).fetchone()[0]
+
+
+def outstanding_residents(conn, month, category=COMMON_FEE, limit=RAW_PAGE_SIZE, offset=0):
+    """ลูกบ้านที่ไม่มีรายการ category ที่โอนในเดือนนั้น"""
+    start, end = month_bounds(month)
+    return conn.execute(
+        """SELECT p.id, p.name, p.phone, p.address FROM personnel p WHERE p.id NOT IN (
+               SELECT t.person_id FROM all_transactions t
+               WHERE t.date >= ? AND t.date < ? AND t.category = ? AND t.person_id IS NOT NULL)
+           ORDER BY p.id LIMIT ? OFFSET ?""",
+        (start, end, category, limit, offset)).fetchall()
+
+
+def fetch_transactions_page(conn, start=None, end=None, after=None, page_size=RAW_PAGE_SIZE):
+    """รายการดิบทีละหน้า เรียงใหม่ -> เก่า, after = (date, id) ของแถวสุดท้ายหน้าก่อน"""
+    sql = ("SELECT t.id, t.date, p.name, t.category, t.note, t.amount, t.download_count "
+           "FROM all_transactions t LEFT JOIN personnel p ON p.id = t.person_id WHERE 1=1")
+    params = []
+    if start:
+        sql += " AND t.date >= ?"
+        params.append(start)
+    if end:
+        sql += " AND t.date < ?"
+        params.append(end)
+    if after:
+        sql += " AND (t.date < ? OR (t.date = ? AND t.id < ?))"
+        params += [after[0], after[0], after[1]]
+    sql += " ORDER BY t.date DESC, t.id DESC LIMIT ?"
+    params.append(page_size + 1)
+    rows = conn.execute(sql, params).fetchall()
+    return rows[:page_size], len(rows) > page_size
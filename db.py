@@ -0,0 +1,217 @@
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import Future
+
+import archive
+import metrics
+from migrations import migrate
+
+# --- Connection Management ---
+# - อ่าน: connection แยกต่อ thread (threading.local) เปิดแบบ query_only
+#   Streamlit สร้าง thread ใหม่ทุกครั้งที่ rerun จึงเก็บ connection ของ thread ที่จบแล้วกลับเข้า pool
+#   rerun ถัดไปได้ connection ที่เปิดและตั้ง PRAGMA ไว้แล้ว ไม่ต้องเปิดใหม่
+# - เขียน: ทุกคำสั่งเข้าคิวเดียว มี writer thread ตัวเดียวถือ connection สำหรับเขียน
+#   writer ดึงงานที่รอในคิวมาทำรวดเดียวใน transaction เดียว (group commit)
+#   งานบวก download_count หลายรายการถูกรวมเป็น executemany ครั้งเดียว
+# - WAL: คนอ่านไม่ต้องรอคนเขียน และคนเขียนไม่ต้องรอคนอ่าน
+# - ทุก connection จับเวลา execute/executemany ต่อคำสั่ง (metrics "sql", ดู metrics.py)
+#   เวลาที่วัดรวมการ step แถวแรก ซึ่งเป็นงานส่วนใหญ่ของ query ที่มี ORDER BY/aggregate
+# - ทุก connection ATTACH ไฟล์ archive รายปีและมี view all_transactions (ดู archive.py)
+#   ตรวจทะเบียนซ้ำทุก ARCHIVE_CHECK_SECONDS เผื่อมีการย้ายปีจาก CLI ระหว่างแอปเปิดอยู่
+
+BUSY_TIMEOUT_MS = 5000
+MAX_BATCH = 256
+ARCHIVE_CHECK_SECONDS = 5
+
+PRAGMAS = (
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA synchronous = NORMAL",   # ปลอดภัยเมื่อใช้ WAL, fsync เฉพาะตอน checkpoint
+    "PRAGMA cache_size = -16000",    # 16 MB ต่อ connection
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA mmap_size = 134217728",
+)
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, params=()):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            metrics.observe("sql", time.perf_counter() - t0, stmt=metrics.statement_label(sql))
+
+    def executemany(self, sql, seq):
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq)
+        finally:
+            metrics.observe("sql", time.perf_counter() - t0, stmt=metrics.statement_label(sql))
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+
+def connect(path, query_only=False):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                           factory=TimedConnection if metrics.enabled else sqlite3.Connection)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    if query_only:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+class _Job:
+    __slots__ = ("fn", "incr_id", "future")
+
+    def __init__(self, fn=None, incr_id=None):
+        self.fn = fn
+        self.incr_id = incr_id
+        self.future = Future()
+
+
+class Database:
+    def __init__(self, path='data.db'):
+        self.path = path
+        self._local = threading.local()
+        self._pool_lock = threading.Lock()
+        self._idle = []
+        self._owners = {}
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.jobs = 0
+        self._archive_checked = {}
+        # migrate + เปิด WAL (ค่า journal_mode ติดอยู่กับไฟล์ ตั้งครั้งเดียวพอ)
+        setup = connect(path)
+        setup.execute("PRAGMA journal_mode = WAL")
+        migrate(setup)
+        setup.close()
+        self._writer = threading.Thread(target=self._write_loop, name="db-writer", daemon=True)
+        self._writer.start()
+
+    # --- อ่าน ---
+    def connection(self):
+        """connection สำหรับอ่านของ thread ปัจจุบัน (เขียนไม่ได้ ให้ใช้ write/execute)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._checkout()
+        self._refresh_archives(conn)
+        return conn
+
+    def _refresh_archives(self, conn):
+        now = time.monotonic()
+        if now - self._archive_checked.get(conn, 0.0) < ARCHIVE_CHECK_SECONDS:
+            return
+        self._archive_checked[conn] = now
+        try:
+            archive.attach(conn)
+        except sqlite3.OperationalError:
+            # มี statement ค้างอยู่ (ATTACH/DETACH ไม่ได้) ลองใหม่รอบหน้า
+            self._archive_checked[conn] = 0.0
+        except Exception:
+            # เช่นไฟล์ archive เสีย: ใช้ view เดิมต่อไป ลองใหม่ในรอบตรวจถัดไป
+            traceback.print_exc()
+
+    def _checkout(self):
+        with self._pool_lock:
+            for thread in [t for t in self._owners if not t.is_alive()]:
+                self._idle.append(self._owners.pop(thread))
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None:
+                self._owners[threading.current_thread()] = conn
+                return conn
+        conn = connect(self.path, query_only=True)
+        with self._pool_lock:
+            self._owners[threading.current_thread()] = conn
+        return conn
+
+    # --- เขียน ---
+    def write(self, fn):
+        """ส่ง fn(cursor) ไปทำใน writer thread คืนค่า Future ของผลลัพธ์ fn"""
+        job = _Job(fn=fn)
+        self._queue.put(job)
+        return job.future
+
+    def execute(self, sql, params=()):
+        """รันคำสั่งเขียน 1 คำสั่งแล้วรอจน commit คืนค่า lastrowid"""
+        return self.write(lambda c: c.execute(sql, params).lastrowid).result()
+
+    def executemany(self, sql, seq):
+        return self.write(lambda c: c.executemany(sql, seq).rowcount).result()
+
+    def increment_download_count(self, trans_id, wait=True):
+        job = _Job(incr_id=int(trans_id))
+        self._queue.put(job)
+        return job.future.result() if wait else job.future
+
+    def _write_loop(self):
+        conn = connect(self.path)
+        conn.isolation_level = None  # คุม BEGIN/COMMIT เอง
+        while True:
+            jobs = [self._queue.get()]
+            while len(jobs) < MAX_BATCH:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._refresh_archives(conn)
+                self._run_batch(conn, jobs)
+            except Exception as e:
+                # งานใน batch นี้ล้ม แต่ writer thread ต้องไม่ตาย (ทุก write ที่ตามมาจะรอตลอดไป)
+                traceback.print_exc()
+                for job in jobs:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+
+    def _run_batch(self, conn, jobs):
+        with metrics.span("db_write_batch"):
+            self._run_jobs(conn, jobs)
+
+    def _run_jobs(self, conn, jobs):
+        c = conn.cursor()
+        results = []
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            increments = Counter(j.incr_id for j in jobs if j.fn is None)
+            if increments:
+                archive.add_downloads(c, [(n, tid) for tid, n in increments.items()])
+            for job in jobs:
+                if job.fn is None:
+                    results.append((job, None, None))
+                    continue
+                # savepoint ต่องาน: งานที่ error ถูก rollback เฉพาะตัวเอง งานอื่นใน batch ยัง commit ได้
+                c.execute("SAVEPOINT job")
+                try:
+                    results.append((job, job.fn(c), None))
+                    c.execute("RELEASE job")
+                except Exception as e:
+                    c.execute("ROLLBACK TO job")
+                    c.execute("RELEASE job")
+                    results.append((job, None, e))
+            c.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for job in jobs:
+                job.future.set_exception(e)
+            return
+        self.batches += 1
+        self.jobs += len(jobs)
+        for job, result, error in results:
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
@@ -0,0 +1,40 @@
+import archive
+
+# --- ประวัติรายการแบบแบ่งหน้า (keyset pagination บน (date, id)) ---
+# อ่านจาก all_transactions: รวมปีที่ย้ายไปไฟล์ archive แล้ว (ดู archive.py)
+# date เป็น NULL ได้ (วันที่เดิมที่แปลงไม่ได้ ดู migrations._m003_normalize_dates) แถวเหล่านี้อยู่ท้ายสุด
+HISTORY_PAGE_SIZE = 10
+
+
+def fetch_history_page(conn, person_id, after=None, year=None, category=None, page_size=HISTORY_PAGE_SIZE):
+    """ดึงรายการของหน้าถัดจาก after = (date, id) ของแถวสุดท้ายหน้าก่อน คืนค่า (rows, มีหน้าถัดไปหรือไม่)"""
+    sql = "SELECT id, amount, date, note, category, COALESCE(download_count, 0) FROM all_transactions WHERE person_id=?"
+    params = [person_id]
+    if year:
+        sql += " AND date >= ? AND date < ?"
+        params += [f"{year}-01-01", f"{int(year) + 1}-01-01"]
+    if category:
+        sql += " AND category = ?"
+        params.append(category)
+    if after and after[0] is None:
+        sql += " AND date IS NULL AND id < ?"
+        params.append(after[1])
+    elif after:
+        sql += " AND (date < ? OR date IS NULL OR (date = ? AND id < ?))"
+        params += [after[0], after[0], after[1]]
+    sql += " ORDER BY date DESC, id DESC LIMIT ?"
+    params.append(page_size + 1)  # ดึงเกิน 1 แถวเพื่อรู้ว่ามีหน้าถัดไป
+    rows = conn.execute(sql, params).fetchall()
+    return rows[:page_size], len(rows) > page_size
+
+
+def history_filter_options(conn, person_id):
+    # DISTINCT แยกทีละไฟล์แล้วรวมใน Python: แต่ละไฟล์ตอบจาก index ได้ (ผ่าน view ต้องดึงทุกแถว)
+    years, cats = set(), set()
+    for schema in archive.schemas(conn):
+        years.update(r[0] for r in conn.execute(
+            f"SELECT DISTINCT substr(date, 1, 4) FROM {schema}.transactions WHERE person_id=? AND date IS NOT NULL",
+            (person_id,)))
+        cats.update(r[0] for r in conn.execute(
+            f"SELECT DISTINCT category FROM {schema}.transactions WHERE person_id=? AND category IS NOT NULL", (person_id,)))
+    return sorted(years, reverse=True), sorted(cats)
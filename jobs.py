@@ -0,0 +1,301 @@
+import json
+import os
+import threading
+import traceback
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import metrics
+import service
+from process_pool import spawn_pool
+from migrations import normalize_date
+from receipt_cache import receipt_fingerprint
+
+# --- Background Jobs ---
+# งานหนัก (บันทึกสลิป + รายการชำระ, เรนเดอร์ PDF ใบเสร็จ) ไม่ทำใน thread ที่รันสคริปต์ Streamlit
+# - ทุกงานอยู่ในตาราง jobs (migration 6): queued -> running -> done / failed
+#   UI ส่งงานแล้ว poll สถานะจากตาราง เมื่อ done อ่านผลลัพธ์ (JSON หรือไฟล์ bytes ใน <root>/results)
+# - รีสตาร์ทระหว่างทำ: start() ตั้งงานที่ค้าง running กลับเป็น queued แล้วทำใหม่
+#   handler จึงต้องทำซ้ำได้: สลิปเก็บตาม hash, INSERT รายการ commit พร้อมสถานะ done ใน transaction เดียว
+# - worker thread ดึงงานด้วย UPDATE ... RETURNING ผ่าน writer ของ Database (ดู db.py)
+#   เรียงตาม priority มาก่อน แล้วตามลำดับที่ส่ง: งานที่ผู้ใช้รออยู่ไม่ต้องรอหลังงานอุ่นแคช
+# - งานกิน CPU (cpu=True) ส่งต่อ process pool: ไม่แย่ง GIL กับ thread ที่รันสคริปต์ของผู้ใช้คนอื่น
+#   processes=0 ทำใน worker thread แทน (เช่นตอนทดสอบ)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+MAX_ATTEMPTS = 3
+IDLE_POLL_SECONDS = 5   # worker ถูกปลุกทันทีเมื่อ submit ใน process นี้ รอบ poll มีไว้รับงานจาก process อื่น
+RESULT_TTL_HOURS = 24
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+_COLUMNS = "id, kind, status, dedupe_key, result, result_path, error, attempts, created_at, finished_at"
+
+
+def _now():
+    return datetime.now().strftime(TS_FORMAT)
+
+
+def _row(row):
+    if row is None:
+        return None
+    job = dict(zip(("id", "kind", "status", "key", "result", "result_path", "error", "attempts",
+                    "created_at", "finished_at"), row))
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+class JobQueue:
+    def __init__(self, db, root='jobs', workers=2, processes=2, initializer=None):
+        self.db = db
+        self.spool_dir = os.path.join(root, 'spool')
+        self.result_dir = os.path.join(root, 'results')
+        os.makedirs(self.spool_dir, exist_ok=True)
+        os.makedirs(self.result_dir, exist_ok=True)
+        self.workers = workers
+        self.processes = processes
+        self.initializer = initializer  # รันครั้งเดียวในแต่ละ process ลูก (เช่นโหลดฟอนต์)
+        self._handlers = {}
+        self._listeners = []
+        self._wake = threading.Event()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def register(self, kind, fn, cpu=False):
+        """fn(payload) คืนค่า bytes (เก็บเป็นไฟล์ผลลัพธ์), dict (เก็บเป็น JSON)
+        หรือ fn(cursor) -> dict ซึ่งถูกรันใน transaction เดียวกับการตั้งสถานะ done
+        cpu=True: fn ต้องเป็นฟังก์ชันระดับโมดูลที่ pickle ได้ และคืนค่า bytes/dict"""
+        self._handlers[kind] = (fn, cpu)
+
+    def add_listener(self, fn):
+        """fn(kind, payload, result) ถูกเรียกใน worker thread หลังงาน done (เช่น invalidate แคช)"""
+        self._listeners.append(fn)
+
+    def start(self):
+        """กู้งานที่ค้างจากรอบก่อน ล้างงานเก่า แล้วเริ่ม worker คืนค่าจำนวนงานที่กู้กลับเข้าคิว"""
+        recovered = self.db.write(lambda c: c.execute(
+            "UPDATE jobs SET status=? WHERE status=?", (QUEUED, RUNNING)).rowcount).result()
+        self.purge()
+        if self.processes and any(cpu for _, cpu in self._handlers.values()):
+            # สร้าง process ลูกให้ครบ + รัน initializer ตั้งแต่ตอนนี้ งานแรกไม่ต้องรอ
+            pool = self._process_pool()
+            for _ in range(self.processes):
+                pool.submit(_noop)
+        for i in range(self.workers):
+            threading.Thread(target=self._work_loop, name=f"job-worker-{i}", daemon=True).start()
+        return recovered
+
+    # --- ส่งงาน / ดูสถานะ ---
+    def spool(self, data, suffix=''):
+        """เขียนข้อมูลอัปโหลดลงดิสก์ก่อนส่งงาน (payload เก็บแค่ path ใน key "spool")
+        ไฟล์ถูกลบเมื่องานจบ"""
+        path = os.path.join(self.spool_dir, uuid.uuid4().hex + suffix)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def submit(self, kind, payload, key=None, priority=0):
+        """ส่งงานเข้าคิว คืนค่า job id
+        key: ถ้ามีงาน key เดียวกันที่ยังรอ/กำลังทำ/เสร็จแล้ว คืน id เดิม (ใบเสร็จใบเดิมถูกขอซ้ำ)"""
+        if kind not in self._handlers:
+            raise KeyError(f"no handler for job kind {kind!r}")
+        body = json.dumps(payload, ensure_ascii=False)
+
+        def write(c):
+            if key is not None:
+                row = c.execute("SELECT id, status, result_path FROM jobs WHERE dedupe_key=?", (key,)).fetchone()
+                if row:
+                    job_id, status, path = row
+                    if status in (QUEUED, RUNNING) or (status == DONE and (path is None or os.path.exists(path))):
+                        return job_id
+                    c.execute("""UPDATE jobs SET status=?, payload=?, priority=?, attempts=0, result=NULL,
+                                 result_path=NULL, error=NULL, created_at=?, started_at=NULL, finished_at=NULL
+                                 WHERE id=?""", (QUEUED, body, priority, _now(), job_id))
+                    return job_id
+            return c.execute("INSERT INTO jobs (kind, payload, priority, dedupe_key, created_at) VALUES (?,?,?,?,?)",
+                             (kind, body, priority, key, _now())).lastrowid
+
+        job_id = self.db.write(write).result()
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id):
+        return _row(self.db.connection().execute(f"SELECT {_COLUMNS} FROM jobs WHERE id=?", (job_id,)).fetchone())
+
+    def find(self, keys):
+        """คืนค่า {dedupe_key: job} ของงานที่มีอยู่ (ครั้งละหลาย key สำหรับทั้งหน้า)"""
+        keys = list(keys)
+        found = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self.db.connection().execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE dedupe_key IN ({','.join('?' * len(chunk))})", chunk)
+            for row in rows:
+                job = _row(row)
+                found[job["key"]] = job
+        return found
+
+    def result_bytes(self, job):
+        """ไฟล์ผลลัพธ์ของงานที่ done (None ถ้ายังไม่เสร็จหรือไฟล์ถูกล้างไปแล้ว)"""
+        path = job and job["status"] == DONE and job["result_path"]
+        if not path or not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def counts(self):
+        return dict(self.db.connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def purge(self, max_age_hours=RESULT_TTL_HOURS):
+        """ลบงานที่จบเกิน max_age_hours พร้อมไฟล์ผลลัพธ์ และไฟล์ spool เก่าที่ไม่มีงานค้างอ้างถึง
+        คืนค่าจำนวนงานที่ลบ"""
+        cutoff = datetime.now() - timedelta(hours=max_age_hours)
+
+        def write(c):
+            paths = [r[0] for r in c.execute("DELETE FROM jobs WHERE status IN (?,?) AND finished_at < ? RETURNING result_path",
+                                             (DONE, FAILED, cutoff.strftime(TS_FORMAT))) if r[0]]
+            pending = {json.loads(p).get("spool") for p, in c.execute(
+                "SELECT payload FROM jobs WHERE status IN (?,?)", (QUEUED, RUNNING))}
+            return paths, pending
+
+        paths, pending = self.db.write(write).result()
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        for name in os.listdir(self.spool_dir):
+            path = os.path.join(self.spool_dir, name)
+            if path not in pending and datetime.fromtimestamp(os.path.getmtime(path)) < cutoff:
+                os.remove(path)
+        return len(paths)
+
+    # --- worker ---
+    def _work_loop(self):
+        while True:
+            self._wake.clear()
+            try:
+                job = self._claim()
+            except Exception:
+                traceback.print_exc()
+                job = None
+            if job is None:
+                self._wake.wait(IDLE_POLL_SECONDS)
+                continue
+            try:
+                self._run(*job)
+            except Exception:
+                # เช่น writer ตั้งสถานะงานไม่สำเร็จ: งานค้าง running จนรีสตาร์ท แต่ worker ต้องไม่ตาย
+                traceback.print_exc()
+
+    def _claim(self):
+        kinds = list(self._handlers)
+        return self.db.write(lambda c: c.execute(
+            f"""UPDATE jobs SET status=?, started_at=?, attempts=attempts+1
+                WHERE id = (SELECT id FROM jobs WHERE status=? AND kind IN ({','.join('?' * len(kinds))})
+                            ORDER BY priority DESC, id LIMIT 1)
+                RETURNING id, kind, payload, attempts""", (RUNNING, _now(), QUEUED, *kinds)).fetchone()).result()
+
+    def _process_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # process ลูกไม่รัน app.py ซ้ำ (ดู process_pool.py)
+                self._pool = spawn_pool(self.processes, initializer=self.initializer)
+            return self._pool
+
+    def _run(self, job_id, kind, payload, attempts):
+        fn, cpu = self._handlers[kind]
+        data = json.loads(payload)
+        try:
+            with metrics.span("job", kind=kind):
+                if cpu and self.processes:
+                    out = self._process_pool().submit(fn, data).result()
+                else:
+                    out = fn(data)
+                result = self._finish(job_id, out)
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):  # process ลูกตาย: สร้าง pool ใหม่ในงานถัดไป
+                with self._pool_lock:
+                    self._pool = None
+            final = attempts >= MAX_ATTEMPTS
+            self.db.write(lambda c: c.execute("UPDATE jobs SET status=?, error=?, finished_at=? WHERE id=?",
+                                              (FAILED if final else QUEUED, f"{type(e).__name__}: {e}", _now(), job_id))).result()
+            if final:
+                self._drop_spool(data)
+            else:
+                self._wake.set()
+            return
+        self._drop_spool(data)
+        for listener in self._listeners:
+            try:
+                listener(kind, data, result)
+            except Exception:
+                traceback.print_exc()
+
+    def _finish(self, job_id, out):
+        path = None
+        if isinstance(out, bytes):
+            path = os.path.join(self.result_dir, f"{job_id}.out")
+            tmp = f"{path}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(out)
+            os.replace(tmp, path)
+            out = {"size": len(out)}
+
+        def write(c):
+            result = out(c) if callable(out) else out
+            c.execute("UPDATE jobs SET status=?, result=?, result_path=?, error=NULL, finished_at=? WHERE id=?",
+                      (DONE, json.dumps(result, ensure_ascii=False), path, _now(), job_id))
+            return result
+
+        return self.db.write(write).result()
+
+    @staticmethod
+    def _drop_spool(payload):
+        path = payload.get("spool")
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+def _noop():
+    pass
+
+
+# --- งานของแอป ---
+def receipt_key(trans_id, person_name, date_str, amount, category, note, is_original):
+    """dedupe key ของใบเสร็จ: ข้อมูลบนใบเปลี่ยน = ใบใหม่"""
+    return f"receipt:{int(trans_id)}:{int(bool(is_original))}:{receipt_fingerprint(person_name, date_str, amount, category, note)}"
+
+
+def receipt_payload(trans_id, person_name, date_str, amount, category, note, is_original):
+    return {"trans_id": int(trans_id), "person_name": person_name, "date": date_str, "amount": amount,
+            "category": category, "note": note, "is_original": bool(is_original)}
+
+
+def submit_receipt(queue, trans_id, person_name, date_str, amount, category, note, is_original, priority=0):
+    fields = (trans_id, person_name, date_str, amount, category, note, is_original)
+    return queue.submit("receipt", receipt_payload(*fields), key=receipt_key(*fields), priority=priority)
+
+
+def load_receipt_template():
+    """initializer ของ process pool: โหลด template (ฟอนต์/ลายเซ็น) ไว้ก่อนงานแรก"""
+    from receipt_template import get_template
+    get_template()
+
+
+def render_receipt(payload):
+    """เรนเดอร์ PDF ใบเสร็จ (cpu=True: รันใน process pool)"""
+    return service.receipt_pdf(payload["trans_id"], payload["person_name"], payload["date"], payload["amount"],
+                               payload["category"], payload["note"], payload["is_original"])
+
+
+def record_payment(store, payload):
+    """เก็บสลิปจากไฟล์ spool แล้วคืนฟังก์ชัน INSERT รายการ (commit พร้อมสถานะ done ของงาน)
+    payload: person_id, amount, date, note, category, spool"""
+    slip_path, is_new = store.save_file(payload["spool"])
+
+    def write(c):
+        duplicate = not is_new and service.slip_in_use(c, slip_path)
+        trans_id = service.insert_payment(c, payload["person_id"], payload["amount"], payload["date"],
+                                          slip_path, payload["note"], payload["category"])
+        return {"transaction_id": trans_id, "date": normalize_date(payload["date"]), "slip_path": slip_path,
+                "duplicate_slip": duplicate}
+
+    return write
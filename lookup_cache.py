@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+
+# --- Lookup Cache ---
+# แคชผลการค้นข้อมูลอ้างอิงที่อ่านบ่อยแต่เปลี่ยนน้อย (โปรไฟล์ตาม owner_id, รายชื่อ users, ตัวกรองประวัติ)
+# แบ่งเป็น namespace; ทุกจุดที่เขียนข้อมูลต้องเรียก invalidate() ของ namespace/คีย์ที่เกี่ยวข้องเอง
+# หมายเหตุ: แคชอยู่ใน process เดียว ถ้าแก้ฐานข้อมูลจากภายนอก (เช่น CLI) ให้ invalidate หรือรีสตาร์ทแอป
+# จึงไม่แคชข้อมูลที่ process อื่นเปลี่ยนเป็นปกติ เช่นหน้าประวัติ (download_count ถูกบวกจาก CLI ส่งออกใบเสร็จ)
+
+_ALL = object()
+_MISSING = object()
+
+
+class LookupCache:
+    def __init__(self, max_items=4096):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {}
+        # เพิ่มทุกครั้งที่ invalidate/clear: loader ที่เริ่มก่อนหน้านั้นอาจอ่านข้อมูลเก่า ผลของมันจึงไม่ถูกเก็บ
+        self._generations = {}
+        self._cleared = 0
+
+    def _counter(self, namespace):
+        return self._stats.setdefault(namespace, {"hits": 0, "misses": 0, "invalidations": 0})
+
+    def _generation(self, namespace):
+        return self._cleared, self._generations.get(namespace, 0)
+
+    def get_or_load(self, namespace, key, loader):
+        """คืนค่าจากแคช ถ้าไม่มีเรียก loader() (ค่า None ก็ถูกแคชด้วย เช่น ยังไม่มีโปรไฟล์)
+        ถ้ามี invalidate ของ namespace นี้ระหว่างที่ loader ทำงาน คืนค่าที่โหลดได้แต่ไม่เก็บลงแคช"""
+        k = (namespace, key)
+        with self._lock:
+            value = self._items.get(k, _MISSING)
+            if value is not _MISSING:
+                self._items.move_to_end(k)
+                self._counter(namespace)["hits"] += 1
+                return value
+            self._counter(namespace)["misses"] += 1
+            generation = self._generation(namespace)
+        value = loader()
+        with self._lock:
+            if self._generation(namespace) != generation:
+                return value
+            self._items[k] = value
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return value
+
+    def invalidate(self, namespace, key=_ALL, prefix=False):
+        """ลบทั้ง namespace, คีย์เดียว, หรือทุกคีย์ (tuple) ที่ขึ้นต้นด้วย key เมื่อ prefix=True"""
+        with self._lock:
+            if key is _ALL or prefix:
+                n = len(key) if prefix else 0
+                for k in [k for k in self._items if k[0] == namespace and (not prefix or k[1][:n] == key)]:
+                    del self._items[k]
+            else:
+                self._items.pop((namespace, key), None)
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            self._counter(namespace)["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._cleared += 1
+
+    def stats(self):
+        with self._lock:
+            sizes = {}
+            for ns, _ in self._items:
+                sizes[ns] = sizes.get(ns, 0) + 1
+            out = {}
+            for ns, c in self._stats.items():
+                lookups = c["hits"] + c["misses"]
+                out[ns] = dict(c, items=sizes.get(ns, 0), hit_rate=c["hits"] / lookups if lookups else 0.0)
+            return out
@@ -0,0 +1,251 @@
+import bisect
+import json
+import os
+import re
+import threading
+import time
+
+# --- Instrumentation ---
+# จับเวลา hot path (SQL, สร้าง PDF, เขียนสลิป, rerun ของแต่ละเมนู) เก็บเป็น histogram ในหน่วยความจำของ process
+# - bucket คงที่แบบ Prometheus (หน่วยวินาที): บันทึก 1 ครั้ง = bisect + บวกตัวเลขใต้ lock ไม่เก็บค่าดิบ
+# - มีทั้งยอดสะสมตั้งแต่เริ่ม process และหน้าต่างเลื่อน (WINDOW_SLOTS ช่อง ช่องละ SLOT_SECONDS วินาที)
+# - span ซ้อนกันได้: span "rerun" (ครอบ main() ทั้งรอบ) แตกเวลาตามงานลูกเป็น rerun.sql, rerun.receipt, ...
+#   และ rerun.other = เวลาที่ไม่ได้อยู่ใน SQL/PDF/สลิป (ส่วนใหญ่คือ pandas และการ render ของ Streamlit)
+# ปิดทั้งหมดได้ด้วย APP_METRICS=0
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOT_SECONDS = 60
+WINDOW_SLOTS = 10
+MAX_SERIES = 500
+PROM_PREFIX = "juristic"
+BREAKDOWN_SPAN = "rerun"
+
+enabled = os.environ.get("APP_METRICS", "1") != "0"
+
+
+class _Slot:
+    __slots__ = ("epoch", "counts", "count", "sum", "max")
+
+    def __init__(self, epoch=-1):
+        self.epoch = epoch
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, i, seconds):
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+
+class Histogram:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = _Slot()
+        self._ring = [_Slot() for _ in range(WINDOW_SLOTS)]
+
+    def observe(self, seconds, now=None):
+        i = bisect.bisect_left(BUCKETS, seconds)
+        epoch = int((now or time.time()) // SLOT_SECONDS)
+        with self._lock:
+            self.total.add(i, seconds)
+            slot = self._ring[epoch % WINDOW_SLOTS]
+            if slot.epoch != epoch:
+                slot.__init__(epoch)
+            slot.add(i, seconds)
+
+    def snapshot(self, window=False, now=None):
+        """_Slot รวม: ทั้งหมดตั้งแต่เริ่ม หรือเฉพาะ WINDOW_SLOTS ช่องล่าสุด"""
+        out = _Slot()
+        with self._lock:
+            if not window:
+                out.merge(self.total)
+            else:
+                current = int((now or time.time()) // SLOT_SECONDS)
+                for slot in self._ring:
+                    if current - WINDOW_SLOTS < slot.epoch <= current:
+                        out.merge(slot)
+        return out
+
+
+def quantile(slot, q):
+    """ประมาณค่า quantile จาก bucket (linear interpolation ภายใน bucket)"""
+    if not slot.count:
+        return 0.0
+    rank = q * slot.count
+    seen = 0
+    for i, n in enumerate(slot.counts):
+        if n and seen + n >= rank:
+            lo = BUCKETS[i - 1] if i else 0.0
+            hi = BUCKETS[i] if i < len(BUCKETS) else slot.max
+            return min(lo + (hi - lo) * (rank - seen) / n, slot.max)
+        seen += n
+    return slot.max
+
+
+class _Span:
+    __slots__ = ("registry", "name", "labels", "start", "child")
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.child = {}
+
+    def __enter__(self):
+        self.registry._stack().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = self.registry._stack()
+        stack.pop()
+        self.registry.observe(self.name, elapsed, **self.labels)
+        if self.name == BREAKDOWN_SPAN:
+            for name, seconds in self.child.items():
+                self.registry.observe(f"{self.name}.{name}", seconds, **self.labels)
+            self.registry.observe(f"{self.name}.other", max(elapsed - sum(self.child.values()), 0.0), **self.labels)
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Metrics:
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started = time.time()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _histogram(self, name, labels):
+        key = (name, tuple(sorted(labels.items())))
+        h = self._series.get(key)
+        if h is None:
+            with self._lock:
+                h = self._series.get(key)
+                if h is None:
+                    if len(self._series) >= MAX_SERIES:
+                        key = (name, (("overflow", "1"),))
+                        h = self._series.get(key)
+                    if h is None:
+                        h = self._series[key] = Histogram()
+        return h
+
+    def observe(self, name, seconds, **labels):
+        if not enabled:
+            return
+        self._histogram(name, labels).observe(seconds)
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            child = stack[-1].child  # เวลาของงานลูก แยกตามชื่อ
+            child[name] = child.get(name, 0.0) + seconds
+
+    def span(self, name, **labels):
+        return _Span(self, name, labels) if enabled else _NoSpan()
+
+    def label(self, **labels):
+        """เพิ่ม/แก้ label ของ span ที่ครอบอยู่ (เช่น รู้ชื่อเมนูหลังเริ่ม rerun แล้ว)"""
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            stack[-1].labels.update(labels)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self.started = time.time()
+
+    # --- อ่าน / ส่งออก ---
+    def rows(self, window=False):
+        """[{name, labels, count, sum, mean, p50, p95, p99, max}] หน่วยวินาที"""
+        now = time.time()
+        out = []
+        for (name, labels), h in list(self._series.items()):
+            s = h.snapshot(window, now)
+            if not s.count:
+                continue
+            out.append({"name": name, "labels": dict(labels), "count": s.count, "sum": s.sum,
+                        "mean": s.sum / s.count, "p50": quantile(s, 0.5), "p95": quantile(s, 0.95),
+                        "p99": quantile(s, 0.99), "max": s.max})
+        return sorted(out, key=lambda r: r["sum"], reverse=True)
+
+    def to_jsonl(self, window=False):
+        ts = time.strftime("%Y-%m-%dT%H:%M:%S")
+        return "".join(json.dumps(dict(r, ts=ts, window=window), ensure_ascii=False) + "\n"
+                       for r in self.rows(window))
+
+    def to_prometheus(self):
+        """histogram สะสมตั้งแต่เริ่ม process ในรูปแบบ Prometheus text exposition"""
+        by_name = {}
+        for (name, labels), h in sorted(list(self._series.items()), key=lambda kv: kv[0]):
+            by_name.setdefault(name, []).append((labels, h.snapshot()))
+        lines = []
+        for name, series in by_name.items():
+            metric = f"{PROM_PREFIX}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for labels, s in series:
+                base = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                sep = "," if base else ""
+                cumulative = 0
+                for bound, n in zip(BUCKETS + ("+Inf",), s.counts):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{{{base}{sep}le="{bound}"}} {cumulative}')
+                suffix = f"{{{base}}}" if base else ""
+                lines.append(f"{metric}_sum{suffix} {s.sum:.6f}")
+                lines.append(f"{metric}_count{suffix} {s.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """เขียนไฟล์ .prom แบบ atomic (สำหรับ node_exporter textfile collector)"""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp, path)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_SPACES = re.compile(r"\s+")
+_stmt_names = {}
+
+
+def statement_label(sql):
+    """ย่อ SQL เป็น label (ยุบช่องว่าง, ตัดที่ 80 ตัวอักษร) แคชไว้เพราะคำสั่งในแอปมีจำนวนจำกัด"""
+    label = _stmt_names.get(sql)
+    if label is None:
+        label = _SPACES.sub(" ", sql).strip()[:80]
+        if len(_stmt_names) < MAX_SERIES:
+            _stmt_names[sql] = label
+    return label
+
+
+# registry เดียวต่อ process: Streamlit รัน app.py ใหม่ทุก rerun แต่ module ที่ import ถูกเก็บไว้
+METRICS = Metrics()
+span = METRICS.span
+observe = METRICS.observe
+label = METRICS.label
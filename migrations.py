@@ -0,0 +1,276 @@
+import os
+import re
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+# --- Schema Migrations ---
+# เวอร์ชันของ schema เก็บใน PRAGMA user_version (อ่านเร็ว ไม่ต้อง query ตาราง)
+# ทุกขั้นที่รันแล้วบันทึกไว้ในตาราง schema_migrations
+# ตอนเปิดแอปถ้า user_version == เวอร์ชันล่าสุด จะไม่ทำอะไรเลย
+# เพิ่มขั้นใหม่: เขียนฟังก์ชัน _mNNN_xxx(c) แล้วต่อท้าย MIGRATIONS (ห้ามแก้ขั้นที่ปล่อยไปแล้ว)
+
+DATE_FORMAT = "%Y-%m-%d %H:%M"
+DATE_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-9][0-9]:[0-9][0-9]"
+_DATE_INPUT_FORMATS = ("%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S",
+                       "%Y-%m-%d", "%Y/%m/%d %H:%M", "%Y/%m/%d", "%d/%m/%Y %H:%M", "%d/%m/%Y")
+_last_format = DATE_FORMAT
+
+
+def normalize_date(value):
+    """แปลงวันที่รูปแบบต่างๆ เป็น 'YYYY-MM-DD HH:MM' (เรียงและทำ index ได้), แปลงไม่ได้คืน None"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FORMAT)
+    global _last_format
+    text = re.sub(r"\.\d+$", "", str(value).strip())  # ตัดเศษวินาที
+    # ลองรูปแบบที่เพิ่งใช้ได้ก่อน: ข้อมูลชุดเดียวกัน (เช่น CSV) มักใช้รูปแบบเดียวทั้งไฟล์
+    # strptime ที่ล้มเหลวแต่ละครั้งเสีย ~10us จากการ raise ValueError
+    for fmt in (_last_format,) + _DATE_INPUT_FORMATS:
+        try:
+            result = datetime.strptime(text, fmt).strftime(DATE_FORMAT)
+        except ValueError:
+            continue
+        _last_format = fmt
+        return result
+    return None
+
+
+def _columns(c, table):
+    return {row[1] for row in c.execute(f"PRAGMA table_info({table})")}
+
+
+def _m001_base_schema(c):
+    # ตารางเดิมของแอป + เติมคอลัมน์ที่ฐานข้อมูลรุ่นเก่ายังไม่มี
+    c.execute('''CREATE TABLE IF NOT EXISTS users
+                 (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT, role TEXT,
+                  sec_question TEXT, sec_answer TEXT)''')
+    cols = _columns(c, "users")
+    for col in ("role", "sec_question", "sec_answer"):
+        if col not in cols:
+            c.execute(f"ALTER TABLE users ADD COLUMN {col} TEXT")
+
+    c.execute('''CREATE TABLE IF NOT EXISTS personnel
+                 (id INTEGER PRIMARY KEY, owner_id INTEGER, name TEXT, phone TEXT, address TEXT)''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS transactions
+                 (id INTEGER PRIMARY KEY, person_id INTEGER, amount REAL,
+                  date TEXT, slip_path TEXT, note TEXT, category TEXT, download_count INTEGER DEFAULT 0)''')
+    cols = _columns(c, "transactions")
+    if "category" not in cols:
+        c.execute("ALTER TABLE transactions ADD COLUMN category TEXT")
+    if "download_count" not in cols:
+        c.execute("ALTER TABLE transactions ADD COLUMN download_count INTEGER DEFAULT 0")
+
+
+def _m002_indexes(c):
+    # ประวัติลูกบ้าน: WHERE person_id=? ORDER BY date DESC, id DESC (+ ตัวกรองปี)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_transactions_person_date ON transactions(person_id, date, id)")
+    # ตัวเลือกประเภทรายการในหน้าประวัติ
+    c.execute("CREATE INDEX IF NOT EXISTS idx_transactions_person_category ON transactions(person_id, category)")
+    # แดชบอร์ด/ส่งออก: ช่วงวันที่ + ยอดเงิน (covering ไม่ต้องกลับไปอ่านแถว)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_transactions_date_amount ON transactions(date, amount)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_transactions_category_date ON transactions(category, date)")
+    # โปรไฟล์: WHERE owner_id=?
+    c.execute("CREATE INDEX IF NOT EXISTS idx_personnel_owner ON personnel(owner_id)")
+
+
+def _m003_normalize_dates(c):
+    # date เดิมเป็นข้อความอิสระ -> บังคับเป็น 'YYYY-MM-DD HH:MM' ให้เรียง/เทียบช่วงบน index ได้
+    # ค่าที่แปลงไม่ได้ย้ายไปเก็บใน date_raw (ให้แอดมินแก้เอง) แล้วตั้ง date เป็น NULL
+    # ทุก query ที่เทียบช่วงหรือตัด substr ของ date จึงเจอแค่รูปแบบเดียวหรือ NULL
+    if "date_raw" not in _columns(c, "transactions"):
+        c.execute("ALTER TABLE transactions ADD COLUMN date_raw TEXT")
+    rows = c.execute("SELECT id, date FROM transactions WHERE date IS NOT NULL AND date NOT GLOB ?",
+                     (DATE_GLOB,)).fetchall()
+    fixed, unparsed = [], []
+    for tid, d in rows:
+        norm = normalize_date(d)
+        if norm:
+            fixed.append((norm, tid))
+        else:
+            unparsed.append((tid,))
+    c.executemany("UPDATE transactions SET date=? WHERE id=?", fixed)
+    c.executemany("UPDATE transactions SET date_raw=date, date=NULL WHERE id=?", unparsed)
+    # แถวใหม่ต้องอยู่ในรูปแบบเดียวกันเสมอ
+    for event in ("INSERT", "UPDATE OF date"):
+        name = "trg_transactions_date_" + event.split()[0].lower()
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS {name} BEFORE {event} ON transactions
+                      WHEN NEW.date IS NOT NULL AND NEW.date NOT GLOB '{DATE_GLOB}'
+                      BEGIN SELECT RAISE(ABORT, 'transactions.date must be YYYY-MM-DD HH:MM'); END""")
+
+
+def _m004_monthly_summary(c):
+    # ยอดรวมรายเดือน/ประเภท สำหรับแดชบอร์ด ดูแลด้วย trigger ทุกครั้งที่ transactions เปลี่ยน
+    c.execute('''CREATE TABLE IF NOT EXISTS monthly_summary
+                 (month TEXT NOT NULL, category TEXT NOT NULL, total REAL NOT NULL DEFAULT 0,
+                  tx_count INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (month, category)) WITHOUT ROWID''')
+    c.execute("DELETE FROM monthly_summary")
+    c.execute("""INSERT INTO monthly_summary (month, category, total, tx_count)
+                 SELECT substr(date, 1, 7), COALESCE(category, ''), SUM(COALESCE(amount, 0)), COUNT(*)
+                 FROM transactions WHERE date IS NOT NULL GROUP BY 1, 2""")
+    add = """INSERT INTO monthly_summary (month, category, total, tx_count)
+             VALUES (substr(NEW.date, 1, 7), COALESCE(NEW.category, ''), COALESCE(NEW.amount, 0), 1)
+             ON CONFLICT (month, category) DO UPDATE
+             SET total = total + excluded.total, tx_count = tx_count + 1;"""
+    remove = """UPDATE monthly_summary SET total = total - COALESCE(OLD.amount, 0), tx_count = tx_count - 1
+                WHERE month = substr(OLD.date, 1, 7) AND category = COALESCE(OLD.category, '');
+                DELETE FROM monthly_summary WHERE tx_count <= 0;"""
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_summary_insert AFTER INSERT ON transactions
+                  WHEN NEW.date IS NOT NULL BEGIN {add} END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_summary_delete AFTER DELETE ON transactions
+                  WHEN OLD.date IS NOT NULL BEGIN {remove} END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_summary_update_old AFTER UPDATE OF amount, date, category ON transactions
+                  WHEN OLD.date IS NOT NULL BEGIN {remove} END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_summary_update_new AFTER UPDATE OF amount, date, category ON transactions
+                  WHEN NEW.date IS NOT NULL BEGIN {add} END""")
+
+
+def _m005_reconciliation(c):
+    # กระทบยอดกับ statement ธนาคาร (ดู reconciliation.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS statement_lines
+                 (id INTEGER PRIMARY KEY, posted_at TEXT NOT NULL, amount REAL NOT NULL,
+                  reference TEXT, description TEXT, fingerprint TEXT NOT NULL UNIQUE,
+                  status TEXT NOT NULL DEFAULT 'unmatched', transaction_id INTEGER,
+                  source TEXT, imported_at TEXT)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_statement_lines_status ON statement_lines(status, posted_at)")
+    # สถานะการจับคู่เก็บไว้ที่รายการด้วย: NULL = ยังไม่เคยอยู่ในช่วงของ statement ที่นำเข้า
+    cols = _columns(c, "transactions")
+    if "recon_status" not in cols:
+        c.execute("ALTER TABLE transactions ADD COLUMN recon_status TEXT")
+    if "statement_line_id" not in cols:
+        c.execute("ALTER TABLE transactions ADD COLUMN statement_line_id INTEGER")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_transactions_recon ON transactions(recon_status, date)")
+
+
+def _m006_jobs(c):
+    # คิวงานเบื้องหลัง (ดู jobs.py): งานค้างอยู่ในตารางจึงทำต่อได้หลังรีสตาร์ท
+    c.execute('''CREATE TABLE IF NOT EXISTS jobs
+                 (id INTEGER PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL,
+                  status TEXT NOT NULL DEFAULT 'queued', priority INTEGER NOT NULL DEFAULT 0,
+                  dedupe_key TEXT UNIQUE, result TEXT, result_path TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,
+                  created_at TEXT, started_at TEXT, finished_at TEXT)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, priority DESC, id)")
+
+
+def _m007_archives(c):
+    # ทะเบียนไฟล์ archive รายปีของ transactions (ดู archive.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS archives
+                 (year INTEGER PRIMARY KEY, path TEXT NOT NULL, rows INTEGER NOT NULL DEFAULT 0, archived_at TEXT)''')
+
+
+def _m008_search(c):
+    # ดัชนีค้นหา FTS5 (ดู search.py) tokenizer trigram: ภาษาไทยไม่เว้นวรรคระหว่างคำ ตัดคำไม่ได้
+    # จึงจับคู่ทุกสตริงย่อยยาว 3 ตัวอักษรขึ้นไปแทน (ไม่สนตัวพิมพ์เล็ก/ใหญ่)
+    # ลูกบ้าน: external content อ่านข้อความจาก personnel ไม่เก็บซ้ำ
+    c.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS personnel_fts USING fts5(
+                 name, phone, address, content='personnel', content_rowid='id', tokenize='trigram')""")
+    c.execute("INSERT INTO personnel_fts (personnel_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0)')")
+    c.execute("INSERT INTO personnel_fts (personnel_fts) VALUES ('rebuild')")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_personnel_fts_insert AFTER INSERT ON personnel BEGIN
+                 INSERT INTO personnel_fts (rowid, name, phone, address) VALUES (NEW.id, NEW.name, NEW.phone, NEW.address); END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_personnel_fts_delete AFTER DELETE ON personnel BEGIN
+                 INSERT INTO personnel_fts (personnel_fts, rowid, name, phone, address)
+                 VALUES ('delete', OLD.id, OLD.name, OLD.phone, OLD.address); END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_personnel_fts_update AFTER UPDATE OF name, phone, address ON personnel BEGIN
+                 INSERT INTO personnel_fts (personnel_fts, rowid, name, phone, address)
+                 VALUES ('delete', OLD.id, OLD.name, OLD.phone, OLD.address);
+                 INSERT INTO personnel_fts (rowid, name, phone, address) VALUES (NEW.id, NEW.name, NEW.phone, NEW.address); END""")
+    # รายการ: เก็บข้อความเอง (ไม่ผูกกับ transactions) ดัชนีจึงครอบคลุมปีที่ย้ายไป archive แล้วด้วย
+    # category/month ไว้ทำ facet และกรองใน MATCH ได้โดยไม่ต้อง join กลับ transactions (month ไม่มีผลต่อ rank)
+    c.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+                 note, category, month, tokenize='trigram')""")
+    c.execute("INSERT INTO transactions_fts (transactions_fts, rank) VALUES ('rank', 'bm25(2.0, 1.0, 0.0)')")
+    c.execute("DELETE FROM transactions_fts")
+    insert = "INSERT INTO transactions_fts (rowid, note, category, month) VALUES (?,?,?,?)"
+    select = "SELECT id, note, category, substr(date, 1, 7) FROM transactions"
+    c.executemany(insert, c.execute(select).fetchall())
+    main_dir = os.path.dirname(next(row[2] for row in c.execute("PRAGMA database_list") if row[1] == "main"))
+    for (path,) in c.execute("SELECT path FROM archives").fetchall():
+        path = os.path.join(main_dir, path)  # ดู archive.file_path
+        if os.path.exists(path):
+            with closing(sqlite3.connect(path)) as src:
+                c.executemany(insert, src.execute(select).fetchall())
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_insert AFTER INSERT ON transactions BEGIN
+                 INSERT INTO transactions_fts (rowid, note, category, month)
+                 VALUES (NEW.id, NEW.note, NEW.category, substr(NEW.date, 1, 7)); END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_delete AFTER DELETE ON transactions BEGIN
+                 DELETE FROM transactions_fts WHERE rowid = OLD.id; END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_update AFTER UPDATE OF note, category, date ON transactions BEGIN
+                 UPDATE transactions_fts SET note = NEW.note, category = NEW.category, month = substr(NEW.date, 1, 7)
+                 WHERE rowid = OLD.id; END""")
+
+
+_HISTORY_INDEX = ("CREATE INDEX {}idx_transactions_person_date "
+                  "ON transactions(person_id, date, id, category, amount, download_count, note)")
+
+
+def _m009_covering_history_index(c):
+    # หน้าประวัติอ่าน amount/note/category/download_count ด้วย: index เดิม (person_id, date, id)
+    # ต้องกลับไปอ่านแถวในตารางทีละแถว ใส่ทุกคอลัมน์ที่ SELECT ไว้ใน index (covering) ตอบได้จาก index อย่างเดียว
+    c.execute("DROP INDEX IF EXISTS idx_transactions_person_date")
+    c.execute(_HISTORY_INDEX.format(""))
+    # ไฟล์ archive ที่มีอยู่แล้วคัดลอก index ชุดเดิมไป (archive ใหม่คัดลอกจาก data.db เอง ดู archive._copy_to_archive)
+    # ไฟล์ที่ ATTACH อยู่กับ c ถูก lock โดย transaction นี้ จึงแก้ผ่าน c เอง
+    databases = {os.path.abspath(row[2]): row[1] for row in c.execute("PRAGMA database_list") if row[2]}
+    main_dir = os.path.dirname(next(path for path, name in databases.items() if name == "main"))
+    for (path,) in c.execute("SELECT path FROM archives").fetchall():
+        path = os.path.abspath(os.path.join(main_dir, path))  # ดู archive.file_path
+        if path in databases:
+            c.execute(f"DROP INDEX IF EXISTS {databases[path]}.idx_transactions_person_date")
+            c.execute(_HISTORY_INDEX.format(databases[path] + "."))
+        elif os.path.exists(path):
+            with closing(sqlite3.connect(path)) as dst:
+                dst.execute("DROP INDEX IF EXISTS idx_transactions_person_date")
+                dst.execute(_HISTORY_INDEX.format(""))
+                dst.commit()
+
+
+MIGRATIONS = [
+    (1, "base schema", _m001_base_schema),
+    (2, "indexes for history, profile and dashboard", _m002_indexes),
+    (3, "normalize transactions.date", _m003_normalize_dates),
+    (4, "monthly_summary table for the admin dashboard", _m004_monthly_summary),
+    (5, "bank statement reconciliation", _m005_reconciliation),
+    (6, "background job queue", _m006_jobs),
+    (7, "yearly transaction archives", _m007_archives),
+    (8, "full-text search indexes", _m008_search),
+    (9, "covering index for the history page", _m009_covering_history_index),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=LATEST_VERSION):
+    """รันทุกขั้นที่ยังไม่ได้รันจนถึง target คืนค่าเวอร์ชันปัจจุบัน"""
+    version = schema_version(conn)
+    if version >= target:
+        return version
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_migrations
+                    (version INTEGER PRIMARY KEY, name TEXT, applied_at TEXT)''')
+    conn.commit()
+    for step, name, apply in MIGRATIONS:
+        if step <= version or step > target:
+            continue
+        # แต่ละขั้นเป็น transaction เดียว (DDL ของ SQLite rollback ได้)
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        if schema_version(conn) >= step:  # อีก process รันขั้นนี้ไปแล้วระหว่างรอ lock
+            conn.rollback()
+            version = step
+            continue
+        try:
+            apply(c)
+            c.execute("INSERT OR REPLACE INTO schema_migrations (version, name, applied_at) VALUES (?,?,?)",
+                      (step, name, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            c.execute(f"PRAGMA user_version = {int(step)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = step
+    return version
@@ -0,0 +1,39 @@
+import multiprocessing
+import sys
+import threading
+import types
+from concurrent.futures import ProcessPoolExecutor
+
+# --- Process Pool (เรนเดอร์ใบเสร็จนอก process ของ Streamlit) ---
+# ใช้ spawn: fork จาก process ที่มีหลาย thread (Streamlit) อาจติด lock ที่ถูกถือค้างไว้
+# แต่ spawn ปกติให้ process ลูกรัน __main__ ของ parent ซ้ำเป็น __mp_main__
+# ใต้ `streamlit run` __main__ คือ app.py: ลูกทุกตัวจะ import streamlit/pandas, migrate, เปิด writer thread ของตัวเอง
+# ตอนสร้าง process ลูกจึงให้ __main__ เป็นโมดูลว่าง (ไม่มี __file__/__spec__) ลูกไม่รัน main อะไรเลย
+# งานที่ส่งเข้า pool ต้องเป็นฟังก์ชันระดับโมดูลอื่น (เช่น jobs.render_receipt) ลูก import แค่โมดูลนั้น
+
+_BARE_MAIN = types.ModuleType("__main__")
+_main_lock = threading.Lock()
+_SpawnContext = type(multiprocessing.get_context("spawn"))
+
+
+class _WorkerProcess(_SpawnContext.Process):
+    @staticmethod
+    def _Popen(process_obj):
+        with _main_lock:
+            main = sys.modules["__main__"]
+            sys.modules["__main__"] = _BARE_MAIN
+            try:
+                return _SpawnContext.Process._Popen(process_obj)
+            finally:
+                # Streamlit ตั้ง __main__ ใหม่ทุก rerun: คืนค่าเดิมเฉพาะเมื่อยังไม่มีใครเปลี่ยน
+                if sys.modules["__main__"] is _BARE_MAIN:
+                    sys.modules["__main__"] = main
+
+
+class _WorkerContext(_SpawnContext):
+    Process = _WorkerProcess
+
+
+def spawn_pool(max_workers, initializer=None):
+    """ProcessPoolExecutor แบบ spawn ที่ process ลูกไม่ import สคริปต์หลัก (app.py)"""
+    return ProcessPoolExecutor(max_workers, mp_context=_WorkerContext(), initializer=initializer)
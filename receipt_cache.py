@@ -0,0 +1,168 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+# --- Receipt PDF Cache ---
+# เก็บไบต์ PDF ของใบเสร็จไว้ในหน่วยความจำ (LRU จำกัดขนาดรวม) และเลือกเก็บลงดิสก์ได้
+# คีย์ = (รหัสรายการ, ต้นฉบับ/สำเนา, แฮชของข้อมูลที่พิมพ์ลงใบเสร็จ)
+# ถ้าข้อมูลในใบเสร็จเปลี่ยน แฮชจะเปลี่ยน -> ได้คีย์ใหม่ ไม่ต้องสั่งล้างแคชเอง
+# บนดิสก์จำกัดขนาดรวม (disk_max_bytes ค่าเริ่มต้นเท่าในหน่วยความจำ) เกินแล้วลบไฟล์ที่ไม่ได้ใช้นานสุดตาม mtime
+
+
+def receipt_fingerprint(person_name, date_str, amount, category, note):
+    """แฮชของทุกฟิลด์ที่ถูกพิมพ์ลงใบเสร็จ"""
+    raw = "\x1f".join([str(person_name), str(date_str), f"{float(amount):.2f}", str(category), str(note)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ReceiptCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_items=2048, disk_dir=None, disk_max_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = max_bytes if disk_max_bytes is None else disk_max_bytes
+        self._disk_size = None  # นับจากไฟล์จริงตอนเขียนครั้งแรก
+        self._disk_lock = threading.Lock()
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        if disk_dir and not os.path.exists(disk_dir):
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(trans_id, is_original, fingerprint):
+        return (int(trans_id), bool(is_original), fingerprint)
+
+    def _disk_path(self, key):
+        trans_id, is_original, fingerprint = key
+        state = "O" if is_original else "C"
+        return os.path.join(self.disk_dir, fingerprint[:2], f"{trans_id}_{state}_{fingerprint}.pdf")
+
+    def _remember(self, key, data):
+        # เรียกขณะถือ lock อยู่แล้ว
+        if key in self._items:
+            self._size -= len(self._items.pop(key))
+        if len(data) > self.max_bytes:
+            return
+        self._items[key] = data
+        self._size += len(data)
+        while self._size > self.max_bytes or len(self._items) > self.max_items:
+            _, old = self._items.popitem(last=False)
+            self._size -= len(old)
+            self.evictions += 1
+
+    def _disk_files(self):
+        # [(mtime, ขนาด, path)] ของไฟล์ในแคชดิสก์ (ไม่นับไฟล์ .tmp ที่กำลังเขียน)
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if name.endswith(".pdf"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, path))
+        return files
+
+    def _prune_disk(self, added):
+        # เรียกหลังเขียนไฟล์: ขนาดรวมเกิน disk_max_bytes -> ลบไฟล์ mtime เก่าสุดจนเหลือ 90% (get แตะ mtime จึงเป็น LRU)
+        # ตอนลบนับขนาดใหม่จากไฟล์จริง หลาย process ใช้โฟลเดอร์เดียวกันได้ (ยอดที่นับเองคลาดได้ ไม่เป็นไร)
+        with self._disk_lock:
+            if self._disk_size is not None:
+                self._disk_size += added
+                if self._disk_size <= self.disk_max_bytes:
+                    return
+            files = self._disk_files()
+            self._disk_size = sum(size for _, size, _ in files)
+            if self._disk_size <= self.disk_max_bytes:
+                return
+            for _, size, path in sorted(files):
+                if self._disk_size <= self.disk_max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                self._disk_size -= size
+                self.disk_evictions += 1
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return data
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:  # ยังไม่เคยเก็บ หรือถูก _prune_disk ลบไปแล้ว
+                data = None
+            if data is not None:
+                try:
+                    os.utime(path)  # ใช้ล่าสุด: ถูกลบทีหลัง
+                except OSError:
+                    pass
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, data)
+                return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def __contains__(self, key):
+        """มีในแคชหรือไม่ (ไม่นับเป็น hit/miss)"""
+        with self._lock:
+            if key in self._items:
+                return True
+        return bool(self.disk_dir) and os.path.exists(self._disk_path(key))
+
+    def put(self, key, data):
+        with self._lock:
+            self._remember(key, data)
+        if self.disk_dir:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._prune_disk(len(data))
+
+    def get_or_render(self, trans_id, is_original, fields, render):
+        """fields = (person_name, date_str, amount, category, note), render() -> bytes"""
+        key = self.make_key(trans_id, is_original, receipt_fingerprint(*fields))
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "items": len(self._items),
+                "bytes": self._size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_evictions": self.disk_evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
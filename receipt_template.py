@@ -0,0 +1,197 @@
+import os
+import threading
+from datetime import datetime
+
+# *** ต้องติดตั้งก่อน: pip install bahttext ***
+from bahttext import bahttext
+
+import metrics
+
+# --- Receipt Template Engine ---
+# โหลดฟอนต์ TH Sarabun, รูปลายเซ็น และวาดส่วนที่ไม่เปลี่ยน (หัวกระดาษ/ตาราง/ลายเซ็น) เพียงครั้งเดียวต่อ process
+# ใบเสร็จแต่ละใบจะเติมเฉพาะข้อมูลที่เปลี่ยน: ชื่อ, วันที่, เลขที่, รายการ, ยอดเงิน, ตัวอักษร (bahttext)
+# หมายเหตุ: การแยก PNG ของลายเซ็น (alpha channel) คือส่วนที่ช้าที่สุดของ FPDF จึงต้องทำครั้งเดียว
+# fpdf ถูก import ตอนสร้าง template ครั้งแรก: import โมดูลนี้ (เช่นเพื่อใช้ receipt_number) จึงไม่ต้องโหลด fpdf
+
+FONT_FILE = 'THSarabunNew.ttf'
+FONT_BOLD_FILE = 'THSarabunNew Bold.ttf'
+SIGNATURE_FILE = 'signature.png'
+
+
+def receipt_number(trans_id, date_str):
+    # ใช้ส่วนวันที่มาทำเลขที่ใบเสร็จ (รายการที่ไม่มีวันที่ใช้แค่ id)
+    if not date_str:
+        return f"RCP-{trans_id:04d}"
+    rec_date_obj = datetime.strptime(date_str.split()[0], "%Y-%m-%d")
+    return f"RCP-{rec_date_obj.strftime('%Y%m')}-{trans_id:04d}"
+
+
+class ReceiptTemplate:
+    def __init__(self, font_file=FONT_FILE, font_bold_file=FONT_BOLD_FILE, signature_file=SIGNATURE_FILE):
+        from fpdf import FPDF
+        self._fpdf_class = FPDF
+        # 1. โหลดฟอนต์ + รูปภาพ ลงเอกสารต้นแบบ (ไม่ถูก output)
+        res = FPDF()
+        res.add_page()
+        if os.path.exists(font_file):
+            res.add_font('THSarabunNew', '', font_file, uni=True)
+            res.add_font('THSarabunNew', 'B', font_bold_file, uni=True)
+            self.font = 'THSarabunNew'
+        else:
+            self.font = 'Arial'
+        # ลงทะเบียน core font ไว้ล่วงหน้า เพื่อให้เลข /F ตรงกันทุกเอกสาร
+        res.set_font(self.font, 'B', 20)
+        res.set_font(self.font, '', 14)
+        self.signature_file = signature_file if os.path.exists(signature_file) else None
+        if self.signature_file:
+            res.image(self.signature_file, x=0, y=0, w=1)
+        self._fonts = res.fonts
+        self._pdf_version = res.pdf_version  # PNG ที่มี alpha ต้องใช้ PDF 1.4
+        self._images = res.images
+
+        # 2. วาดชั้น static แยกตามสถานะ ต้นฉบับ/สำเนา
+        self._layers = {}
+        self._slots = None
+        for is_original in (True, False):
+            pdf = self._new_document()
+            pdf.add_page()
+            start = len(pdf.pages[pdf.page])
+            slots = self._draw_static(pdf, is_original)
+            self._layers[is_original] = pdf.pages[pdf.page][start:]
+            self._slots = slots
+            # ตัวอักษรที่ใช้ในชั้น static ต้องอยู่ใน subset ของฟอนต์ทุกเอกสาร
+            for key, font in pdf.fonts.items():
+                if 'subset' in font:
+                    merged = self._fonts[key]['subset']
+                    merged.extend(u for u in font['subset'] if u not in merged)
+
+    def _new_document(self):
+        pdf = self._fpdf_class()
+        # คัดลอก dict ต่อเอกสาร เพราะตอน output FPDF จะแก้ค่า (n, subset, data) ในตัว dict
+        pdf.fonts = {k: dict(v, subset=list(v['subset'])) if 'subset' in v else dict(v)
+                     for k, v in self._fonts.items()}
+        pdf.images = {k: dict(v) for k, v in self._images.items()}
+        pdf.pdf_version = self._pdf_version
+        return pdf
+
+    def _draw_static(self, pdf, is_original):
+        """วาดเลย์เอาต์เดียวกับใบเสร็จเดิม แต่เว้นช่องข้อมูลไว้ แล้วคืนตำแหน่งช่องเหล่านั้น"""
+        font = self.font
+        slots = {}
+
+        def slot(name, w, h, style, align):
+            slots[name] = (pdf.get_x(), pdf.get_y(), w, h, style, align)
+
+        # --- HEADER ---
+        pdf.set_font(font, 'B', 20)
+        pdf.cell(0, 10, txt="ใบเสร็จรับเงิน / RECEIPT", ln=1, align='C')
+
+        # --- WATERMARK ---
+        pdf.set_font(font, 'B', 14)
+        status_text = "ต้นฉบับ / ORIGINAL" if is_original else "สำเนา / COPY"
+        pdf.set_xy(150, 10)
+        pdf.set_text_color(255, 0, 0) if not is_original else pdf.set_text_color(0, 100, 0)
+        pdf.cell(50, 10, txt=f"[{status_text}]", border=1, align='C')
+        pdf.set_text_color(0, 0, 0)
+        pdf.ln(20)
+
+        # --- INFO BLOCK ---
+        pdf.set_font(font, '', 14)
+        slot('payer', 130, 8, '', 'L')
+        pdf.cell(130, 8, txt="", ln=0)
+        slot('receipt_no', 60, 8, '', 'R')
+        pdf.cell(60, 8, txt="", ln=1)
+        slot('date', 130, 8, '', 'L')
+        pdf.cell(130, 8, txt="", ln=0)
+        pdf.cell(60, 8, txt="สถานะ: ชำระเงินเรียบร้อย", ln=1, align='R')
+        pdf.ln(10)
+
+        # --- TABLE: No(15) + Desc(115) + Amount(50) = 180 ---
+        pdf.set_fill_color(240, 240, 240)
+        pdf.set_font(font, 'B', 14)
+        pdf.cell(15, 10, txt="#", border=1, align='C', fill=True)
+        pdf.cell(115, 10, txt="รายการ (Description)", border=1, align='C', fill=True)
+        pdf.cell(50, 10, txt="จำนวนเงิน (Amount)", border=1, align='C', fill=True)
+        pdf.ln()
+
+        pdf.set_font(font, '', 14)
+        pdf.cell(15, 10, txt="1", border=1, align='C')
+        slot('description', 115, 10, '', 'L')
+        pdf.cell(115, 10, txt="", border=1)
+        slot('amount', 50, 10, '', 'R')
+        pdf.cell(50, 10, txt="", border=1)
+        pdf.ln()
+
+        # Grand Total Row
+        pdf.set_font(font, 'B', 14)
+        pdf.cell(130, 10, txt="รวมทั้งสิ้น (Grand Total)", border=1, align='R')
+        slot('total', 50, 10, 'B', 'R')
+        pdf.cell(50, 10, txt="", border=1, fill=True)
+        pdf.ln()
+
+        # --- THAI BAHT TEXT ROW ---
+        pdf.set_font(font, '', 14)
+        slot('baht_text', 180, 10, '', 'C')
+        pdf.cell(180, 10, txt="", border='T', fill=True)
+
+        # --- SIGNATURE SECTION ---
+        pdf.ln(25)
+        pdf.cell(120, 8, txt="", ln=0)
+        line_start_y = pdf.get_y()
+        pdf.cell(70, 8, txt="......................................................", ln=1, align='C')
+        if self.signature_file:
+            pdf.image(self.signature_file, x=135, y=line_start_y - 12, w=40)
+        pdf.cell(120, 8, txt="", ln=0)
+        pdf.cell(70, 8, txt="( ผู้มีอำนาจลงนาม )", ln=1, align='C')
+        pdf.cell(120, 8, txt="", ln=0)
+        pdf.cell(70, 8, txt="นิติบุคคลอาคารชุด/หมู่บ้าน", ln=1, align='C')
+        return slots
+
+    def new_document(self):
+        """เอกสารเปล่าที่มีฟอนต์/รูปพร้อมใช้ ใช้คู่กับ add_receipt เพื่อรวมหลายใบในไฟล์เดียว"""
+        return self._new_document()
+
+    def add_receipt(self, pdf, trans_id, person_name, date_str, amount, category, note, is_original=True):
+        pdf.add_page()
+        # ชั้น static ครอบด้วย q/Q เพื่อไม่ให้สี/ฟอนต์ในชั้นนี้รั่วมาถึงข้อมูลที่เติมทีหลัง
+        pdf._out('q\n' + self._layers[is_original].rstrip('\n') + '\nQ')
+        values = {
+            'payer': f"ได้รับเงินจาก: {person_name}",
+            'receipt_no': f"เลขที่: {receipt_number(trans_id, date_str)}",
+            'date': f"วันที่ชำระ (Date/Time): {date_str or '-'}",
+            'description': f"{category} - {note}",
+            'amount': f"{amount:,.2f}",
+            'total': f"{amount:,.2f}",
+            'baht_text': f"( ตัวอักษร: {bahttext(amount)} )",
+        }
+        pdf.set_text_color(0, 0, 0)
+        for name, (x, y, w, h, style, align) in self._slots.items():
+            pdf.set_font(self.font, style, 14)
+            pdf.set_xy(x, y)
+            pdf.cell(w, h, txt=values[name], align=align)
+        return pdf
+
+    def render(self, trans_id, person_name, date_str, amount, category, note, is_original=True):
+        """สร้างใบเสร็จ 1 ใบ คืนค่าเป็นไบต์ PDF"""
+        with metrics.span("pdf_render"):
+            pdf = self.add_receipt(self._new_document(), trans_id, person_name, date_str, amount,
+                                   category, note, is_original)
+            return pdf.output(dest='S').encode('latin-1')
+
+
+# --- template ต่อ process (สร้างครั้งแรกที่ถูกเรียก) ---
+_template = None
+_template_lock = threading.Lock()
+
+
+def get_template():
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = ReceiptTemplate()
+    return _template
+
+
+def render_receipt_pdf(trans_id, person_name, date_str, amount, category, note, is_original=True):
+    return get_template().render(trans_id, person_name, date_str, amount, category, note, is_original)
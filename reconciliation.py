@@ -0,0 +1,320 @@
+import csv
+import hashlib
+import io
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from datetime import date, datetime
+
+from migrations import normalize_date
+
+# --- Bank Statement Reconciliation ---
+# จับคู่รายการเงินเข้าใน statement ธนาคารกับรายการแจ้งโอน (transactions) ด้วยยอดเงิน + เวลา
+# - จัดกลุ่มรายการตามยอดเงิน (หน่วยสตางค์) แต่ละกลุ่มเรียงตามเวลา แล้วใช้ bisect หาผู้สมัครในช่วง ±window นาที
+#   ไม่มีลูปซ้อน statement x transactions
+# - จับคู่เป็นขั้น (TIERS): เวลาตรงกันเป๊ะก่อน แล้วค่อยขยายช่วง ในแต่ละขั้นรับเฉพาะคู่ที่ไม่มีตัวเลือกอื่น (1 ต่อ 1)
+# - ที่เหลือซึ่งมีผู้สมัครหลายตัว: เลือกคู่ที่เวลาใกล้สุดเป็น "ข้อเสนอ" สถานะ ambiguous ให้แอดมินยืนยันเอง
+# - รายการแจ้งโอนซ้ำ (สลิปเดียวกัน หรือคนเดิม ยอดเดิม เวลาเดิม) ถูกตั้งเป็น duplicate และไม่นำไปจับคู่
+# - บรรทัด statement ที่เคยนำเข้าแล้ว (fingerprint ซ้ำ) ถูกข้าม นำเข้าไฟล์เดิมซ้ำได้ไม่เกิดรายการซ้ำ
+
+DEFAULT_WINDOW_MINUTES = 60
+TIERS = (0, 2, 10)  # + window เป็นขั้นสุดท้าย
+
+MATCHED = 'matched'
+AMBIGUOUS = 'ambiguous'
+UNMATCHED = 'unmatched'
+DUPLICATE = 'duplicate'
+
+_AMOUNT_FIELDS = ('amount', 'credit', 'deposit')
+_REFERENCE_FIELDS = ('reference', 'ref')
+_DESCRIPTION_FIELDS = ('description', 'details', 'memo')
+
+
+def _minutes(date_str):
+    """'YYYY-MM-DD HH:MM' -> นาทีนับจาก 0001-01-01 (เทียบ/ลบกันได้ตรงๆ)"""
+    d = datetime.fromisoformat(date_str)
+    return d.toordinal() * 1440 + d.hour * 60 + d.minute
+
+
+def _date_str(minutes):
+    day, rest = divmod(minutes, 1440)
+    return f"{date.fromordinal(day).isoformat()} {rest // 60:02d}:{rest % 60:02d}"
+
+
+def _satang(amount):
+    return int(round(float(amount) * 100))
+
+
+def _first(row, fields):
+    for f in fields:
+        if row.get(f):
+            return row[f]
+    return ''
+
+
+def parse_statement(fileobj):
+    """อ่าน CSV จากธนาคาร คอลัมน์ date (+ time), amount|credit|deposit, reference, description
+
+    คืนค่า (lines, skipped): lines = [(posted_at, amount, reference, description, fingerprint)]
+    ข้ามรายการเงินออก/ยอดว่าง และแถวที่อ่านวันที่ไม่ได้"""
+    if isinstance(fileobj, (bytes, bytearray)):
+        fileobj = io.StringIO(fileobj.decode('utf-8-sig'))
+    elif not isinstance(fileobj, io.TextIOBase):  # ไฟล์ไบนารี เช่น UploadedFile ของ Streamlit
+        fileobj = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    lines, skipped = [], 0
+    seen = Counter()
+    for raw in csv.DictReader(fileobj):
+        row = {k.strip().lower(): (v or '').strip() for k, v in raw.items() if k}
+        when = f"{row.get('date', '')} {row['time']}" if row.get('time') else row.get('date')
+        posted = normalize_date(when)
+        try:
+            amount = float(_first(row, _AMOUNT_FIELDS).replace(',', ''))
+        except ValueError:
+            amount = 0.0
+        if posted is None or amount <= 0:
+            skipped += 1
+            continue
+        ref, desc = _first(row, _REFERENCE_FIELDS), _first(row, _DESCRIPTION_FIELDS)
+        key = (posted, _satang(amount), ref, desc)
+        seen[key] += 1  # บรรทัดเหมือนกันทุกช่องในไฟล์เดียวกันคือคนละรายการ นับลำดับไว้ใน fingerprint
+        fp = hashlib.sha1("\x1f".join(map(str, key + (seen[key],))).encode('utf-8')).hexdigest()
+        lines.append((posted, amount, ref, desc, fp))
+    return lines, skipped
+
+
+def match(lines, txns, window=DEFAULT_WINDOW_MINUTES):
+    """lines/txns = [(id, minutes, satang)] คืนค่า (matched, suggested) เป็น list ของ (line_id, txn_id)"""
+    buckets = defaultdict(list)
+    for tid, minute, satang in txns:
+        buckets[satang].append((minute, tid))
+    keys = {}
+    for satang, bucket in buckets.items():
+        bucket.sort()
+        keys[satang] = [m for m, _ in bucket]
+
+    # คู่ผู้สมัครทั้งหมดในช่วง ±window (bisect ต่อบรรทัด) เรียงตามระยะห่างของเวลา
+    pairs = []
+    for lid, minute, satang in lines:
+        ms = keys.get(satang)
+        if not ms:
+            continue
+        bucket = buckets[satang]
+        for i in range(bisect_left(ms, minute - window), bisect_right(ms, minute + window)):
+            pairs.append((abs(ms[i] - minute), lid, bucket[i][1]))
+    pairs.sort()
+
+    used_lines, used_txns = set(), set()
+    matched = []
+    for tier in TIERS + (window,):
+        # ในขั้นนี้: คู่ที่ทั้งสองฝั่งมีผู้สมัครแค่ตัวเดียว (นับเฉพาะที่ยังว่าง)
+        live = [(lid, tid) for d, lid, tid in pairs
+                if d <= tier and lid not in used_lines and tid not in used_txns]
+        line_deg = Counter(lid for lid, _ in live)
+        txn_deg = Counter(tid for _, tid in live)
+        for lid, tid in live:
+            if line_deg[lid] == 1 and txn_deg[tid] == 1:
+                matched.append((lid, tid))
+                used_lines.add(lid)
+                used_txns.add(tid)
+
+    suggested = []
+    for d, lid, tid in pairs:  # ใกล้สุดก่อน
+        if lid not in used_lines and tid not in used_txns:
+            suggested.append((lid, tid))
+            used_lines.add(lid)
+            used_txns.add(tid)
+    return matched, suggested
+
+
+def _duplicates(rows):
+    """rows = [(id, date, satang, person_id, slip_path, matched)] คืน id ที่เป็นรายการแจ้งซ้ำ
+    ซ้ำ = สลิปเดียวกัน (path มาจาก hash ของไฟล์) หรือไม่มีสลิปแต่คนเดิม ยอดเดิม เวลาเดิม
+    รายการที่จับคู่แล้วและ id น้อยกว่าถือเป็นตัวจริง (รายการที่จับคู่แล้วไม่ถูกตั้งเป็นซ้ำ)"""
+    seen, dups = set(), set()
+    for tid, dt, satang, person_id, slip, is_matched in sorted(rows, key=lambda r: (not r[5], r[0])):
+        key = ("s", slip) if slip else ("p", person_id, satang, dt)
+        if key in seen and not is_matched:
+            dups.add(tid)
+        seen.add(key)
+    return dups
+
+
+class ImportPlan:
+    """ผลของ prepare_import: บรรทัดใหม่ + สถานะที่จะบันทึก และข้อมูลที่ใช้จับคู่ (ไว้ตรวจว่ายังไม่เปลี่ยนตอนบันทึก)"""
+
+    def __init__(self, new_lines, first_id, source, imported_at, window, span, inputs, states, stats):
+        self.new_lines = new_lines
+        self.first_id = first_id  # id ที่บรรทัดใหม่บรรทัดแรกจะได้ (ถ้ามีการนำเข้าอื่นคั่นกลาง id จะไม่ตรง)
+        self.source = source
+        self.imported_at = imported_at
+        self.window = window
+        self.span = span  # (posted_at แรก, สุดท้าย) ของบรรทัดใหม่ ช่วงที่จับคู่ใหม่
+        self.inputs = inputs
+        self.states = states
+        self.stats = stats
+
+
+def _inputs(c, window, span=None):
+    """(บรรทัดที่ยังไม่ matched ในฐานข้อมูล, รายการแจ้งโอนที่อาจคู่กับบรรทัดเหล่านั้น)
+    span = (posted_at แรก, สุดท้าย): อ่านเฉพาะบรรทัดในช่วง span ± window และรายการในช่วง span ± 2 window
+    (รายการที่คู่กับบรรทัดใดในชุดได้อยู่ในชุดเสมอ) นำเข้าไฟล์ใหม่จึงไม่อ่านบรรทัดเก่าทั้งหมดซ้ำ
+    span=None: ทุกบรรทัดที่ยังไม่ matched"""
+    sql = "SELECT id, posted_at, amount, transaction_id FROM statement_lines WHERE status IN (?, ?)"
+    params = [UNMATCHED, AMBIGUOUS]
+    if span:
+        sql += " AND posted_at >= ? AND posted_at <= ?"
+        params += [_date_str(_minutes(span[0]) - window), _date_str(_minutes(span[1]) + window)]
+    lines = c.execute(sql, params).fetchall()
+    posted = [p for _, p, _, _ in lines]
+    if span:
+        start, end = _date_str(_minutes(span[0]) - 2 * window), _date_str(_minutes(span[1]) + 2 * window)
+    elif posted:
+        start, end = _date_str(_minutes(min(posted)) - window), _date_str(_minutes(max(posted)) + window)
+    else:
+        return lines, []
+    rows = c.execute("SELECT id, date, amount, person_id, slip_path, recon_status, statement_line_id "
+                     "FROM transactions WHERE date >= ? AND date <= ?", (start, end)).fetchall()
+    return lines, rows
+
+
+def _plan(inputs, new_lines, first_id, window):
+    """จับคู่จากข้อมูลที่อ่านมา (ไม่แตะฐานข้อมูล) คืนค่า ((line_state, txn_state), stats)
+    บรรทัดใหม่ใช้ id ที่จะได้ตอน INSERT (first_id, first_id + 1, ...)"""
+    stats = {MATCHED: 0, AMBIGUOUS: 0, 'unmatched_lines': 0, 'unmatched_transactions': 0, DUPLICATE: 0}
+    db_lines, db_rows = inputs
+    line_ids = {row[0] for row in db_lines}
+    txn_ids = {row[0] for row in db_rows}
+    # คู่ที่อีกฝั่งอยู่นอกชุดที่อ่านมา (ข้อเสนอ ambiguous ข้ามขอบช่วง) ไม่แตะ: ถือเหมือน matched
+    lines = [(lid, _minutes(posted), _satang(amount)) for lid, posted, amount, tid in db_lines
+             if tid is None or tid in txn_ids]
+    lines += [(first_id + i, _minutes(line[0]), _satang(line[1])) for i, line in enumerate(new_lines)]
+    if not lines:
+        return ({}, {}), stats
+    rows = [(tid, dt, _satang(amount or 0), person_id, slip,
+             status == MATCHED or (lid is not None and lid not in line_ids))
+            for tid, dt, amount, person_id, slip, status, lid in db_rows]
+    dups = _duplicates(rows)
+    txns = [(tid, _minutes(dt), satang) for tid, dt, satang, _, _, is_matched in rows
+            if not is_matched and tid not in dups]
+
+    matched, suggested = match(lines, txns, window)
+
+    line_state = {lid: (UNMATCHED, None) for lid, _, _ in lines}
+    txn_state = {tid: (UNMATCHED, None) for tid, _, _ in txns}
+    txn_state.update((tid, (DUPLICATE, None)) for tid in dups)
+    for status, pairs in ((MATCHED, matched), (AMBIGUOUS, suggested)):
+        for lid, tid in pairs:
+            line_state[lid] = (status, tid)
+            txn_state[tid] = (status, lid)
+
+    stats[MATCHED], stats[AMBIGUOUS], stats[DUPLICATE] = len(matched), len(suggested), len(dups)
+    stats['unmatched_lines'] = sum(1 for s, _ in line_state.values() if s == UNMATCHED)
+    stats['unmatched_transactions'] = sum(1 for s, _ in txn_state.values() if s == UNMATCHED)
+    return (line_state, txn_state), stats
+
+
+def _save(c, states):
+    line_state, txn_state = states
+    c.executemany("UPDATE statement_lines SET status=?, transaction_id=? WHERE id=?",
+                  [(s, ref, lid) for lid, (s, ref) in line_state.items()])
+    c.executemany("UPDATE transactions SET recon_status=?, statement_line_id=? WHERE id=?",
+                  [(s, ref, tid) for tid, (s, ref) in txn_state.items()])
+
+
+def reconcile(c, window=DEFAULT_WINDOW_MINUTES, span=None):
+    """จับคู่บรรทัด statement ที่ยังไม่ matched ทั้งหมด (หรือเฉพาะช่วง span) กับรายการแจ้งโอนในช่วงเวลาเดียวกัน แล้วบันทึกสถานะ
+
+    c = cursor ที่อยู่ใน transaction สำหรับเขียน (เช่นใน db.write) แอดมินยืนยันแล้ว (matched) จะไม่ถูกแตะ"""
+    states, stats = _plan(_inputs(c, window, span), [], 0, window)
+    _save(c, states)
+    return stats
+
+
+def prepare_import(conn, fileobj, source='', window=DEFAULT_WINDOW_MINUTES):
+    """ขั้นที่ 1 (connection อ่าน ไม่ต้องถือ writer): อ่าน CSV, ตัดบรรทัดที่เคยนำเข้าแล้ว, จับคู่ คืนค่า ImportPlan
+    ส่วนนี้กินเวลาเกือบทั้งหมดของการนำเข้า (parse + match หลายวินาทีสำหรับ statement ทั้งปี)"""
+    t0 = time.perf_counter()
+    lines, skipped = parse_statement(fileobj)
+    known = set()
+    fps = [line[4] for line in lines]
+    for i in range(0, len(fps), 500):
+        chunk = fps[i:i + 500]
+        known.update(r[0] for r in conn.execute(
+            f"SELECT fingerprint FROM statement_lines WHERE fingerprint IN ({','.join('?' * len(chunk))})", chunk))
+    new_lines = [line for line in lines if line[4] not in known]
+    first_id = (conn.execute("SELECT MAX(id) FROM statement_lines").fetchone()[0] or 0) + 1
+    # จับคู่ใหม่เฉพาะช่วงวันที่ของไฟล์นี้ ไม่มีบรรทัดใหม่ = ไม่มีอะไรต้องจับคู่
+    span = (min(line[0] for line in new_lines), max(line[0] for line in new_lines)) if new_lines else None
+    inputs = _inputs(conn, window, span) if new_lines else ([], [])
+    states, stats = _plan(inputs, new_lines, first_id, window)
+    stats.update(lines=len(new_lines), duplicate_lines=len(lines) - len(new_lines), skipped_lines=skipped,
+                 seconds=time.perf_counter() - t0)
+    return ImportPlan(new_lines, first_id, source, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), window, span,
+                      inputs, states, stats)
+
+
+def apply_import(c, plan, check=True):
+    """ขั้นที่ 2 (ใน db.write): เพิ่มบรรทัดใหม่แล้วบันทึกสถานะตามแผน คืนค่าสรุปเหมือน import_statement
+    check=True: อ่านข้อมูลที่ใช้จับคู่ซ้ำ ถ้ามีการเขียนคั่นกลาง (แอดมินยืนยันคู่, แจ้งโอนใหม่, นำเข้าไฟล์อื่น)
+    จับคู่ใหม่ตรงนี้ (ช้าเท่าเดิมแต่ถูกต้อง)"""
+    t0 = time.perf_counter()
+    states, stats = plan.states, dict(plan.stats)
+    first_id = (c.execute("SELECT MAX(id) FROM statement_lines").fetchone()[0] or 0) + 1
+    if plan.new_lines and (first_id != plan.first_id or
+                           (check and _inputs(c, plan.window, plan.span) != plan.inputs)):
+        states = None
+    inserted = c.executemany("""INSERT OR IGNORE INTO statement_lines
+                                (id, posted_at, amount, reference, description, fingerprint, source, imported_at)
+                                VALUES (?,?,?,?,?,?,?,?)""",
+                             [(first_id + i,) + line + (plan.source, plan.imported_at)
+                              for i, line in enumerate(plan.new_lines)]).rowcount if plan.new_lines else 0
+    if states is None or inserted != len(plan.new_lines):
+        stats = dict(plan.stats, **reconcile(c, plan.window, plan.span))
+        stats.update(lines=inserted, duplicate_lines=plan.stats['duplicate_lines'] + len(plan.new_lines) - inserted)
+    else:
+        _save(c, states)
+    stats['seconds'] = plan.stats['seconds'] + time.perf_counter() - t0
+    return stats
+
+
+def import_statement(c, fileobj, source='', window=DEFAULT_WINDOW_MINUTES):
+    """นำเข้า statement แล้วจับคู่ใน transaction เดียวของ c (CLI) คืนค่าสรุป (นับจำนวนแต่ละสถานะ, บรรทัดซ้ำ/ข้าม, เวลาที่ใช้)
+    แอปใช้ prepare_import นอก writer แล้วส่งแค่ apply_import เข้า db.write"""
+    return apply_import(c, prepare_import(c, fileobj, source, window), check=False)
+
+
+def confirm_match(c, line_id, txn_id):
+    """แอดมินยืนยันคู่ (เช่นจากข้อเสนอ ambiguous) ตัวที่เคยผูกกับอีกฝั่งไว้จะถูกปลดเป็น unmatched"""
+    c.execute("UPDATE statement_lines SET status=?, transaction_id=NULL WHERE transaction_id=? AND id != ?",
+              (UNMATCHED, txn_id, line_id))
+    c.execute("UPDATE transactions SET recon_status=?, statement_line_id=NULL WHERE statement_line_id=? AND id != ?",
+              (UNMATCHED, line_id, txn_id))
+    c.execute("UPDATE statement_lines SET status=?, transaction_id=? WHERE id=?", (MATCHED, txn_id, line_id))
+    c.execute("UPDATE transactions SET recon_status=?, statement_line_id=? WHERE id=?", (MATCHED, line_id, txn_id))
+
+
+# --- หน้า Admin ---
+def status_counts(conn):
+    lines = dict(conn.execute("SELECT status, COUNT(*) FROM statement_lines GROUP BY status"))
+    txns = dict(conn.execute("SELECT recon_status, COUNT(*) FROM transactions WHERE recon_status IS NOT NULL GROUP BY recon_status"))
+    return lines, txns
+
+
+def lines_by_status(conn, status, limit=200, offset=0):
+    """บรรทัด statement + รายการที่ผูกอยู่ (ถ้ามี)"""
+    return conn.execute(
+        """SELECT s.id, s.posted_at, s.amount, s.reference, s.description,
+                  t.id, t.date, p.name, t.note
+           FROM statement_lines s
+           LEFT JOIN transactions t ON t.id = s.transaction_id
+           LEFT JOIN personnel p ON p.id = t.person_id
+           WHERE s.status = ? ORDER BY s.posted_at LIMIT ? OFFSET ?""",
+        (status, limit, offset)).fetchall()
+
+
+def transactions_by_status(conn, status, limit=200, offset=0):
+    return conn.execute(
+        """SELECT t.id, t.date, p.name, t.amount, t.category, t.note, t.slip_path
+           FROM transactions t LEFT JOIN personnel p ON p.id = t.person_id
+           WHERE t.recon_status = ? ORDER BY t.date LIMIT ? OFFSET ?""",
+        (status, limit, offset)).fetchall()
@@ -0,0 +1,130 @@
+# --- ค้นหาลูกบ้าน/รายการ (FTS5 trigram, ดู migrations._m008_search) ---
+# - ข้อความที่พิมพ์แยกตามช่องว่าง ทุกคำต้องเจอ (AND) เรียงตาม bm25 (ชื่อ > เบอร์ > ที่อยู่, หมายเหตุ > ประเภท)
+# - trigram ค้นได้เฉพาะคำยาว >= 3 ตัวอักษร คำที่สั้นกว่า (เลขห้อง "12") กรองด้วย LIKE บนผลที่ได้
+#   ลูกบ้านมีไม่กี่พันแถว ถ้ามีแต่คำสั้นก็ LIKE ทั้งตารางได้ รายการต้องมีคำยาวอย่างน้อย 1 คำ
+# - รายการ: transactions_fts มี category/month ของทุกปีรวมที่ย้ายไป archive ไม่ต้อง join เพื่อทำ facet
+#   ดึง (rowid, category, month) ของผลที่ตรงแบบใหม่ -> เก่า ไม่เกิน FACET_LIMIT แถวรอบเดียว
+#   ได้ครบ: จำนวนและ facet นับจากชุดนี้ใน Python, ไม่ครบ (คำกว้างเช่นชื่อประเภท): facet นับจากชุดล่าสุดนี้
+#   ตัวกรองประเภท/เดือนส่งเข้า MATCH ด้วย ให้ดัชนีตัดแถวเองแทนการอ่านเนื้อหาทุกแถวที่ตรง
+# - bm25 ต้องนับเอกสารที่ตรงแต่ละวลีก่อนทุกครั้ง (คำกว้างบน 500k แถว ~100 ms) จึงจัดอันดับเฉพาะเมื่อ
+#   ผลที่ตรงข้อความไม่เกิน FACET_LIMIT และหลังกรองไม่เกิน RANK_LIMIT นอกนั้นเรียงใหม่ -> เก่า
+#   (ตัวเลขดู benchmarks/bench_search.py)
+SEARCH_PAGE_SIZE = 20
+MIN_TERM = 3
+FACET_LIMIT = 10_000
+RANK_LIMIT = 2_000
+
+
+def _phrase(word):
+    return '"' + word.replace('"', '""') + '"'
+
+
+def _terms(text):
+    """(นิพจน์ MATCH หรือ None, [คำสั้นที่ต้องกรองด้วย LIKE])"""
+    words = (text or "").split()
+    match = " ".join(_phrase(w) for w in words if len(w) >= MIN_TERM) or None
+    return match, [w for w in words if len(w) < MIN_TERM]
+
+
+def _like(columns, short, table):
+    """เงื่อนไข LIKE ของคำสั้น: ทุกคำต้องอยู่ในคอลัมน์ใดคอลัมน์หนึ่ง"""
+    sql, params = "", []
+    for word in short:
+        pattern = "%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        sql += " AND (" + " OR ".join(f"{table}.{col} LIKE ? ESCAPE '\\'" for col in columns) + ")"
+        params += [pattern] * len(columns)
+    return sql, params
+
+
+def search_residents(conn, text, page=1, page_size=SEARCH_PAGE_SIZE):
+    """ค้นหาลูกบ้านจากชื่อ/เบอร์/ที่อยู่ คืนค่า (rows [(id, name, phone, address)], จำนวนทั้งหมด)
+    ไม่ระบุข้อความ = ทุกคนเรียงตาม id"""
+    match, short = _terms(text)
+    like, params = _like(("name", "phone", "address"), short, "p")
+    if match:
+        source = ("FROM personnel_fts JOIN personnel p ON p.id = personnel_fts.rowid "
+                  f"WHERE personnel_fts MATCH ?{like}")
+        params = [match] + params
+        order = "personnel_fts.rank"
+    else:
+        source, order = f"FROM personnel p WHERE 1=1{like}", "p.id"
+    total = conn.execute(f"SELECT COUNT(*) {source}", params).fetchone()[0]
+    rows = conn.execute(f"SELECT p.id, p.name, p.phone, p.address {source} ORDER BY {order} LIMIT ? OFFSET ?",
+                        params + [page_size, (page - 1) * page_size]).fetchall()
+    return rows, total
+
+
+class SearchResult:
+    """ผลค้นหารายการ 1 หน้า
+    total: None = มากกว่า FACET_LIMIT (ไม่ได้นับ), categories/months: {ค่า: จำนวน} ของ facet แต่ละฝั่ง
+    (ฝั่งประเภทนับตามตัวกรองเดือน และกลับกัน) exact: facet นับจากผลทั้งหมด, ranked: เรียงตาม bm25"""
+
+    def __init__(self, rows=(), total=0, more=False, categories=None, months=None, exact=True, ranked=True):
+        self.rows = list(rows)
+        self.total = total
+        self.more = more
+        self.categories = categories or {}
+        self.months = months or {}
+        self.exact = exact
+        self.ranked = ranked
+
+
+def _count(hits, key):
+    out = {}
+    for hit in hits:
+        if hit[key]:
+            out[hit[key]] = out.get(hit[key], 0) + 1
+    return out
+
+
+def search_transactions(conn, text, category=None, month=None, page=1, page_size=SEARCH_PAGE_SIZE):
+    """ค้นหารายการจากหมายเหตุ/ประเภท กรองด้วย category, month ('YYYY-MM') ได้ คืนค่า SearchResult
+    rows = [(id, date, name, category, note, amount)]"""
+    match, short = _terms(text)
+    if not match:
+        return SearchResult()
+    like, like_params = _like(("note", "category"), short, "transactions_fts")
+    expr = "{note category}: (" + match + ")"  # ไม่ให้ข้อความไปตรงกับคอลัมน์ month
+    recent = conn.execute(f"SELECT rowid, category, month FROM transactions_fts "
+                          f"WHERE transactions_fts MATCH ?{like} ORDER BY rowid DESC LIMIT ?",
+                          [expr] + like_params + [FACET_LIMIT + 1]).fetchall()
+    exact = len(recent) <= FACET_LIMIT
+    recent = recent[:FACET_LIMIT]
+    categories = _count([r for r in recent if not month or r[2] == month], 1)
+    months = _count([r for r in recent if not category or r[1] == category], 2)
+    categories = dict(sorted(categories.items(), key=lambda kv: -kv[1]))
+    months = dict(sorted(months.items(), reverse=True))
+
+    offset = (page - 1) * page_size
+    where, params = f"transactions_fts MATCH ?{like}", [expr] + like_params
+    filters = [(column, value) for column, value in (("category", category), ("month", month)) if value]
+    for column, value in filters:
+        where += f" AND transactions_fts.{column} = ?"
+        params.append(value)
+    if exact:
+        hits = [r[0] for r in recent if (not category or r[1] == category) and (not month or r[2] == month)]
+        total = len(hits)
+        ranked = 0 < total <= RANK_LIMIT
+        if ranked:
+            ids = [r[0] for r in conn.execute(f"SELECT rowid FROM transactions_fts WHERE {where} "
+                                              "ORDER BY rank LIMIT ? OFFSET ?", params + [page_size + 1, offset])]
+        else:
+            ids = hits[offset:offset + page_size + 1]
+    else:
+        ranked = False
+        # ให้ดัชนีตัดแถวก่อน แล้วจึงเทียบค่าตรงตัว (phrase ของ trigram ตรงกับสตริงย่อยด้วย)
+        # ไม่ใส่ตอนจัดอันดับ: bm25 จะต้องนับเอกสารของวลีตัวกรองเพิ่มอีกรอบ
+        params[0] += "".join(f" AND {column}: {_phrase(value)}" for column, value in filters if len(value) >= MIN_TERM)
+        total = None
+        if filters:
+            total = conn.execute(f"SELECT COUNT(*) FROM transactions_fts WHERE {where}", params).fetchone()[0]
+        ids = [r[0] for r in conn.execute(f"SELECT rowid FROM transactions_fts WHERE {where} "
+                                          "ORDER BY rowid DESC LIMIT ? OFFSET ?", params + [page_size + 1, offset])]
+    more, ids = len(ids) > page_size, ids[:page_size]
+    rows = []
+    if ids:
+        found = {r[0]: r for r in conn.execute(
+            "SELECT t.id, t.date, p.name, t.category, t.note, t.amount FROM all_transactions t "
+            f"LEFT JOIN personnel p ON p.id = t.person_id WHERE t.id IN ({','.join('?' * len(ids))})", ids)}
+        rows = [found[i] for i in ids if i in found]
+    return SearchResult(rows, total, more, categories, months, exact, ranked)
@@ -0,0 +1,256 @@
+import csv
+import hashlib
+import time
+
+from migrations import normalize_date
+
+# --- Service API (ไม่ขึ้นกับ UI) ---
+# ตรรกะที่ทั้ง app.py, CLI (cli.py) และงาน cron ใช้ร่วมกัน: ผู้ใช้, โปรไฟล์, บันทึกการชำระ, ใบเสร็จ, นำเข้า CSV
+# - import ได้โดยไม่ดึง streamlit/pandas/fpdf: ของหนัก (fpdf, bulk_export) import ภายในฟังก์ชันเมื่อใช้จริง
+# - อ่าน: รับ conn (connection ใดก็ได้), เขียน: รับ db ที่มี execute() เช่น db.Database
+# - นำเข้าแบบกลุ่ม: รับ connection สำหรับเขียนโดยตรง ใช้ executemany ทีละ batch ใน transaction เดียว
+
+IMPORT_BATCH_SIZE = 50_000
+MAX_REPORTED_ERRORS = 20
+
+
+def make_hashes(password):
+    return hashlib.sha256(str.encode(password)).hexdigest()
+
+
+def check_hashes(password, hashed_text):
+    return make_hashes(password) == hashed_text
+
+
+# --- ผู้ใช้ ---
+def authenticate(conn, username, password):
+    """คืนค่าแถว users ถ้ารหัสผ่านถูกต้อง ไม่เช่นนั้น None"""
+    row = conn.execute('SELECT * FROM users WHERE username=?', (username,)).fetchone()
+    return row if row and check_hashes(password, row[2]) else None
+
+
+def register_user(db, username, password, sec_question, sec_answer):
+    """สมัครสมาชิก (ชื่อ admin ได้สิทธิ์ admin) ชื่อซ้ำจะ raise sqlite3.IntegrityError"""
+    role = 'admin' if username.lower() == 'admin' else 'user'
+    return db.execute("INSERT INTO users (username, password, role, sec_question, sec_answer) VALUES (?,?,?,?,?)",
+                      (username, make_hashes(password), role, sec_question, make_hashes(sec_answer)))
+
+
+def security_question(conn, username):
+    """(คำถาม, แฮชคำตอบ) หรือ None ถ้าไม่พบผู้ใช้"""
+    return conn.execute("SELECT sec_question, sec_answer FROM users WHERE username=?", (username,)).fetchone()
+
+
+def set_password(db, username, password):
+    db.execute("UPDATE users SET password=? WHERE username=?", (make_hashes(password), username))
+
+
+def set_role(db, username, role):
+    db.execute("UPDATE users SET role=? WHERE username=?", (role, username))
+
+
+def list_users(conn):
+    return conn.execute("SELECT username, role FROM users ORDER BY username").fetchall()
+
+
+# --- โปรไฟล์ลูกบ้าน ---
+def get_profile(conn, owner_id):
+    return conn.execute("SELECT * FROM personnel WHERE owner_id=?", (owner_id,)).fetchone()
+
+
+def save_profile(db, owner_id, name, phone, address, exists=None):
+    """แก้ไขโปรไฟล์เดิม หรือสร้างใหม่ถ้ายังไม่มี (exists=None ให้ตรวจเองใน transaction เดียวกัน)"""
+    def write(c):
+        has = exists if exists is not None else c.execute(
+            "SELECT 1 FROM personnel WHERE owner_id=?", (owner_id,)).fetchone() is not None
+        if has:
+            c.execute("UPDATE personnel SET name=?, phone=?, address=? WHERE owner_id=?", (name, phone, address, owner_id))
+        else:
+            c.execute("INSERT INTO personnel (owner_id,name,phone,address) VALUES (?,?,?,?)", (owner_id, name, phone, address))
+    db.write(write).result()
+
+
+# --- การชำระเงิน ---
+def slip_in_use(conn, slip_path):
+    return conn.execute("SELECT 1 FROM transactions WHERE slip_path=? LIMIT 1", (slip_path,)).fetchone() is not None
+
+
+def insert_payment(c, person_id, amount, date_str, slip_path, note, category):
+    """INSERT รายการชำระด้วย cursor ที่อยู่ใน transaction อยู่แล้ว คืนค่า id
+    (date แปลงเป็น 'YYYY-MM-DD HH:MM' ถ้าแปลงไม่ได้ raise ValueError)"""
+    date_norm = normalize_date(date_str)
+    if date_norm is None:
+        raise ValueError(f"invalid date: {date_str!r}")
+    return c.execute("INSERT INTO transactions (person_id,amount,date,slip_path,note,category) VALUES (?,?,?,?,?,?)",
+                     (person_id, amount, date_norm, slip_path, note, category)).lastrowid
+
+
+def record_payment(db, person_id, amount, date_str, slip_path, note, category):
+    """บันทึกรายการชำระ คืนค่า id"""
+    return db.write(lambda c: insert_payment(c, person_id, amount, date_str, slip_path, note, category)).result()
+
+
+# --- ใบเสร็จ (fpdf ถูก import ตอนสร้างใบแรกเท่านั้น) ---
+def receipt_pdf(trans_id, person_name, date_str, amount, category, note, is_original=True):
+    from receipt_template import render_receipt_pdf
+    return render_receipt_pdf(trans_id, person_name, date_str, amount, category, note, is_original)
+
+
+def receipt_filename(trans_id, date_str):
+    from receipt_template import receipt_number
+    return f"receipt_{receipt_number(trans_id, date_str)}.pdf"
+
+
+# --- นำเข้า CSV ---
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.skipped = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.inserted / self.seconds if self.seconds else 0.0
+
+    def error(self, line, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {message}")
+
+    def __repr__(self):
+        return (f"inserted {self.inserted}, skipped {self.skipped} in {self.seconds:.2f}s "
+                f"({self.rows_per_second:,.0f} rows/s)")
+
+
+def _read_csv(path):
+    """(เลขบรรทัด, dict) ต่อแถว รองรับไฟล์ที่มี BOM จาก Excel"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, {k.strip().lower(): (v or '').strip() for k, v in row.items() if k}
+
+
+def _insert_batches(conn, sql, rows, batch_size, result):
+    """executemany ทีละ batch_size แถว, 1 batch = 1 transaction"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _flush(conn, sql, batch, result)
+    if batch:
+        _flush(conn, sql, batch, result)
+
+
+def _flush(conn, sql, batch, result):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(sql, batch)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    result.inserted += len(batch)
+    batch.clear()
+
+
+def import_residents(conn, path, batch_size=IMPORT_BATCH_SIZE):
+    """CSV คอลัมน์ name, phone, address และ owner_id หรือ username (ไม่ระบุ = ยังไม่ผูกบัญชี)"""
+    result = ImportResult()
+    t0 = time.perf_counter()
+    users = dict(conn.execute("SELECT username, id FROM users"))
+
+    def rows():
+        for line, r in _read_csv(path):
+            if not r.get('name'):
+                result.error(line, "missing name")
+                continue
+            owner = r.get('owner_id') or None
+            if owner is not None and not owner.isdigit():
+                result.error(line, f"invalid owner_id {owner!r}")
+                continue
+            if owner is None and r.get('username'):
+                owner = users.get(r['username'])
+                if owner is None:
+                    result.error(line, f"unknown username {r['username']!r}")
+                    continue
+            yield (int(owner) if owner is not None else None, r['name'], r.get('phone', ''), r.get('address', ''))
+
+    _insert_batches(conn, "INSERT INTO personnel (owner_id,name,phone,address) VALUES (?,?,?,?)",
+                    rows(), batch_size, result)
+    result.seconds = time.perf_counter() - t0
+    return result
+
+
+def import_transactions(conn, path, batch_size=IMPORT_BATCH_SIZE):
+    """CSV คอลัมน์ amount, date, category, note, slip_path และ person_id หรือ name (ชื่อลูกบ้านที่ไม่ซ้ำ)
+
+    วันที่รูปแบบใดก็ได้ที่ normalize_date รู้จัก แถวที่ไม่ถูกต้องถูกข้ามและรายงานใน result.errors"""
+    result = ImportResult()
+    t0 = time.perf_counter()
+    person_ids = {r[0] for r in conn.execute("SELECT id FROM personnel")}
+    by_name = {}
+    for pid, name in conn.execute("SELECT id, name FROM personnel"):
+        by_name[name] = None if name in by_name else pid  # None = ชื่อซ้ำ ใช้อ้างอิงไม่ได้
+
+    def rows():
+        for line, r in _read_csv(path):
+            if r.get('person_id'):
+                pid = int(r['person_id']) if r['person_id'].isdigit() else None
+                if pid not in person_ids:
+                    result.error(line, f"unknown person_id {r['person_id']!r}")
+                    continue
+            else:
+                pid = by_name.get(r.get('name', ''))
+                if pid is None:
+                    result.error(line, f"unknown or ambiguous name {r.get('name', '')!r}")
+                    continue
+            date_norm = normalize_date(r.get('date'))
+            if date_norm is None:
+                result.error(line, f"invalid date {r.get('date')!r}")
+                continue
+            try:
+                amount = float(r.get('amount', '').replace(',', ''))
+            except ValueError:
+                result.error(line, f"invalid amount {r.get('amount')!r}")
+                continue
+            yield (pid, amount, date_norm, r.get('slip_path', ''), r.get('note', ''), r.get('category') or None)
+
+    _insert_batches(conn, "INSERT INTO transactions (person_id,amount,date,slip_path,note,category) VALUES (?,?,?,?,?,?)",
+                    rows(), batch_size, result)
+    result.seconds = time.perf_counter() - t0
+    return result
+
+
+# --- งานบำรุงรักษา ---
+def rebuild_monthly_summary(conn):
+    """คำนวณ monthly_summary ใหม่ทั้งตาราง (ใช้หลังแก้ transactions นอก trigger) คืนจำนวนแถว
+    นับรวมปีที่ย้ายไป archive แล้ว: conn ต้อง ATTACH archive ไว้ (cli.open_writer)"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM monthly_summary")
+        conn.execute("""INSERT INTO monthly_summary (month, category, total, tx_count)
+                        SELECT substr(date, 1, 7), COALESCE(category, ''), SUM(COALESCE(amount, 0)), COUNT(*)
+                        FROM all_transactions WHERE date IS NOT NULL GROUP BY 1, 2""")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return conn.execute("SELECT COUNT(*) FROM monthly_summary").fetchone()[0]
+
+
+def rebuild_search_index(conn):
+    """สร้างดัชนีค้นหา (personnel_fts, transactions_fts) ใหม่ทั้งหมด คืนจำนวนรายการในดัชนี
+    ต้อง ATTACH archive ไว้เหมือน rebuild_monthly_summary"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("INSERT INTO personnel_fts (personnel_fts) VALUES ('rebuild')")
+        conn.execute("DELETE FROM transactions_fts")
+        conn.execute("""INSERT INTO transactions_fts (rowid, note, category, month)
+                        SELECT id, note, category, substr(date, 1, 7) FROM all_transactions""")
+        conn.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('optimize')")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return conn.execute("SELECT COUNT(*) FROM transactions_fts").fetchone()[0]
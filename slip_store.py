@@ -0,0 +1,90 @@
+"""ที่เก็บสลิปแบบ content-addressed
+
+ไฟล์ถูกเก็บตาม sha256 ของเนื้อหา: slips/ab/cd/abcd....png (แตกโฟลเดอร์ 2 ชั้น ชั้นละ 256)
+- สลิปเดียวกันอัปโหลดซ้ำ -> ได้ path เดิม ไม่เก็บซ้ำ (transactions.slip_path ชี้ไฟล์เดียวกัน)
+- เขียนลงไฟล์ชั่วคราวก่อนแล้ว rename (atomic) ไม่มีไฟล์ครึ่งๆ กลางๆ และชื่อไม่ชนกัน
+- อ่าน/แฮชทีละ chunk ไม่ต้องโหลดทั้งไฟล์เข้าหน่วยความจำ
+
+ย้ายสลิปเดิม (slips/<timestamp>_<name>) เข้าโครงสร้างใหม่:
+
+    python cli.py --db data.db migrate-slips
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+import metrics
+
+SLIP_ROOT = 'slips'
+CHUNK_SIZE = 1024 * 1024
+
+
+class SlipStore:
+    def __init__(self, root=SLIP_ROOT):
+        self.root = root
+        self._tmp_dir = os.path.join(root, '.tmp')
+        os.makedirs(self._tmp_dir, exist_ok=True)
+
+    def path_for(self, digest, ext=''):
+        """path แบบที่เก็บใน transactions.slip_path (ใช้ / เสมอ)"""
+        return posixpath.join(self.root.replace(os.sep, '/'), digest[:2], digest[2:4], digest + ext)
+
+    @staticmethod
+    def _ext(filename):
+        ext = os.path.splitext(filename or '')[1].lower()
+        return '.jpg' if ext == '.jpeg' else ext
+
+    def is_content_path(self, path):
+        name = posixpath.basename(path or '')
+        digest = os.path.splitext(name)[0]
+        return len(digest) == 64 and path == self.path_for(digest, os.path.splitext(name)[1])
+
+    def save(self, fileobj, filename=''):
+        """เก็บไฟล์จาก file object คืนค่า (slip_path, เป็นไฟล์ใหม่หรือไม่)"""
+        with metrics.span("slip_write"):
+            if hasattr(fileobj, 'seek'):
+                fileobj.seek(0)
+            h = hashlib.sha256()
+            fd, tmp = tempfile.mkstemp(dir=self._tmp_dir)
+            try:
+                with os.fdopen(fd, 'wb') as out:
+                    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+                        h.update(chunk)
+                        out.write(chunk)
+                path = self.path_for(h.hexdigest(), self._ext(filename or getattr(fileobj, 'name', '')))
+                if os.path.exists(path):
+                    os.remove(tmp)
+                    return path, False
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp, path)
+                return path, True
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+
+    def save_file(self, src_path):
+        with open(src_path, 'rb') as f:
+            return self.save(f, src_path)
+
+
+def migrate_legacy_slips(conn, store):
+    """ย้ายไฟล์ที่ transactions.slip_path ชี้อยู่ (แบบเก่า) เข้า store และอัปเดต path คืนค่า (ย้าย, ซ้ำ, ไม่พบไฟล์)"""
+    moved = dup = missing = 0
+    paths = [r[0] for r in conn.execute("SELECT DISTINCT slip_path FROM transactions WHERE slip_path IS NOT NULL AND slip_path != ''")]
+    for old in paths:
+        if store.is_content_path(old):
+            continue
+        if not os.path.exists(old):
+            missing += 1
+            continue
+        new, is_new = store.save_file(old)
+        conn.execute("UPDATE transactions SET slip_path=? WHERE slip_path=?", (new, old))
+        conn.commit()
+        os.remove(old)  # ลบหลัง commit: ถ้าหยุดกลางคันรันซ้ำได้
+        if is_new:
+            moved += 1
+        else:
+            dup += 1
+    return moved, dup, missing